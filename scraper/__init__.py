@@ -0,0 +1,48 @@
+"""
+Scrapes NHL play-by-play, shifts and rosters.
+
+    from scraper import scrape_game
+    data = scrape_game(2023020069)
+
+or from the command line, saving each dataframe to {table}.csv:
+
+    python -m scraper 2023020069
+
+Importing the package is cheap: the pipeline and its dependencies (pandas, numpy, requests, lxml)
+are only imported the first time one of its names is used.
+"""
+import importlib
+
+
+__all__ = [
+    'scrape_game', 'scrape_games', 'scrape_season', 'build_game', 'transform_games', 'LiveGame',
+    'fetch_game_sources', 'get_season_games', 'build_season_index', 'read_season_index',
+    'read_parquet_table', 'write_game_parquet', 'compact_game', 'concat_compact',
+    'enable_cache', 'disable_cache', 'set_transport', 'Transport', 'team_registry', 'resolve_team',
+    'add_sink', 'remove_sink', 'MemorySink', 'JsonLogSink', 'PrometheusSink',
+    'RawArchive', 'raw_archive_file', 'replay_season', 'game_stages', 'shift_segments', 'player_toi', 'team_toi',
+    'SharedToi', 'shared_toi',
+]
+
+
+# Modules of the package, returned as themselves instead of looked up in the pipeline module
+_SUBMODULES = ('scraper', 'utilis', 'tests')
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+
+    # Every public name of the pipeline module (and of the utilis modules it star-imports)
+    if name.startswith('_'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module('.scraper', __name__)
+    try:
+        return getattr(module, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,26 @@
+"""
+Scrapes games from the command line and saves their dataframes to {table}.csv.
+
+    python -m scraper 2023020069
+    python -m scraper 2023020069 --file pbp
+"""
+import argparse
+
+from .scraper import scrape_game, GAME_OUTPUTS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scraper', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('game_ids', type=int, nargs='+', metavar='GAME_ID', help='IDs of the games to scrape')
+    parser.add_argument('--file', choices=list(GAME_OUTPUTS), help='only save this dataframe')
+    args = parser.parse_args(argv)
+
+    for game_id in args.game_ids:
+        data = scrape_game(game_id, outputs=[args.file] if args.file else None)
+        for table, df in data.items():
+            df.to_csv(f"{table}.csv" if len(args.game_ids) == 1 else f"{table}_{game_id}.csv", index=False)
+
+
+if __name__ == "__main__":
+    main()
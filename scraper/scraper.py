@@ -1,40 +1,182 @@
-import sys
 import os
 import json
+import re
+import logging
 import requests
 import pandas as pd
-from datetime import datetime
-from datetime import timedelta
 import numpy as np
-import matplotlib.pyplot as plt
-import glob
-import re
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 
 
 
-from utilis.constants import *
-from utilis.decorators import *
-from utilis.functions import *
+from .utilis.constants import *
+from .utilis.decorators import *
+from .utilis.functions import *
+from .utilis.onice import *
+from .utilis.storage import *
+from .utilis.manifest import *
+from .utilis.schema import *
+from .utilis.schedule import *
+from .utilis.metrics import *
+from .utilis.archive import *
+from .utilis.toi import *
+from .utilis.linemates import *
+from .utilis.geometry import *
 
 pd.set_option('display.max_columns', None)
 
+logger = logging.getLogger(__name__)
+
+
+
+
+# Stages of build_game, in the order they run, and the stages each one needs.
+# 'game' reads the play-by-play source, 'shifts' is the only stage reading the shift sources.
+GAME_STAGES = {
+    'game': (),
+    'rosters': ('game',),
+    'plays': ('game',),
+    'shifts': ('game', 'rosters'),
+    'on_ice': ('plays', 'shifts'),
+    'situation': ('plays',),
+    'names': ('plays', 'rosters', 'on_ice'),
+    'coordinates': ('plays',),
+}
+
+# Stages building each output of scrape_game
+GAME_OUTPUTS = {
+    'pbp': ('plays', 'on_ice', 'situation', 'names', 'coordinates'),
+    'rosters': ('rosters',),
+    'shifts': ('shifts',),
+}
+
+
+def game_stages(outputs = None, on_ice : bool = True, situation : bool = False):
+    """
+    Resolve the stages of build_game needed for some outputs
+
+    Parameters
+    ----------
+    outputs : list of str, optional
+        Outputs to build ('pbp', 'rosters', 'shifts'), by default all of them
+    on_ice : bool, optional
+        Enrich the events with the players on the ice and the game strength, by default True.
+        Without it, the pbp output does not need the shifts.
+    situation : bool, optional
+        Decode the situationCode of the events (see add_situation), by default False
+
+    Returns
+    -------
+    list
+        Names of the stages to run, in the order of GAME_STAGES
+    """
 
+    outputs = list(GAME_OUTPUTS) if outputs is None else list(outputs)
+    unknown = [output for output in outputs if output not in GAME_OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs {unknown}, must be among {list(GAME_OUTPUTS)}")
+
+    skipped = ({'on_ice'} if not on_ice else set()) | ({'situation'} if not situation else set())
+    needed = set()
+    todo = [stage for output in outputs for stage in GAME_OUTPUTS[output]]
+    while todo:
+        stage = todo.pop()
+        if stage in needed or stage in skipped:
+            continue
+        needed.add(stage)
+        todo.extend(GAME_STAGES[stage])
+
+    return [stage for stage in GAME_STAGES if stage in needed]
 
 
 # @timer
-def scrape_game(game_id : int, file : str = None, save : bool = False,):
+def scrape_game(game_id : int, file : str = None, save : bool = False, sources : dict = None, compact : bool = False,
+                shift_source : str = DEFAULT_SHIFT_SOURCE, archive = None, outputs = None, on_ice : bool = True,
+                situation : bool = False):
     """
     Scrape game data from NHL API
 
+    Only the stages needed for the requested outputs run, and only the sources they need are
+    fetched: e.g. the rosters or the events without on-ice players only need the play-by-play.
+    For strength-only analytics, on_ice=False with situation=True gets the skater counts and the
+    game strength from the play-by-play's situationCode, without any shift source.
+
     Parameters
     ----------
     game_id : int
         Game ID
     file : str, optional
-        File name to save data to, by default None
+        Only build and return this dataframe ('pbp', 'rosters' or 'shifts'), by default None
     save : bool, optional
         Save data to file, by default False
+    sources : dict, optional
+        Raw payloads returned by fetch_game_sources, fetched if not provided, by default None
+    compact : bool, optional
+        Cast the dataframes to compact dtypes (see compact_game) to cut memory, by default False
+    shift_source : str, optional
+        Where the shifts come from when the sources are fetched: 'json' (shiftcharts API), 'html' (TH/TV reports),
+        'both' (compared, see select_shifts) or 'auto' (the JSON, the reports if it has no shift), by default 'auto'
+    archive : RawArchive or str, optional
+        Replay the sources from this raw archive (or pack file, see raw_archive_file) instead of
+        fetching them, by default None
+    outputs : list of str, optional
+        Dataframes to build ('pbp', 'rosters', 'shifts'), by default all of them (or file)
+    on_ice : bool, optional
+        Add the players on the ice and the game strength to the events, by default True
+    situation : bool, optional
+        Add the skater counts, empty net flags and strength state decoded from situationCode, checked
+        against the ones of the shifts when on_ice is set too (see add_situation), by default False
+
+    Returns
+    -------
+    dict
+        Dictionary of dataframes (or the dataframe of file)
+    """
+
+    outputs = [file] if file and outputs is None else outputs
+    stages = game_stages(outputs, on_ice, situation)
+    needs_shifts = 'shifts' in stages
+
+    # print(f"Fetching play-by-play for {game_id} \n")
+    if sources is None and archive is not None:
+        sources = replay_sources(game_id, archive, None if needs_shifts else ['pbp'])
+    if sources is None:
+        sources = fetch_game_sources(game_id, shift_source=shift_source if needs_shifts else None)
+
+    data_dict = build_game(game_id, sources, outputs, on_ice, situation)
+    if compact:
+        data_dict = compact_game(data_dict)
+
+    returning_data = data_dict[file] if file else data_dict
+
+    
+    # print(data_dict['rosters'].columns)
+
+    if save:
+        for key, value in data_dict.items():
+            value.to_csv(f"{key}.csv", index=False)
+
+    return returning_data
+
+
+def build_game(game_id : int, sources : dict, outputs = None, on_ice : bool = True, situation : bool = False):
+    """
+    Build the game dataframes from its raw source payloads, without any network access
+
+    Parameters
+    ----------
+    game_id : int
+        Game ID
+    sources : dict
+        Raw payloads returned by fetch_game_sources, with either or both shift sources (see select_shifts).
+        The shift sources are only needed for the shifts output and the on-ice players.
+    outputs : list of str, optional
+        Dataframes to build ('pbp', 'rosters', 'shifts'), by default all of them
+    on_ice : bool, optional
+        Add the players on the ice and the game strength to the events, by default True
+    situation : bool, optional
+        Add the strength decoded from situationCode (see add_situation), by default False
 
     Returns
     -------
@@ -42,18 +184,86 @@ def scrape_game(game_id : int, file : str = None, save : bool = False,):
         Dictionary of dataframes
     """
 
+    outputs = list(GAME_OUTPUTS) if outputs is None else list(outputs)
+    stages = game_stages(outputs, on_ice, situation)
+    df, rosters, shifts, players = None, None, None, None
+
+    with span('normalize'):
+        game_dict = json.loads(sources['pbp'])
+        if 'rosters' in stages:
+            rosters = build_rosters(game_id, game_dict)
+        if 'plays' in stages:
+            df = build_plays(game_id, game_dict)
+
+    if 'shifts' in stages:
+        with span('parse_shifts'):
+            shifts = select_shifts(sources, game_dict)
+
+        shifts['gameId'] = game_id
+        shifts['gameDate'] = pd.to_datetime(game_dict.get('gameDate', ""), format="%Y-%m-%d")
+        shifts = match_shifts(shifts, rosters)
+
+    if 'on_ice' in stages:
+        with span('on_ice'):
+            df, players = add_strength(df, shifts)
+    if 'situation' in stages:
+        with span('situation'):
+            df = add_situation(df, game_dict)
+    if 'names' in stages:
+        with span('names'):
+            df = add_player_names(df, players, rosters)
+    if 'coordinates' in stages:
+        with span('coordinates'):
+            df = normalize_coordinates(df)
+
+    # print(rosters['fullName'].to_dict())
+                
+    # print(df.columns)
+
+    data_dict = {
+        'pbp': df,
+        'rosters': tidy_rosters(rosters) if 'rosters' in outputs else None,
+        'shifts': shifts
+    }
+
+    return {output: data_dict[output] for output in outputs}
+
+
+def tidy_rosters(rosters : pd.DataFrame):
+    """
+    Turn the rosters built by build_rosters into the rosters output (playerId column, no translated names)
+    """
+
+    rosters =  rosters.reset_index().rename(columns={'index': 'playerId'})
     
-    shifts = fetch_html_shifts(game_id=game_id)
+    # Define a regular expression pattern to match columns
+    pattern = r'^(firstName|lastName)\.\w{2}$'
 
-    # print(f"Fetching play-by-play for {game_id} \n")
-    game_dict = fetch_play_by_play_json(game_id)
+    # Filter columns that match the pattern and drop them
+    columns_to_remove = [col for col in rosters.columns if re.match(pattern, col)]
+    return rosters.drop(columns=columns_to_remove)
+
+
+def build_rosters(game_id : int, game_dict : dict):
+    """
+    Build the rosters of a game (indexed by playerId) from its play-by-play JSON
+    """
 
     rosters = pd.json_normalize(game_dict.get("rosterSpots", [])).set_index("playerId").assign(fullName = lambda x: x["firstName.default"] + " " + x["lastName.default"]).rename({"firstName.default": "firstName",
                                                                                                                                                                                   "lastName.default" : "lastName"}, axis=1)
 
+    rosters['gameId'] = game_id
+    rosters['gameDate'] = pd.to_datetime(game_dict.get('gameDate', ""), format="%Y-%m-%d")
+    rosters['is_home'] = (rosters['teamId'] == game_dict.get('homeTeam', {}).get('id', "")).astype(int)
+
+    return rosters
 
 
-    
+def build_plays(game_id : int, game_dict : dict):
+    """
+    Normalize the plays of a game's play-by-play JSON into one row per event
+    """
+
     df = pd.json_normalize(game_dict.get("plays", []))
 
     # Add columns if they don't exist
@@ -67,12 +277,18 @@ def scrape_game(game_id : int, file : str = None, save : bool = False,):
     for col in cols_to_add3:
         if col not in df.columns:
             df[col] = np.nan
+
+    # Columns used below, which only some of the plays have (e.g. when game_dict holds a few of them)
+    for col in ['details.awayScore', 'details.homeScore', 'details.awaySOG', 'details.homeSOG',
+                'details.xCoord', 'details.yCoord', 'homeTeamDefendingSide']:
+        if col not in df.columns:
+            df[col] = np.nan
     
 
     # Add game_id column
-    df['gameId'], rosters['gameId'], shifts['gameId'] = game_id, game_id, game_id
+    df['gameId'] = game_id
     df['seasonId'] = game_dict.get('season', "")
-    df['gameDate'], rosters['gameDate'], shifts['gameDate'] = pd.to_datetime(game_dict.get('gameDate', ""), format="%Y-%m-%d"), pd.to_datetime(game_dict.get('gameDate', ""), format="%Y-%m-%d"), pd.to_datetime(game_dict.get('gameDate', ""), format="%Y-%m-%d")
+    df['gameDate'] = pd.to_datetime(game_dict.get('gameDate', ""), format="%Y-%m-%d")
     df['gameType'] = game_dict.get('gameType', "")
     df['venue'] = game_dict.get('venue', "").get('default', "")
 
@@ -82,7 +298,7 @@ def scrape_game(game_id : int, file : str = None, save : bool = False,):
     df['period'] = pd.to_numeric(df['periodDescriptor.number'], errors='coerce')
 
     # Add elapsed time column
-    df['elapsedTime'] = (df['period'].astype(int) - 1) * 1200 + df['timeInPeriod'].str.split(':').apply(lambda x: int(x[0]) * 60 + int(x[1]))
+    df['elapsedTime'] = (df['period'].astype(int) - 1) * 1200 + mmss_to_seconds(df['timeInPeriod'])
 
     # Fill for missing scores
     df[['details.awayScore', 'details.homeScore', 'details.awaySOG', 'details.homeSOG']] = df[['details.awayScore', 'details.homeScore', 'details.awaySOG', 'details.homeSOG']].ffill().fillna(0)
@@ -115,113 +331,615 @@ def scrape_game(game_id : int, file : str = None, save : bool = False,):
     # Remove 'details.' and 'periodDescriptor.' prefixes from column names
     df.columns = df.columns.str.replace('details.', '').str.replace('periodDescriptor.', '')
 
-    rosters['is_home'] = (rosters['teamId'] == game_dict.get('homeTeam', {}).get('id', "")).astype(int)
+    return df
 
-    shifts = shifts.merge(rosters.reset_index()[['is_home', 'sweaterNumber', 'playerId', 'positionCode']], how='left', on=['is_home', 'sweaterNumber'])
 
-    home_sktrs_id = [shifts.query("positionCode != 'G' and startTime_s <= @second and endTime_s > @second and is_home == 1").playerId.unique().tolist() for second in df['elapsedTime']]
-    n_home_sktrs = [shifts.query("positionCode != 'G' and startTime_s <= @second and endTime_s > @second and is_home == 1").playerId.nunique() for second in df['elapsedTime']]
-    home_goalie_id = [shifts.query("positionCode == 'G' and startTime_s <= @second and endTime_s > @second and is_home == 1").playerId.unique().tolist()[0] if len(shifts.query("positionCode == 'G' and startTime_s <= @second and endTime_s > @second and is_home == 1").playerId.unique().tolist()) == 1 else np.nan for second in df['elapsedTime']]
+def match_shifts(shifts : pd.DataFrame, rosters : pd.DataFrame):
+    """
+    Add the player ID and position of every shift, matched to the roster by team and sweater number
+    """
+
+    return shifts.merge(rosters.reset_index()[['is_home', 'sweaterNumber', 'playerId', 'positionCode']], how='left', on=['is_home', 'sweaterNumber'])
+
 
-    away_sktrs_id = [shifts.query("positionCode != 'G' and startTime_s <= @second and endTime_s > @second and is_home == 0").playerId.unique().tolist() for second in df['elapsedTime']]
-    n_away_sktrs = [shifts.query("positionCode != 'G' and startTime_s <= @second and endTime_s > @second and is_home == 0").playerId.nunique() for second in df['elapsedTime']]
-    away_goalie_id = [shifts.query("positionCode == 'G' and startTime_s <= @second and endTime_s > @second and is_home == 0").playerId.unique().tolist()[0] if len(shifts.query("positionCode == 'G' and startTime_s <= @second and endTime_s > @second and is_home == 0").playerId.unique().tolist()) == 1 else np.nan for second in df['elapsedTime']]
+def add_strength(df : pd.DataFrame, shifts : pd.DataFrame):
+    """
+    Add the number of skaters on the ice and the game strength to every event, from shifts matched to the roster
 
-    # df['home_goalie'] = home_goalie_id
-    # df['away_goalie'] = away_goalie_id
+    Returns the events and the on-ice players of every event (see resolve_on_ice)
+    """
 
-    df['home_skaters'] = n_home_sktrs
-    df['away_skaters'] = n_away_sktrs
+    # Resolve on-ice players for every event in one pass over the shift intervals
+    on_ice = resolve_on_ice(shifts, df['elapsedTime'])
 
-    df['game_strength'] = df.apply(lambda row: f"{row['home_skaters']}v{row['away_skaters']}" if row['is_home'] else f"{row['away_skaters']}v{row['home_skaters']}", axis=1)
+    df['home_skaters'] = on_ice['home_skaters'].tolist()
+    df['away_skaters'] = on_ice['away_skaters'].tolist()
 
-    # Determine the maximum column index used in both home and away skater IDs
-    max_column_index = max(
-    max(len(home_skater_ids), len(away_skater_ids))
-    for home_skater_ids, away_skater_ids in zip(home_sktrs_id, away_sktrs_id)
-    )
+    # Strength from the point of view of the event team (home first when there is no event team)
+    home, away = df['home_skaters'].astype(str), df['away_skaters'].astype(str)
+    df['game_strength'] = np.where(df['is_home'] != 0, home + 'v' + away, away + 'v' + home)
 
-    # Define column names for skater IDs and full names
-    columns_to_add = [f"home_skater_id{j+1}" for j in range(max_column_index)]
-    columns_to_add.extend([f"away_skater_id{j+1}" for j in range(max_column_index)])
-    columns_to_add2 = [f"home_skater_fullName{j+1}" for j in range(max_column_index)]
-    columns_to_add2.extend([f"away_skater_fullName{j+1}" for j in range(max_column_index)])
+    return df, on_ice
 
-    # Check and add columns if they don't exist
-    for column in columns_to_add + columns_to_add2:
-        if column not in df.columns:
-            df[column] = 'NaN'
+
+def add_situation(df : pd.DataFrame, game_dict : dict):
+    """
+    Add the skater counts, empty net flags and strength state decoded from the situationCode of every event
+    (see decode_situation), without any shift
+
+    When the events already have the skater counts resolved from the shifts (see add_strength), those are
+    kept and checked against the decoded ones: the events that disagree are logged and counted as
+    strength_mismatches, and only the empty net flags and the strength state are added
+    """
+
+    codes = {play.get('eventId'): play.get('situationCode') for play in game_dict.get('plays', [])}
+    situation = decode_situation(df['eventId'].map(codes), df['is_home'])
+    situation.index = df.index
+
+    if 'home_skaters' not in df.columns:
+        return df.assign(**situation)
+
+    mismatches = compare_strength(df, situation)
+    if len(mismatches):
+        logger.warning(f"Skater counts of {len(mismatches)} events of game {game_dict.get('id')} differ between the shifts and situationCode")
+        count('strength_mismatches', len(mismatches))
+    return df.assign(**situation[['home_empty_net', 'away_empty_net', 'strength_state']])
+
+
+def add_player_names(df : pd.DataFrame, on_ice : pd.DataFrame, rosters : pd.DataFrame):
+    """
+    Add the IDs and names of the skaters and goalies on the ice, and the names of the event players
+
+    Without on-ice players (on_ice is None), only the names of the event players are added
+    """
 
     id_name_dict = rosters['fullName'].to_dict()
-    # Assign values to the DataFrame for skater IDs and full names
-    for i, (home_skater_ids, away_skater_ids) in enumerate(zip(home_sktrs_id, away_sktrs_id)):
-        for j in range(max_column_index):
-            if j < len(home_skater_ids):
-                df.at[i, f"home_skater_id{j+1}"] = home_skater_ids[j]
-                df.at[i, f"home_skater_fullName{j+1}"] = str(id_name_dict.get(home_skater_ids[j], ""))
-            if j < len(away_skater_ids):
-                df.at[i, f"away_skater_id{j+1}"] = away_skater_ids[j]
-                df.at[i, f"away_skater_fullName{j+1}"] = str(id_name_dict.get(away_skater_ids[j], ""))
+
+    if on_ice is None:
+        for i in (1, 2, 3):
+            df[f'event_player{i}_fullName'] = df[f'event_player{i}_Id'].map(id_name_dict)
+        return df
+
+    # One column per skater slot, as wide as the most skaters on the ice for either team
+    width = int(max(on_ice['home_skater_ids'].str.len().max(), on_ice['away_skater_ids'].str.len().max()))
+    matrices = {side: pad_id_lists(on_ice[f'{side}_skater_ids'].tolist(), width) for side in ('home', 'away')}
+
+    columns = {}
+    for side, matrix in matrices.items():
+        for j in range(width):
+            columns[f"{side}_skater_id{j+1}"] = _slot_column(matrix[:, j])
+    for side, matrix in matrices.items():
+        # Skaters missing from the roster get an empty name, like empty slots get NaN
+        names = pd.Series(matrix.ravel()).map(id_name_dict).fillna("").to_numpy(dtype=object).reshape(matrix.shape)
+        names[np.isnan(matrix)] = np.nan
+        for j in range(width):
+            columns[f"{side}_skater_fullName{j+1}"] = _slot_column(names[:, j])
+
+    df = pd.concat([df, pd.DataFrame(columns, index=df.index)], axis=1)
 
     df['event_player1_fullName'] = df['event_player1_Id'].map(id_name_dict)
     df['event_player2_fullName'] = df['event_player2_Id'].map(id_name_dict)
     df['event_player3_fullName'] = df['event_player3_Id'].map(id_name_dict)
 
-    df = df.replace('NaN', np.nan)
-
-    df['home_goalie_id'] = home_goalie_id
-    df['away_goalie_id'] = away_goalie_id
+    df['home_goalie_id'] = on_ice['home_goalie_id'].tolist()
+    df['away_goalie_id'] = on_ice['away_goalie_id'].tolist()
 
     df['home_goalie_fullName'] = df['home_goalie_id'].map(id_name_dict)
     df['away_goalie_fullName'] = df['away_goalie_id'].map(id_name_dict)
 
-    # Initialize 'normalized_xCoord' with 'xCoord'
-    df['normalized_xCoord'] = df['xCoord']
+    return df
 
-    # Update 'normalized_xCoord' based on conditions
-    df.loc[(df['homeTeamDefendingSide'] == 'right') & (df['is_home'] == 1), 'normalized_xCoord'] = df['xCoord'] * -1
-    df.loc[(df['homeTeamDefendingSide'] == 'left') & (df['is_home'] == 0), 'normalized_xCoord'] = df['xCoord'] * -1
 
-    # Calculate 'normalized_yCoord' based on 'normalized_xCoord'
-    df['normalized_yCoord'] = np.where(df['normalized_xCoord'] == df['xCoord'], df['yCoord'], df['yCoord'] * -1)
+def _slot_column(values : np.ndarray):
+    """
+    Give a skater slot column the dtype it would be inferred as: integer IDs when the slot is always filled,
+    float when some events leave it empty (and float NaN when it is never filled)
+    """
 
-    # Calculate 'normalized_xCoord_vertical' and 'normalized_yCoord_vertical' (offensive zone is on the top side of the ice rink)
-    df['normalized_xCoord_vertical'] = -1 * df['normalized_yCoord']
-    df['normalized_yCoord_vertical'] = df['normalized_xCoord']
+    column = pd.Series(values)
+    if column.isna().all():
+        return column.astype(float)
+    if column.dtype == object:
+        return column
+    return column.astype('int64') if column.notna().all() else column
 
-    # print(rosters['fullName'].to_dict())
-                
-    # print(df.columns)
-    rosters =  rosters.reset_index().rename(columns={'index': 'playerId'})
-    
-    # Define a regular expression pattern to match columns
-    pattern = r'^(firstName|lastName)\.\w{2}$'
 
-    # Filter columns that match the pattern and drop them
-    columns_to_remove = [col for col in rosters.columns if re.match(pattern, col)]
-    rosters = rosters.drop(columns=columns_to_remove)
+def normalize_coordinates(df : pd.DataFrame):
+    """
+    Add coordinates normalized so that the event team always attacks the right net, and the shot
+    geometry (distance and angle to the net, zone, rink side) as float32 columns (see add_geometry)
+    """
 
-    
-    data_dict = {
-        'pbp': df,
-        'rosters': rosters,
-        'shifts': shifts
-    }
+    return add_geometry(df)
 
-    returning_data = data_dict.get(file, []) if file else data_dict
 
-    
-    # print(data_dict['rosters'].columns)
+class LiveGame:
+    """
+    Incremental scraper for a game in progress
 
-    if save:
-        for key, value in data_dict.items():
-            value.to_csv(f"{key}.csv", index=False)
+    Each poll sends conditional requests (If-None-Match / If-Modified-Since) for the play-by-play
+    and the shift sources, diffs the plays by eventId and only normalizes, resolves the on-ice
+    players and names the plays that are new or changed since the previous poll, instead of
+    rebuilding the whole game like scrape_game does.
+
+    The shifts are built like in build_game (see select_shifts). They lag behind the play-by-play,
+    so the plays after the end of the shifts are resolved again when newer shifts come in. A
+    shift source that isn't published yet (404) just means no shifts so far.
+
+    Parameters
+    ----------
+    game_id : int
+        Game ID
+    season : int, optional
+        Season of the game, derived from the game ID if not provided
+    shift_source : str, optional
+        Where the shifts come from, as in scrape_game: 'json', 'html', 'both' or 'auto' (the JSON,
+        the reports as long as it has no shift), by default 'auto'
+
+    Examples
+    --------
+    >>> game = LiveGame(2023020069)
+    >>> new_plays = game.poll()      # every play on the first poll, then only the new ones
+    >>> game.data['pbp']             # every play so far, like scrape_game(2023020069)['pbp']
+    """
+
+    SCORE_FIELDS = ('awayScore', 'homeScore', 'awaySOG', 'homeSOG')
+
+    def __init__(self, game_id : int, season : int = None, shift_source : str = DEFAULT_SHIFT_SOURCE):
+        if shift_source not in SHIFT_SOURCES:
+            raise ValueError(f"shift_source must be one of {SHIFT_SOURCES}, not {shift_source!r}")
+
+        self.game_id = game_id
+        self.shift_source = shift_source
+        self.urls = game_source_urls(game_id, season, 'both' if shift_source == 'auto' else shift_source)
+        self.validators = {}
+        self.payloads = {}
+        self.game_dict = None
+        self.rosters = None
+        self.shifts = None
+
+        self._plays = {}        # eventId -> raw play of the last poll, in document order
+        self._elapsed = {}      # eventId -> elapsed seconds of the processed play
+        self._chunks = []       # dataframes of the plays processed by each poll
+        self._version = {}      # eventId -> index of the chunk holding the play's current row
+        self._shift_end = -1    # last second covered by the shifts
+        self._pbp = None
+
+    def _fetch(self):
+        """
+        Fetch the sources whose content changed since the last poll
+        """
+
+        def fetch(url):
+            try:
+                response, self.validators[url] = conditional_get(url, self.validators.get(url))
+            except requests.exceptions.HTTPError as e:
+                # Shift sources not published yet
+                if url == self.urls['pbp'] or e.response is None or e.response.status_code != 404:
+                    raise
+                return b''
+            return None if response is None else response.content
+
+        shift_sources = self._shift_sources(fetching=True)
+        urls = {source: url for source, url in self.urls.items() if source == 'pbp' or source in shift_sources}
+        return fetch_concurrently(self.game_id, urls, fetch)
+
+    def _shift_sources(self, fetching : bool = False):
+        """
+        Sources the shifts are built from (or fetched for): with 'auto', the shiftcharts JSON, and the
+        reports as long as it has no shift
+        """
+
+        sources = [source for source in self.urls if source != 'pbp']
+        if self.shift_source == 'auto' and has_json_shifts(self.payloads.get('shifts_json')):
+            return ['shifts_json']
+        if self.shift_source == 'auto' and not fetching:
+            return [source for source in sources if source != 'shifts_json']
+        return sources
+
+    def poll(self, sources : dict = None):
+        """
+        Fetch the game's sources and process the plays that are new or changed
+
+        Parameters
+        ----------
+        sources : dict, optional
+            Raw payloads (see fetch_game_sources) to use instead of fetching them, by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            The plays added or updated by this poll, empty if nothing changed
+        """
+
+        sources = self._fetch() if sources is None else sources
+        changed = {source: content for source, content in sources.items()
+                   if content is not None and content != self.payloads.get(source)}
+        self.payloads.update(changed)
+
+        if not changed or 'pbp' not in self.payloads:
+            return pd.DataFrame()
+
+        stale = set()
+        rosters_changed = False
+
+        if 'pbp' in changed:
+            previous_spots = (self.game_dict or {}).get('rosterSpots')
+            self.game_dict = json.loads(changed['pbp'])
+            rosters_changed = self.rosters is None or self.game_dict.get('rosterSpots') != previous_spots
+            if rosters_changed:
+                self.rosters = build_rosters(self.game_id, self.game_dict)
+            stale |= self._diff_plays()
+
+        if rosters_changed or any(source in changed for source in self.urls if source != 'pbp'):
+            previous_end = self._shift_end
+            self.shifts = self._build_shifts()
+            # Names change with the rosters, on-ice players after the end of the previous shift reports
+            stale |= {event_id for event_id, elapsed in self._elapsed.items() if rosters_changed or elapsed >= previous_end}
+
+        return self._process([play for event_id, play in self._plays.items() if event_id in stale])
+
+    def _diff_plays(self):
+        """
+        Replace the raw plays with the ones of the current play-by-play, returning the IDs of the new or changed ones
+        """
+
+        plays = {play['eventId']: play for play in self.game_dict.get('plays', [])}
+        changed = {event_id for event_id, play in plays.items() if self._plays.get(event_id) != play}
+
+        for event_id in self._plays.keys() - plays.keys():
+            # Plays removed from the play-by-play
+            self._version.pop(event_id, None)
+            self._elapsed.pop(event_id, None)
+            self._pbp = None
+
+        self._plays = plays
+        return changed
+
+    def _build_shifts(self):
+        """
+        Build the shifts from the shift sources (see select_shifts) and match them to the roster
+        """
+
+        # Sources not fetched or not published yet are left out
+        sources = {source: self.payloads[source] for source in self._shift_sources() if self.payloads.get(source)}
+        try:
+            shifts = select_shifts(sources, self.game_dict)
+        except IndexError:
+            # No shift yet
+            self._shift_end = -1
+            return pd.DataFrame(columns=['is_home', 'sweaterNumber', 'startTime_s', 'endTime_s', 'playerId', 'positionCode'])
+
+        shifts['gameId'] = self.game_id
+        shifts['gameDate'] = pd.to_datetime(self.game_dict.get('gameDate', ""), format="%Y-%m-%d")
+        self._shift_end = shifts['endTime_s'].max()
+
+        return match_shifts(shifts, self.rosters)
+
+    def _running_scores(self, event_ids):
+        """
+        Scores and shots on goal after each of the given plays, carried forward over the whole play-by-play
+        (in document order, like build_plays fills them), so plays processed apart from their neighbours
+        get the totals of the full game
+        """
+
+        running = dict.fromkeys(self.SCORE_FIELDS, 0)
+        scores = {}
+        for event_id, play in self._plays.items():
+            details = play.get('details', {})
+            running.update({field: details[field] for field in self.SCORE_FIELDS if details.get(field) is not None})
+            scores[event_id] = list(running.values())
+
+        return np.array([scores[event_id] for event_id in event_ids], dtype=float).reshape(-1, len(self.SCORE_FIELDS))
+
+    def _process(self, plays : list):
+        """
+        Build the rows of the given raw plays and record them as their current version
+        """
+
+        if not plays:
+            return pd.DataFrame()
+
+        with span('live_update') as update_span:
+            df = build_plays(self.game_id, {**self.game_dict, 'plays': plays})
+            df[list(self.SCORE_FIELDS)] = self._running_scores(df['eventId'])
+            df, on_ice = add_strength(df, self.shifts)
+            df = add_player_names(df, on_ice, self.rosters)
+            df = normalize_coordinates(df)
+            update_span.set(plays=len(df))
+
+        chunk = len(self._chunks)
+        self._chunks.append(df)
+        self._version.update(dict.fromkeys(df['eventId'].tolist(), chunk))
+        self._elapsed.update(zip(df['eventId'].tolist(), df['elapsedTime'].tolist()))
+        self._pbp = None
+
+        return df
+
+    @property
+    def pbp(self):
+        """
+        Every play so far, in the current version, sorted by elapsed time
+        """
+
+        if self._pbp is None:
+            chunks = [chunk[chunk['eventId'].map(self._version) == i] for i, chunk in enumerate(self._chunks)]
+            pbp = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            if len(pbp):
+                pbp = pbp.sort_values(by=['elapsedTime'], kind='stable', ignore_index=True)
+
+            # Later polls only add to this single chunk
+            if chunks:
+                self._chunks = [pbp]
+                self._version = dict.fromkeys(self._version, 0)
+            self._pbp = pbp
+
+        return self._pbp
+
+    @property
+    def data(self):
+        """
+        Dictionary of dataframes, like scrape_game returns
+        """
+
+        return {'pbp': self.pbp, 'rosters': tidy_rosters(self.rosters), 'shifts': self.shifts}
+
+
+def scrape_games(game_ids, concurrency : int = 8, file : str = None, host_concurrency : int = None, processes : int = None,
+                 outputs = None, on_ice : bool = True, situation : bool = False):
+    """
+    Scrape many games concurrently, yielding each result as soon as it finishes
+
+    Parameters
+    ----------
+    game_ids : iterable of int
+        Game IDs
+    concurrency : int, optional
+        Number of games scraped (or fetched, with processes) at once, by default 8
+    file : str, optional
+        Only return this dataframe ('pbp', 'rosters' or 'shifts'), by default None
+    host_concurrency : int, optional
+        Maximum number of requests in flight per host for the games of this call only (see
+        scoped_host_concurrency), by default the process-wide limit of set_host_concurrency
+    processes : int, optional
+        If set, fetch the sources in threads and build the dataframes in this many worker processes
+        (see transform_games), by default None
+    outputs : list of str, optional
+        Dataframes to build ('pbp', 'rosters', 'shifts'), by default all of them (or file)
+    on_ice : bool, optional
+        Add the players on the ice and the game strength to the events, by default True
+    situation : bool, optional
+        Add the skater counts, empty net flags and strength state decoded from situationCode
+        (see scrape_game), by default False. With on_ice=False, no shift source is fetched
+        unless the shifts output is requested.
+
+    Yields
+    ------
+    tuple
+        (game_id, result) in completion order, where result is what scrape_game returns
+        or the exception raised while scraping that game
+    """
+
+    run = scoped_host_concurrency(host_concurrency) if host_concurrency is not None else (lambda func, *args: func(*args))
+
+    if processes is None:
+        scrape = lambda game_id: scrape_game(game_id, file, outputs=outputs, on_ice=on_ice, situation=situation)
+        yield from _run_concurrently(lambda game_id: run(scrape, game_id), game_ids, concurrency)
+    else:
+        outputs = [file] if file and outputs is None else outputs
+        shift_source = DEFAULT_SHIFT_SOURCE if 'shifts' in game_stages(outputs, on_ice, situation) else None
+        fetch = lambda game_id: run(fetch_game_sources, game_id, None, shift_source)
+        yield from transform_games(_run_concurrently(fetch, game_ids, concurrency), processes=processes, file=file,
+                                   outputs=outputs, on_ice=on_ice, situation=situation)
+
+
+def _build_game_output(game_id : int, sources : dict, file : str = None, outputs = None, on_ice : bool = True,
+                       situation : bool = False):
+    """
+    Worker process task: build a game and only send back the requested dataframes
+    """
+
+    outputs = [file] if file and outputs is None else outputs
+    data_dict = build_game(game_id, sources, outputs, on_ice, situation)
+    return data_dict[file] if file else data_dict
 
-    return returning_data
 
+def transform_games(payloads, processes : int = None, file : str = None, outputs = None, on_ice : bool = True,
+                    situation : bool = False):
+    """
+    Build many games from their raw payloads in a pool of worker processes
+
+    Only the raw bytes are sent to the workers and only the requested dataframes come back,
+    so the pandas work runs in parallel on every core without the GIL.
+
+    Parameters
+    ----------
+    payloads : iterable of tuple
+        (game_id, sources) pairs, where sources is what fetch_game_sources returns, or an
+        exception which is passed through (e.g. what _run_concurrently yields)
+    processes : int, optional
+        Number of worker processes, by default the number of CPUs
+    file : str, optional
+        Only return this dataframe ('pbp', 'rosters' or 'shifts'), by default None
+    outputs, on_ice, situation : optional
+        Dataframes to build and stages to run, as in scrape_game
+
+    Yields
+    ------
+    tuple
+        (game_id, result) in completion order, where result is the dictionary of dataframes
+        or the exception raised while building that game
+    """
+
+    def finished(futures, block):
+        for future in (as_completed(futures) if block else [f for f in futures if f.done()]):
+            game_id = futures.pop(future)
+            try:
+                yield game_id, future.result()
+            except Exception as e:
+                yield game_id, e
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {}
+        for game_id, sources in payloads:
+            if isinstance(sources, Exception):
+                yield game_id, sources
+                continue
+            futures[executor.submit(_build_game_output, game_id, sources, file, outputs, on_ice, situation)] = game_id
+            yield from finished(futures, block=False)
+
+        yield from finished(futures, block=True)
+
+
+def _run_concurrently(func, game_ids, concurrency : int):
+    """
+    Run func(game_id) over a bounded thread pool, yielding (game_id, result or exception) as they finish
+    """
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {executor.submit(func, game_id): game_id for game_id in game_ids}
+
+        for future in as_completed(futures):
+            game_id = futures[future]
+            try:
+                yield game_id, future.result()
+            except Exception as e:
+                yield game_id, e
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _scrape_changed_game(game_id : int, checksum : str = None, archive : RawArchive = None):
+    """
+    Fetch a game's sources and scrape it, unless their checksum matches the given one
+
+    Returns (dictionary of dataframes or None if unchanged, checksum of the sources)
+    """
+
+    sources = fetch_game_sources(game_id)
+    new_checksum = sources_checksum(sources)
+    if new_checksum == checksum:
+        return None, new_checksum
+    if archive is not None:
+        archive.append(game_id, sources)
+    return scrape_game(game_id, sources=sources), new_checksum
+
+
+def replay_sources(game_id : int, archive, sources = None):
+    """
+    Read a game's raw sources from a raw archive (RawArchive or pack file) instead of the network,
+    all of them or only the given ones (e.g. ['pbp'])
 
+    Raises KeyError if the game is not in the archive
+    """
+
+    if isinstance(archive, RawArchive):
+        return archive.get(game_id, sources)
+    if not os.path.exists(archive):
+        raise KeyError(game_id)
+    with RawArchive(archive) as pack:
+        return pack.get(game_id, sources)
+
+
+def replay_season(season : int = DEFAULT_SEASON, path : str = DEFAULT_DATA_DIR, processes : int = None, file : str = None,
+                  outputs = None, on_ice : bool = True, situation : bool = False):
+    """
+    Rebuild every game of a season's raw archive, without any network access
+
+    Parameters
+    ----------
+    season : int, optional
+        Season in the format of {year_start}{year_end}, by default DEFAULT_SEASON
+    path : str, optional
+        Root folder of the datasets, holding the archive in {path}/raw/{season}.pack, by default DEFAULT_DATA_DIR
+    processes : int, optional
+        Number of worker processes (see transform_games), by default the number of CPUs
+    file : str, optional
+        Only return this dataframe ('pbp', 'rosters' or 'shifts'), by default None
+    outputs, on_ice, situation : optional
+        Dataframes to build and stages to run, as in scrape_game
+
+    Yields
+    ------
+    tuple
+        (game_id, result) in completion order, where result is the dictionary of dataframes
+        or the exception raised while building that game
+    """
+
+    with RawArchive(raw_archive_file(season, path)) as archive:
+        yield from transform_games(archive.items(), processes=processes, file=file, outputs=outputs, on_ice=on_ice,
+                                   situation=situation)
+
+
+
+def scrape_season(season : int = DEFAULT_SEASON, game_types = (2, 3), path : str = DEFAULT_DATA_DIR, concurrency : int = 8,
+                  manifest : str = None, refresh : bool = False, archive : bool = False):
+    """
+    Scrape every finished game of a season into Parquet datasets
+
+    The pbp, rosters and shifts tables are written to {path}/{table}/season={season}/gameDate={date}/{gameId}.parquet
+    (see write_game_parquet), so they can be read back with read_parquet_table. The games come from the
+    season game index, which is updated first (see build_season_index).
+
+    Every game is recorded in a manifest, so running it again only scrapes the games that
+    finished since, and the ones that failed before.
+
+    Parameters
+    ----------
+    season : int, optional
+        Season in the format of {year_start}{year_end}, by default DEFAULT_SEASON
+    game_types : tuple of int, optional
+        Game types to scrape (1: preseason, 2: regular season, 3: playoffs), by default (2, 3)
+    path : str, optional
+        Root folder of the datasets, by default DEFAULT_DATA_DIR
+    concurrency : int, optional
+        Number of games scraped at once, by default 8
+    manifest : str, optional
+        SQLite file of the manifest, by default {path}/manifest.sqlite
+    refresh : bool, optional
+        Also fetch the games already done again, and rewrite those whose sources changed, by default False
+    archive : bool, optional
+        Also append the raw sources of the scraped games to {path}/raw/{season}.pack, so they can be
+        rebuilt later without the network (see replay_season), by default False
+
+    Returns
+    -------
+    dict
+        Exceptions of the games that could not be scraped, by game ID
+    """
 
-if __name__ == "__main__":
-    scrape_game(2020020001, save=True)
-    # scrape_game(2020020001, save=True)
-   
+    manifest = Manifest(os.path.join(path, MANIFEST_FILE) if manifest is None else manifest)
+    archive = RawArchive(raw_archive_file(season, path)) if archive else None
+
+    try:
+        games = build_season_index(season, path=path, concurrency=concurrency)
+        games = games[games['gameType'].isin(game_types) & games['gameState'].isin(FINAL_GAME_STATES)].set_index('gameId')
+
+        done = manifest.game_ids(MANIFEST_DONE, season)
+        checksums = {game_id: manifest.get(game_id)['checksum'] for game_id in done} if refresh else {}
+        todo = [game_id for game_id in games.index if refresh or game_id not in done]
+
+        errors = {}
+        for game_id, result in _run_concurrently(lambda game_id: _scrape_changed_game(game_id, checksums.get(game_id), archive), todo, concurrency):
+            if not isinstance(result, Exception):
+                data, checksum = result
+                if data is None:
+                    continue
+                try:
+                    # A game that doesn't fit the dataset schema fails alone (see apply_parquet_dtypes)
+                    files = write_game_parquet(data, path)
+                except Exception as e:
+                    result = e
+                else:
+                    manifest.mark_done(game_id, season, games.loc[game_id, 'gameDate'].strftime('%Y-%m-%d'), checksum, files)
+                    continue
+
+            errors[game_id] = result
+            manifest.mark_failed(game_id, season, result)
+
+        return errors
+    finally:
+        manifest.close()
+        if archive is not None:
+            archive.close()
@@ -0,0 +1,250 @@
+"""
+Benchmarks the stages of scrape_game on the recorded games of tests/fixtures, without any network access.
+
+    python -m scraper.tests.benchmark                  # compare against the stored baseline
+    python -m scraper.tests.benchmark --update         # add the stages missing from the baseline
+    python -m scraper.tests.benchmark --rebaseline     # store every current result as the baseline
+    python -m scraper.tests.benchmark --record 2023020204   # record a game's sources as a new fixture
+
+Each stage is timed (best of --repeat runs) and its peak memory measured with tracemalloc, and so is
+importing the package in a fresh interpreter, which must not load the modules listed in LAZY_IMPORTS.
+A stage is flagged when it is slower or uses more memory than the baseline by more than
+--tolerance (and by more than a few milliseconds, to ignore timer noise).
+
+The baseline is fixed: --update only adds the results of new stages (or fixtures) and keeps the
+stored ones, so a change never hides its own regression by rewriting them. Timings depend on the
+machine, so run --rebaseline once on the machine the comparisons will run on.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+import warnings
+
+from scraper import build_game, build_rosters, build_plays, match_shifts, add_strength, add_player_names, normalize_coordinates, player_toi, shared_toi
+from scraper.utilis.functions import fetch_game_sources, shifts_from_reports
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASELINE_FILE = os.path.join(FIXTURES_DIR, 'benchmark_baseline.json')
+SOURCE_FILES = {'pbp': 'pbp.json', 'shifts_home': 'shifts_home.HTM', 'shifts_away': 'shifts_away.HTM', 'shifts_json': 'shifts.json'}
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Differences smaller than this are timer noise
+MIN_SECONDS = 0.01
+
+# Import statements timed in a fresh interpreter, with the modules they must not load
+LAZY_IMPORTS = {
+    'import scraper': ['pandas', 'numpy', 'requests', 'lxml', 'bs4', 'pyarrow', 'matplotlib'],
+    'from scraper import scrape_game': ['bs4', 'matplotlib'],
+}
+
+
+def load_fixture(game_id):
+    """
+    Returns the recorded sources of a game, as fetch_game_sources would.
+    """
+    folder = os.path.join(FIXTURES_DIR, str(game_id))
+    return {key: open(os.path.join(folder, file), 'rb').read() for key, file in SOURCE_FILES.items()
+            if os.path.exists(os.path.join(folder, file))}
+
+
+def fixture_game_ids():
+    return sorted(int(name) for name in os.listdir(FIXTURES_DIR) if name.isdigit())
+
+
+def record_fixture(game_id):
+    """
+    Fetches a game's sources from the NHL servers and stores them as a fixture.
+    """
+    folder = os.path.join(FIXTURES_DIR, str(game_id))
+    os.makedirs(folder, exist_ok=True)
+    for key, content in fetch_game_sources(game_id, shift_source='both').items():
+        with open(os.path.join(folder, SOURCE_FILES[key]), 'wb') as f:
+            f.write(content)
+
+
+def stages(game_id, sources):
+    """
+    Returns the stages of build_game as (name, callable) pairs, each one feeding the next.
+    """
+    state = {}
+
+    def normalize():
+        state['game_dict'] = json.loads(sources['pbp'])
+        state['rosters'] = build_rosters(game_id, state['game_dict'])
+        state['df'] = build_plays(game_id, state['game_dict'])
+
+    def parse_shifts():
+        state['shifts'] = shifts_from_reports(sources['shifts_home'], sources['shifts_away'])
+
+    def on_ice():
+        state['shifts'] = match_shifts(state['shifts'], state['rosters'])
+        state['df'], state['on_ice'] = add_strength(state['df'], state['shifts'])
+
+    def names():
+        state['df'] = add_player_names(state['df'], state['on_ice'], state['rosters'])
+
+    def geometry():
+        state['df'] = normalize_coordinates(state['df'])
+
+    return [('json_normalize', normalize), ('shift_parse', parse_shifts), ('on_ice', on_ice),
+            ('names', names), ('geometry', geometry), ('build_game', lambda: build_game(game_id, sources)),
+            ('build_rosters_only', lambda: build_game(game_id, sources, ['rosters'])),
+            ('build_events_only', lambda: build_game(game_id, sources, ['pbp'], on_ice=False)),
+            ('build_strength_only', lambda: build_game(game_id, sources, ['pbp'], on_ice=False, situation=True)),
+            ('player_toi', lambda: player_toi(state['shifts'])), ('shared_toi', lambda: shared_toi(state['shifts']))]
+
+
+def run_import(statement: str, traced: bool = False):
+    """
+    Runs an import statement in a fresh interpreter.
+
+    Returns:
+      A tuple (seconds, peak traced MB or None, list of the loaded modules).
+    """
+    code = "\n".join(["import sys, time, json, tracemalloc",
+                      "tracemalloc.start()" if traced else "",
+                      "start = time.perf_counter()",
+                      statement,
+                      "elapsed = time.perf_counter() - start",
+                      "peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None",
+                      "print(json.dumps([elapsed, peak, sorted(sys.modules)]))"])
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    elapsed, peak, modules = json.loads(out.stdout)
+    return elapsed, (None if peak is None else peak / 1024 ** 2), modules
+
+
+def eager_modules(statement: str, modules: list = None):
+    """
+    Returns the modules of LAZY_IMPORTS[statement] (or the given ones) that the statement loads.
+    """
+    modules = LAZY_IMPORTS[statement] if modules is None else modules
+    loaded = set(run_import(statement)[2])
+    return [module for module in modules if module in loaded]
+
+
+def run_import_benchmark(repeat: int = 10):
+    """
+    Times every statement of LAZY_IMPORTS.
+
+    Returns:
+      A dictionary of statement -> {'seconds': best time, 'peak_mb': peak traced memory}.
+    """
+    timings = {}
+    for statement in LAZY_IMPORTS:
+        seconds = min(run_import(statement)[0] for _ in range(repeat))
+        timings[statement] = {'seconds': round(seconds, 5), 'peak_mb': round(run_import(statement, traced=True)[1], 3)}
+    return timings
+
+
+def run_benchmark(repeat: int = 10):
+    """
+    Times every stage of every fixture game.
+
+    Returns:
+      A dictionary of game ID -> stage -> {'seconds': best time, 'peak_mb': peak traced memory}.
+    """
+    results = {}
+
+    for game_id in fixture_game_ids():
+        sources = load_fixture(game_id)
+        timings = {}
+
+        for run in range(repeat + 1):
+            # The last run is traced for memory, the others are timed
+            traced = run == repeat
+            for name, stage in stages(game_id, sources):
+                if traced:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                stage()
+                elapsed = time.perf_counter() - start
+
+                timing = timings.setdefault(name, {'seconds': float('inf'), 'peak_mb': 0.0})
+                if traced:
+                    timing['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 3)
+                    tracemalloc.stop()
+                else:
+                    timing['seconds'] = round(min(timing['seconds'], elapsed), 5)
+
+        results[str(game_id)] = timings
+
+    results['imports'] = run_import_benchmark(repeat)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.3):
+    """
+    Returns the list of regressions of results against baseline, as readable strings.
+    """
+    regressions = []
+
+    for game_id, timings in results.items():
+        for name, timing in timings.items():
+            base = baseline.get(game_id, {}).get(name)
+            if base is None:
+                continue
+            if timing['seconds'] > base['seconds'] * (1 + tolerance) and timing['seconds'] - base['seconds'] > MIN_SECONDS:
+                regressions.append(f"{game_id} {name}: {timing['seconds']:.4f}s vs {base['seconds']:.4f}s")
+            if timing['peak_mb'] > base['peak_mb'] * (1 + tolerance):
+                regressions.append(f"{game_id} {name}: {timing['peak_mb']:.2f}MB vs {base['peak_mb']:.2f}MB")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help='number of timed runs per stage')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='allowed slowdown before flagging a regression')
+    parser.add_argument('--update', action='store_true', help='add the results missing from the baseline')
+    parser.add_argument('--rebaseline', action='store_true', help='store every result as the new baseline')
+    parser.add_argument('--record', type=int, nargs='+', metavar='GAME_ID', help='record game sources as fixtures')
+    args = parser.parse_args(argv)
+
+    if args.record:
+        for game_id in args.record:
+            record_fixture(game_id)
+        return 0
+
+    warnings.simplefilter('ignore', FutureWarning)
+    results = run_benchmark(args.repeat)
+
+    for game_id, timings in results.items():
+        print(game_id)
+        for name, timing in timings.items():
+            print(f"  {name:<31} {timing['seconds']:>9.4f}s {timing['peak_mb']:>9.2f}MB")
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE) and not args.rebaseline:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+
+    if args.update or args.rebaseline or not baseline:
+        added = 0
+        for group, timings in results.items():
+            for name, timing in timings.items():
+                if name not in baseline.setdefault(group, {}):
+                    baseline[group][name] = timing
+                    added += 1
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"{added} results added to {BASELINE_FILE}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    for statement in LAZY_IMPORTS:
+        regressions += [f"{statement!r} loads {module}" for module in eager_modules(statement)]
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
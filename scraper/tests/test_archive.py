@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+
+from scraper import scrape_game, replay_season
+from scraper.utilis.archive import RawArchive, raw_archive_file
+from scraper.tests.benchmark import load_fixture
+
+
+def test_append_and_get(tmp_path):
+    sources = load_fixture(2023020000)
+    path = raw_archive_file(20232024, tmp_path)
+
+    with RawArchive(path) as archive:
+        archive.append(2023020000, sources)
+        archive.append(2023020070, {'pbp': b'{"id": 2023020070}'})
+        archive.append(2023020070, {'pbp': b'{"id": 2023020070, "updated": true}'})
+
+        assert archive.get(2023020000) == sources
+        assert archive.get(2023020000, ['pbp']) == {'pbp': sources['pbp']}
+        assert archive.get(2023020070) == {'pbp': b'{"id": 2023020070, "updated": true}'}
+        assert os.path.getsize(path) < sum(map(len, sources.values()))
+
+    # The pack alone is enough, and a truncated last record is dropped
+    os.remove(os.path.splitext(path)[0] + '.idx')
+    with open(path, 'ab') as f:
+        f.write(b'NRAW\x00\x01')
+
+    with RawArchive(path) as archive:
+        assert archive.game_ids() == [2023020000, 2023020070]
+        assert archive.get(2023020000) == sources
+        assert archive.get(2023020070) == {'pbp': b'{"id": 2023020070, "updated": true}'}
+
+
+def test_append_again_with_fewer_sources(tmp_path):
+    sources = load_fixture(2023020000)
+    path = raw_archive_file(20232024, tmp_path)
+    fewer = {'pbp': sources['pbp'], 'shifts_json': b'{"data": [], "total": 0}'}
+
+    with RawArchive(path) as archive:
+        archive.append(2023020000, {key: sources[key] for key in ('pbp', 'shifts_home', 'shifts_away')})
+        archive.append(2023020070, {'pbp': b'{"id": 2023020070}'})
+        archive.append(2023020000, fewer)
+        assert archive.get(2023020000) == fewer
+
+    # The later batch replaces the game's sources, whether the index is reloaded or rebuilt
+    with RawArchive(path) as archive:
+        assert archive.get(2023020000) == fewer
+    os.remove(os.path.splitext(path)[0] + '.idx')
+    with RawArchive(path) as archive:
+        assert archive.get(2023020000) == fewer
+        assert archive.get(2023020070) == {'pbp': b'{"id": 2023020070}'}
+
+
+def test_replay(tmp_path):
+    sources = load_fixture(2023020000)
+    with RawArchive(raw_archive_file(20232024, tmp_path)) as archive:
+        archive.append(2023020000, sources)
+
+    replayed = scrape_game(2023020000, archive=raw_archive_file(20232024, tmp_path))
+    expected = scrape_game(2023020000, sources=sources)
+    for table in expected:
+        pd.testing.assert_frame_equal(replayed[table], expected[table])
+
+    (game_id, result), = replay_season(20232024, path=tmp_path, processes=1, file='pbp')
+    assert game_id == 2023020000
+    pd.testing.assert_frame_equal(result, expected['pbp'])
@@ -0,0 +1,92 @@
+import os
+import json
+import pytest
+import requests
+from datetime import date, timedelta
+
+from scraper.utilis.cache import ResponseCache, CacheMissError, cache_ttl
+from scraper.utilis.constants import (PLAY_BY_PLAY_ENDPOINT, STANDINGS_ENDPOINT, SHIFT_API_ENDPOINT, SCHEDULE_WEEK_ENDPOINT,
+                                      CACHE_TTL_LIVE, CACHE_TTL_SHORT)
+
+
+def make_response(content: bytes, status_code: int = 200):
+    response = requests.Response()
+    response._content = content
+    response.status_code = status_code
+    return response
+
+
+def test_cache_roundtrip_and_offline(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    url = PLAY_BY_PLAY_ENDPOINT.format(game_id=2023020001)
+    body = json.dumps({'gameState': 'OFF', 'plays': []}).encode()
+
+    assert cache.get(url) is None
+    cache.put(url, make_response(body))
+    assert cache.get(url).json() == {'gameState': 'OFF', 'plays': []}
+
+    offline = ResponseCache(path=str(tmp_path), offline=True)
+    assert offline.get(url).content == body
+    with pytest.raises(CacheMissError):
+        offline.get(PLAY_BY_PLAY_ENDPOINT.format(game_id=2023020002))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(path=str(tmp_path), max_bytes=2500)
+    urls = [PLAY_BY_PLAY_ENDPOINT.format(game_id=2023020000 + i) for i in range(3)]
+
+    for url in urls:
+        cache.put(url, make_response(os.urandom(900)))
+        cache.get(urls[0])
+
+    assert cache.size() <= 2500
+    assert cache.get(urls[0]) is not None
+    assert cache.get(urls[1]) is None
+
+
+def test_cache_ttl():
+    assert cache_ttl(PLAY_BY_PLAY_ENDPOINT.format(game_id=1), b'{"gameState": "FINAL"}') is None
+    assert cache_ttl(PLAY_BY_PLAY_ENDPOINT.format(game_id=1), b'{"gameState": "LIVE"}') > 0
+    assert cache_ttl(STANDINGS_ENDPOINT.format(date='now'), b'{}') > 0
+    assert cache_ttl(STANDINGS_ENDPOINT.format(date='2020-01-01'), b'{}') is None
+    assert cache_ttl(SHIFT_API_ENDPOINT.format(game_id=1), b'{"data": []}') == CACHE_TTL_LIVE
+
+
+def test_cache_ttl_of_schedule_weeks():
+    def week(*states):
+        return json.dumps({'gameWeek': [{'games': [{'gameState': state} for state in states]}]}).encode()
+
+    this_week = SCHEDULE_WEEK_ENDPOINT.format(date=(date.today() - timedelta(days=3)).isoformat())
+    past_week = SCHEDULE_WEEK_ENDPOINT.format(date=(date.today() - timedelta(days=10)).isoformat())
+
+    # A week that started a few days ago still has games to play
+    assert cache_ttl(this_week, week('OFF', 'FUT')) == CACHE_TTL_SHORT
+    assert cache_ttl(this_week, b'{}') == CACHE_TTL_SHORT
+    assert cache_ttl(this_week, week('OFF', 'FINAL')) is None
+    assert cache_ttl(past_week, week('FUT')) is None
+
+
+def test_shiftcharts_of_final_games_never_expire(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    shifts = make_response(b'{"data": [], "total": 0}')
+    final = make_response(b'{"gameState": "OFF"}')
+
+    def expires_at(url):
+        return cache._db.execute("SELECT expires_at FROM entries WHERE key = ?", (cache.key(url),)).fetchone()[0]
+
+    # The shifts stored after the final play-by-play
+    cache.put(PLAY_BY_PLAY_ENDPOINT.format(game_id=2023020001), final)
+    cache.put(SHIFT_API_ENDPOINT.format(game_id=2023020001), shifts)
+    assert expires_at(SHIFT_API_ENDPOINT.format(game_id=2023020001)) is None
+
+    # The shifts stored before it, or with a live play-by-play, may be from the game in progress
+    cache.put(SHIFT_API_ENDPOINT.format(game_id=2023020002), shifts)
+    cache.put(PLAY_BY_PLAY_ENDPOINT.format(game_id=2023020002), final)
+    cache.put(PLAY_BY_PLAY_ENDPOINT.format(game_id=2023020003), make_response(b'{"gameState": "LIVE"}'))
+    cache.put(SHIFT_API_ENDPOINT.format(game_id=2023020003), shifts)
+    assert expires_at(SHIFT_API_ENDPOINT.format(game_id=2023020002)) is not None
+    assert expires_at(SHIFT_API_ENDPOINT.format(game_id=2023020003)) is not None
+
+    # Fetched again once the game is final
+    cache.put(SHIFT_API_ENDPOINT.format(game_id=2023020002), shifts)
+    assert expires_at(SHIFT_API_ENDPOINT.format(game_id=2023020002)) is None
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from scraper import build_game
+from scraper.utilis.geometry import geometry, add_geometry, GEOMETRY_COLUMNS
+from scraper.utilis.helpers import adjust_x_coord
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.utilis.functions import get_pbp
+from scraper.tests.benchmark import load_fixture
+from scraper.tests.test_scrape import FixtureTransport
+
+
+def test_geometry():
+    # Home team attacking the right net, away team attacking the left net, then no y coordinate
+    features = geometry(x=[69, -89, -95, 10], y=[20, 0, -5, np.nan], defending_side=['left', 'left', 'left', 'right'], is_home=[1, 0, 0, 1])
+
+    assert all(values.dtype == np.float32 for values in features.values())
+    np.testing.assert_allclose(features['normalized_xCoord'], [69, 89, 95, -10])
+    np.testing.assert_allclose(features['normalized_yCoord'], [20, 0, 5, np.nan])
+    np.testing.assert_allclose(features['shot_distance'], [np.hypot(20, 20), 0, np.hypot(6, 5), np.nan], rtol=1e-6)
+    np.testing.assert_allclose(features['shot_angle'], [45, 0, 180 - np.degrees(np.arctan2(5, 6)), np.nan], rtol=1e-6)
+    np.testing.assert_array_equal(features['rink_zone'], [1, 1, 1, np.nan])
+    np.testing.assert_array_equal(features['left_side'], [1, 0, 1, np.nan])
+    np.testing.assert_array_equal(features['behind_net'], [0, 0, 1, np.nan])
+
+
+def test_add_geometry_matches_row_wise_flip():
+    events = pd.DataFrame({'xCoord': [60.0, 60.0, 60.0, 60.0, 60.0], 'yCoord': [10.0] * 5,
+                           'homeTeamDefendingSide': ['left', 'right', 'left', 'right', 'left'], 'is_home': [1, 1, 0, 0, np.nan]})
+
+    season = add_geometry(pd.concat([events] * 1000, ignore_index=True))
+
+    expected = events.apply(adjust_x_coord, axis=1).tolist() * 1000
+    np.testing.assert_array_equal(season['normalized_xCoord'], expected)
+    assert set(GEOMETRY_COLUMNS) <= set(season.columns)
+
+
+def test_get_pbp_and_scrape_game_share_geometry():
+    sources = load_fixture(2023020000)
+    pbp = build_game(2023020000, sources, ['pbp'], on_ice=False)['pbp']
+
+    previous = get_transport()
+    try:
+        set_transport(FixtureTransport(sources))
+        events = get_pbp(2023020000)
+    finally:
+        set_transport(previous)
+
+    key = ['elapsedTime', 'eventId'] if 'eventId' in events else ['elapsedTime', 'sortOrder']
+    merged = pbp.merge(events, on=key, suffixes=('', '_get_pbp'))
+    assert len(merged) == len(pbp)
+    for col in GEOMETRY_COLUMNS:
+        np.testing.assert_array_equal(merged[col], merged[f'{col}_get_pbp'])
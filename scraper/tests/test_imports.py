@@ -0,0 +1,21 @@
+import sys
+import subprocess
+
+from scraper.tests.benchmark import LAZY_IMPORTS, ROOT_DIR, eager_modules
+
+
+def test_imports_are_lazy():
+    for statement in LAZY_IMPORTS:
+        assert eager_modules(statement) == [], statement
+
+
+def test_submodules_are_not_looked_up_in_the_pipeline():
+    code = "\n".join(["import sys, scraper",
+                      "assert scraper.scraper is sys.modules['scraper.scraper']",
+                      "assert scraper.utilis is sys.modules['scraper.utilis']"])
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, check=True)
+
+
+def test_command_line():
+    out = subprocess.run([sys.executable, '-m', 'scraper', '--help'], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    assert 'GAME_ID' in out.stdout
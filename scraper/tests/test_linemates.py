@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scraper.utilis.linemates import SharedToi, PlayerIndex, shared_toi
+from scraper.tests.test_onice import make_shifts
+
+
+def self_merge(shifts):
+    """Shared seconds of every pair of skaters, the memory hungry way."""
+    skaters = shifts[shifts['positionCode'] != 'G']
+    pairs = skaters.merge(skaters, how='cross')
+    overlap = (np.minimum(pairs['endTime_s_x'], pairs['endTime_s_y']) - np.maximum(pairs['startTime_s_x'], pairs['startTime_s_y'])).clip(lower=0)
+    pairs = pairs.assign(seconds=overlap, kind=np.where(pairs['is_home_x'] == pairs['is_home_y'], 'with', 'vs'))[overlap > 0]
+    return pairs.groupby(['kind', 'playerId_x', 'playerId_y'])['seconds'].sum()
+
+
+def as_series(frame):
+    return frame.set_index(['playerId', 'other_playerId'])['seconds'].sort_index().rename_axis(['playerId_x', 'playerId_y'])
+
+
+def test_shared_toi_matches_self_merge():
+    shifts = make_shifts().assign(gameId=2023020001)
+    expected = self_merge(shifts)
+
+    linemates = shared_toi(shifts)
+
+    for kind in ('with', 'vs'):
+        pd.testing.assert_series_equal(as_series(linemates.to_frame(kind)), expected[kind].astype('int64'))
+
+
+def test_streaming_accumulation():
+    games = [make_shifts().assign(gameId=2023020001 + i) for i in range(4)]
+
+    streamed = SharedToi(states=['PP', 'SH'], buffer_size=100)
+    for game in games:
+        streamed.add(game)
+    batch = shared_toi(pd.concat(games, ignore_index=True), states=['PP', 'SH'])
+    merged = SharedToi(states=['PP', 'SH']).update(shared_toi(games[:2], states=['PP', 'SH'])).update(shared_toi(games[2:], states=['PP', 'SH']))
+
+    for kind in ('with', 'vs'):
+        pd.testing.assert_frame_equal(streamed.to_frame(kind), batch.to_frame(kind))
+        pd.testing.assert_series_equal(as_series(merged.to_frame(kind)), as_series(batch.to_frame(kind)))
+    assert len(streamed.index) == 24
+
+
+def test_player_index():
+    index = PlayerIndex([8478402, 8471214])
+
+    assert index.add([8471214, 8480000, 8478402]).tolist() == [1, 2, 0]
+    assert index.positions([8480000]).tolist() == [2]
+    with pytest.raises(KeyError):
+        index.positions([1])
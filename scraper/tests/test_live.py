@@ -0,0 +1,139 @@
+import re
+import json
+import requests
+import pandas as pd
+
+from scraper import LiveGame, build_game
+from scraper.utilis.functions import game_source_urls, shifts_from_reports
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.tests.benchmark import load_fixture
+from scraper.tests.test_shifts import shiftcharts
+
+
+GAME_ID = 2023020000
+SCORE_COLUMNS = ['homeScore', 'awayScore', 'homeSOG', 'awaySOG']
+
+# Shift rows of the second and third periods
+LATER_PERIODS = re.compile(rb'<tr class="\w+Color"><td[^>]*>\d+</td><td[^>]*>[23]</td>.*?</tr>\n')
+
+
+def sources_with(plays, shifts=None):
+    """The fixture's HTML sources with the given plays (and shift reports)."""
+    sources = load_fixture(GAME_ID)
+    game_dict = json.loads(sources['pbp'])
+    sources = {key: sources[key] for key in ('shifts_home', 'shifts_away')} if shifts is None else shifts
+    return {'pbp': json.dumps({**game_dict, 'plays': plays}).encode(), **sources}
+
+
+def expected_pbp(sources):
+    return build_game(GAME_ID, sources, ['pbp'])['pbp']
+
+
+def assert_same_plays(live, expected):
+    # Plays at the same second may come in another order
+    live = live[expected.columns].sort_values('eventId', ignore_index=True)
+    pd.testing.assert_frame_equal(live, expected.sort_values('eventId', ignore_index=True), check_dtype=False)
+
+
+def fixture_plays():
+    return json.loads(load_fixture(GAME_ID)['pbp'])['plays']
+
+
+def test_poll_appends_new_plays():
+    plays = fixture_plays()
+    game = LiveGame(GAME_ID)
+
+    first = game.poll(sources_with(plays[:150]))
+    assert len(first) == 150
+    assert game.poll(sources_with(plays[:150])).empty
+
+    new = game.poll(sources_with(plays))
+    assert sorted(new['eventId']) == sorted(play['eventId'] for play in plays[150:])
+    assert_same_plays(game.pbp, expected_pbp(sources_with(plays)))
+
+
+def test_poll_with_an_edited_earlier_play():
+    plays = fixture_plays()
+    game = LiveGame(GAME_ID)
+    game.poll(sources_with(plays[:150]))
+
+    edited = [dict(play) for play in plays[:155]]
+    edited[5] = {**edited[5], 'details': {**edited[5].get('details', {}), 'xCoord': -edited[5].get('details', {}).get('xCoord', 0)}}
+    sources = sources_with(edited)
+
+    changed = game.poll(sources)
+    assert sorted(changed['eventId']) == sorted([edited[5]['eventId']] + [play['eventId'] for play in edited[150:]])
+
+    # The new plays keep the running totals of the plays between them and the edited one
+    expected = expected_pbp(sources)
+    new = expected[expected['eventId'].isin([play['eventId'] for play in edited[150:]])]
+    pd.testing.assert_frame_equal(changed.set_index('eventId').loc[new['eventId'], SCORE_COLUMNS].reset_index(drop=True),
+                                  new[SCORE_COLUMNS].reset_index(drop=True))
+    assert_same_plays(game.pbp, expected)
+
+
+def test_poll_with_updated_shift_reports():
+    plays = fixture_plays()
+    full = load_fixture(GAME_ID)
+    first_period = {key: LATER_PERIODS.sub(b'', full[key]) for key in ('shifts_home', 'shifts_away')}
+    assert len(first_period['shifts_home']) < len(full['shifts_home'])
+
+    game = LiveGame(GAME_ID)
+    game.poll(sources_with(plays, first_period))
+    late = game.pbp['elapsedTime'] > 1200
+    assert (game.pbp.loc[late, 'home_skaters'] == 0).all()
+
+    # Newer reports resolve the plays after the end of the previous ones, and only those
+    updated = game.poll(sources_with(plays))
+    assert set(updated['eventId']) == set(game.pbp.loc[game.pbp['elapsedTime'] >= 1200, 'eventId'])
+    assert_same_plays(game.pbp, expected_pbp(sources_with(plays)))
+
+
+class LiveTransport:
+    """Serves the given payloads of a game by source, 404 for the others, and records the requested sources."""
+
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.sources = {url: source for source, url in game_source_urls(GAME_ID, shift_source='both').items()}
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        source = self.sources[url]
+        self.requested.append(source)
+        response = requests.Response()
+        response.url = url
+        response.status_code = 404 if self.payloads.get(source) is None else 200
+        response._content = self.payloads.get(source) or b''
+        return response
+
+
+def poll(game, transport):
+    previous = get_transport()
+    try:
+        set_transport(transport)
+        return game.poll()
+    finally:
+        set_transport(previous)
+
+
+def test_poll_before_the_shifts_are_published():
+    sources = load_fixture(GAME_ID)
+    pbp_json = json.loads(sources['pbp'])
+    transport = LiveTransport({'pbp': sources['pbp'], 'shifts_json': b'{"data": [], "total": 0}'})
+    game = LiveGame(GAME_ID)
+
+    # The reports still 404: no shifts yet, not an error
+    assert len(poll(game, transport)) == len(pbp_json['plays'])
+    assert set(transport.requested) == {'pbp', 'shifts_json', 'shifts_home', 'shifts_away'}
+    assert (game.pbp['home_skaters'] == 0).all()
+
+    # The JSON shifts are preferred once published, like in build_game
+    shifts_json = shiftcharts(shifts_from_reports(sources['shifts_home'], sources['shifts_away']), pbp_json)
+    transport.payloads.update(sources, shifts_json=shifts_json)
+    assert len(poll(game, transport)) == len(pbp_json['plays'])
+    assert_same_plays(game.pbp, expected_pbp({'pbp': sources['pbp'], 'shifts_json': shifts_json}))
+
+    # and the reports are no longer polled
+    transport.requested = []
+    assert poll(game, transport).empty
+    assert sorted(transport.requested) == ['pbp', 'shifts_json']
@@ -0,0 +1,18 @@
+
+from scraper.utilis.manifest import Manifest
+from scraper.utilis.constants import MANIFEST_DONE, MANIFEST_FAILED
+
+
+def test_manifest_tracks_done_and_failed(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite'))
+
+    manifest.mark_failed(2023020001, 20232024, ValueError('bad report'))
+    manifest.mark_done(2023020002, 20232024, '2023-10-10', 'abc', {'pbp': 'pbp/2023020002.parquet'})
+    assert manifest.game_ids(MANIFEST_DONE) == {2023020002}
+    assert manifest.game_ids(MANIFEST_FAILED, season=20232024) == {2023020001}
+
+    manifest.mark_done(2023020001, 20232024, '2023-10-10', 'def', {})
+    entry = manifest.get(2023020001)
+    assert (entry['status'], entry['attempts'], entry['error'], entry['checksum']) == (MANIFEST_DONE, 2, None, 'def')
+    assert manifest.get(2023020002)['outputs'] == {'pbp': 'pbp/2023020002.parquet'}
+    assert manifest.get(2023020003) is None
@@ -0,0 +1,67 @@
+import json
+import logging
+import requests
+
+from scraper import build_game
+from scraper.tests.benchmark import load_fixture
+from scraper.utilis.metrics import MemorySink, JsonLogSink, PrometheusSink, add_sink, remove_sink, span, count
+from scraper.utilis.cache import enable_cache, disable_cache
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.utilis.functions import http_get
+
+
+class FakeTransport:
+    def get(self, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = b'{"gameState": "OFF"}'
+        return response
+
+
+def test_build_game_spans():
+    sink = add_sink(MemorySink())
+    try:
+        build_game(2023020000, load_fixture(2023020000))
+    finally:
+        remove_sink(sink)
+
+    stages = {row['name']: row for row in sink.summary() if row['type'] == 'span'}
+    assert {'parse_shifts', 'normalize', 'on_ice', 'names', 'coordinates'} <= set(stages)
+    assert all(row['count'] == 1 and row['seconds'] > 0 for row in stages.values())
+
+
+def test_fetch_counters(tmp_path, caplog):
+    previous = get_transport()
+    sink = add_sink(PrometheusSink())
+    log_sink = add_sink(JsonLogSink())
+    try:
+        set_transport(FakeTransport())
+        enable_cache(path=str(tmp_path))
+        with caplog.at_level(logging.INFO, logger='scraper.utilis.metrics'):
+            for _ in range(3):
+                http_get('https://api-web.nhle.com/v1/gamecenter/2023020000/play-by-play')
+    finally:
+        disable_cache()
+        set_transport(previous)
+        remove_sink(sink)
+        remove_sink(log_sink)
+
+    endpoint = (('endpoint', '/v1/gamecenter/*/play-by-play'),)
+    assert sink.counters[('cache_misses', endpoint)] == 1
+    assert sink.counters[('cache_hits', endpoint)] == 2
+    assert sink.counters[('bytes_downloaded', endpoint)] == 20
+    assert sink.spans[('fetch', endpoint)]['bytes'] == 20
+
+    text = sink.render()
+    assert 'nhl_scraper_cache_hits_total{endpoint="/v1/gamecenter/*/play-by-play"} 2' in text
+    assert 'nhl_scraper_span_seconds_count{endpoint="/v1/gamecenter/*/play-by-play",span="fetch"} 1' in text
+
+    records = [json.loads(record.getMessage()) for record in caplog.records]
+    assert [record['name'] for record in records if record['type'] == 'counter'] == ['cache_misses', 'bytes_downloaded', 'cache_hits', 'cache_hits']
+
+
+def test_disabled_is_a_noop():
+    with span('stage', endpoint='x') as s:
+        s.set(bytes=1)
+    count('retries')
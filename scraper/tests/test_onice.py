@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from scraper.utilis.onice import resolve_on_ice, pad_id_lists, decode_situation, compare_strength
+
+
+def make_shifts():
+    rng = np.random.default_rng(0)
+    rows = []
+    for is_home in (0, 1):
+        for player in range(12):
+            start = 0
+            while start < 3600:
+                length = int(rng.integers(20, 70))
+                rows.append({'playerId': 8470000 + is_home * 100 + player, 'positionCode': 'C' if player % 3 else 'D',
+                             'is_home': is_home, 'startTime_s': start, 'endTime_s': start + length})
+                start += length + int(rng.integers(60, 140))
+        rows.append({'playerId': 8480000 + is_home, 'positionCode': 'G', 'is_home': is_home, 'startTime_s': 0, 'endTime_s': 3500})
+    return pd.DataFrame(rows)
+
+
+def test_resolve_on_ice_matches_query():
+    shifts = make_shifts()
+    seconds = pd.Series([0, 5, 5, 600, 1199, 1200, 2400, 3499, 3500, 3599, 3700])
+
+    on_ice = resolve_on_ice(shifts, seconds)
+
+    for i, second in enumerate(seconds):
+        for side, is_home in (('home', 1), ('away', 0)):
+            skaters = shifts.query("positionCode != 'G' and startTime_s <= @second and endTime_s > @second and is_home == @is_home").playerId
+            goalies = shifts.query("positionCode == 'G' and startTime_s <= @second and endTime_s > @second and is_home == @is_home").playerId.unique().tolist()
+
+            assert on_ice.loc[i, f'{side}_skater_ids'] == skaters.unique().tolist()
+            assert on_ice.loc[i, f'{side}_skaters'] == skaters.nunique()
+            expected_goalie = goalies[0] if len(goalies) == 1 else np.nan
+            assert np.isclose(on_ice.loc[i, f'{side}_goalie_id'], expected_goalie, equal_nan=True)
+
+
+def test_pad_id_lists():
+    matrix = pad_id_lists([[1, 2, 3], [], [4]])
+
+    assert matrix.shape == (3, 3)
+    np.testing.assert_array_equal(matrix, [[1, 2, 3], [np.nan] * 3, [4, np.nan, np.nan]])
+
+
+def test_decode_situation():
+    situation = decode_situation(['1551', '1451', None, '0651', 1560], is_home=[1, 0, 1, np.nan, 0])
+
+    assert situation['home_skaters'].tolist() == [5, 5, pd.NA, 5, 6]
+    assert situation['away_skaters'].tolist() == [5, 4, pd.NA, 6, 5]
+    assert situation['home_empty_net'].tolist() == [0, 0, pd.NA, 0, 1]
+    assert situation['away_empty_net'].tolist() == [0, 0, pd.NA, 1, 0]
+    assert situation['game_strength'].tolist() == ['5v5', '4v5', None, '5v6', '5v6']
+    assert situation['strength_state'].tolist() == ['5v5', 'SH', None, 'EN', 'EN']
+
+
+def test_compare_strength():
+    counts = pd.DataFrame({'home_skaters': [5, 5, 4], 'away_skaters': [5, 4, 5]})
+    situation = decode_situation(['1551', '1551', None])
+
+    mismatches = compare_strength(counts, situation)
+
+    assert mismatches.index.tolist() == [1]
+    assert mismatches.iloc[0].tolist() == [5, 4, 5, 5]
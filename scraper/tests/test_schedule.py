@@ -0,0 +1,57 @@
+import json
+import requests
+from datetime import date, timedelta
+
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.utilis.schedule import build_season_index, read_season_index
+
+
+class ScheduleTransport:
+    """Serves a 2022-2023 season with two games a day in October, every game final."""
+
+    def __init__(self):
+        self.urls = []
+
+    def week(self, start):
+        days = []
+        for offset in range(7):
+            day = start + timedelta(days=offset)
+            games = []
+            if date(2022, 10, 1) <= day <= date(2022, 10, 31):
+                first = 2022020001 + 2 * (day - date(2022, 10, 1)).days
+                games = [{'id': first + i, 'season': 20222023, 'gameType': 2, 'gameState': 'OFF',
+                          'awayTeam': {'abbrev': 'TOR'}, 'homeTeam': {'abbrev': 'MTL' if i else 'BOS'}} for i in range(2)]
+            days.append({'date': day.isoformat(), 'games': games})
+        return {'gameWeek': days}
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = json.dumps(self.week(date.fromisoformat(url.rsplit('/', 1)[1]))).encode()
+        return response
+
+
+def test_build_season_index(tmp_path):
+    previous = get_transport()
+    transport = ScheduleTransport()
+    try:
+        set_transport(transport)
+        index = build_season_index(20222023, path=str(tmp_path))
+        first_run = len(transport.urls)
+        build_season_index(20222023, path=str(tmp_path))
+    finally:
+        set_transport(previous)
+
+    assert index['gameId'].tolist() == list(range(2022020001, 2022020063))
+    assert str(index['gameId'].dtype) == 'int32'
+    assert index['gameDate'].min() == index['gameDate'].iloc[0]
+    assert first_run == 48
+
+    # Only the weeks after the last final game are fetched again
+    assert 0 < len(transport.urls) - first_run < first_run
+
+    mtl = read_season_index(20222023, path=str(tmp_path), teams=['MTL'])
+    assert len(mtl) == 31
+    assert (mtl['homeTeam_abbrev'] == 'MTL').all()
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from scraper import build_game
+from scraper.utilis.schema import compact_game, concat_compact
+from scraper.tests.benchmark import load_fixture
+
+
+def make_game(game_id, names):
+    pbp = pd.DataFrame({'gameId': [game_id] * 3, 'period': [1, 2, 3], 'event': ['shot', 'goal', 'shot'],
+                        'xCoord': [10.0, np.nan, -80.0], 'event_player1_Id': [8470001, np.nan, 8470002],
+                        'event_player1_fullName': names + [np.nan], 'home_skater_fullName1': names[::-1] + [np.nan]})
+    rosters = pd.DataFrame({'playerId': [8470001, 8470002], 'gameId': [game_id] * 2, 'fullName': names})
+    return {'pbp': pbp, 'rosters': rosters}
+
+
+def test_compact_game():
+    game = make_game(2023020001, ['Nick Suzuki', 'John Tavares'])
+    compact = compact_game(game)
+    pbp = compact['pbp']
+
+    assert pbp['gameId'].dtype == 'Int32'
+    assert pbp['period'].dtype == 'Int8'
+    assert pbp['xCoord'].dtype == 'float32'
+    assert pbp['event_player1_Id'].dtype == 'Int32'
+    assert pbp['event'].dtype == 'category'
+    assert pbp['event_player1_fullName'].dtype == pbp['home_skater_fullName1'].dtype == 'category'
+    assert compact['rosters']['fullName'].dtype == object
+    assert pbp['event_player1_fullName'].astype(object).tolist()[:2] == ['Nick Suzuki', 'John Tavares']
+    assert pbp['event_player1_Id'].isna().tolist() == [False, True, False]
+
+
+def test_concat_compact():
+    first = compact_game(make_game(2023020001, ['Nick Suzuki', 'John Tavares']))['pbp']
+    second = compact_game(make_game(2023020002, ['Cole Caufield', 'Auston Matthews']))['pbp']
+
+    season = concat_compact([first, second])
+
+    assert len(season) == 6
+    assert season['event'].dtype == 'category'
+    assert season['event_player1_fullName'].dtype == season['home_skater_fullName1'].dtype
+    assert set(season['event_player1_fullName'].cat.categories) == {'Nick Suzuki', 'John Tavares', 'Cole Caufield', 'Auston Matthews'}
+
+
+def test_compact_game_never_grows_a_table():
+    game = build_game(2023020000, load_fixture(2023020000), situation=True)
+    compact = compact_game(game)
+
+    for table, df in game.items():
+        assert compact[table].memory_usage(deep=True).sum() <= df.memory_usage(deep=True).sum(), table
@@ -1,29 +1,213 @@
-import sys
-import os
 import json
-import requests
-import pandas as pd
-from datetime import datetime
-from datetime import timedelta
+import time
+import threading
 import numpy as np
-import matplotlib.pyplot as plt
-import glob
-import re
+import pandas as pd
+import pytest
+import requests
+
+from scraper import scrape_game, scrape_games, build_game, transform_games, game_stages, GAME_STAGES
+from scraper.utilis.constants import DEFAULT_HOST_CONCURRENCY, PLAY_BY_PLAY_ENDPOINT
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.utilis.functions import shifts_from_reports, SourceFetchError
+from scraper.utilis.onice import STRENGTH_STATES
+from scraper.tests.benchmark import load_fixture
+from scraper.tests.test_shifts import shiftcharts
+
 
+def test_scrape_game():
+    result = scrape_game(2020020001)
 
+    assert len(result) == 3
 
 
+def test_scrape_game_from_fixture():
+    result = scrape_game(2023020000, sources=load_fixture(2023020000))
 
+    assert set(result) == {'pbp', 'rosters', 'shifts'}
+    assert (result['pbp']['gameId'] == 2023020000).all()
 
 
-# Add the parent directory to the path so we can import the module
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from scraper import scrape_game
+def on_ice(pbp, side):
+    ids = pbp.filter(regex=f'^{side}_skater_id\\d$').to_numpy()
+    return [frozenset(row[~np.isnan(row)]) for row in ids.astype(float)]
 
 
-def test_scrape_game():
-    result = scrape_game(2020020001)
+def test_build_game_from_json_shifts():
+    sources = load_fixture(2023020000)
+    pbp_json = json.loads(sources['pbp'])
+    html_shifts = shifts_from_reports(sources['shifts_home'], sources['shifts_away'])
+    shifts_json = shiftcharts(html_shifts, pbp_json)
 
-    assert len(result) == 3
+    from_reports = build_game(2023020000, sources)
+    from_json = build_game(2023020000, {'pbp': sources['pbp'], 'shifts_json': shifts_json})
+    from_both = build_game(2023020000, {**sources, 'shifts_json': shifts_json})
+
+    for result in (from_json, from_both):
+        assert len(result['shifts']) == len(from_reports['shifts'])
+        pd.testing.assert_frame_equal(result['rosters'], from_reports['rosters'])
+        for col in ('game_strength', 'home_skaters', 'away_skaters', 'home_goalie_id', 'away_goalie_id'):
+            pd.testing.assert_series_equal(result['pbp'][col], from_reports['pbp'][col])
+        for side in ('home', 'away'):
+            assert on_ice(result['pbp'], side) == on_ice(from_reports['pbp'], side)
+
+
+class FixtureTransport:
+    """Serves the fixture's play-by-play and records the requested URLs."""
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = self.sources['pbp'] if 'play-by-play' in url else b''
+        return response
+
+
+def test_game_stages():
+    assert game_stages(['rosters']) == ['game', 'rosters']
+    assert game_stages(['pbp'], on_ice=False) == ['game', 'rosters', 'plays', 'names', 'coordinates']
+    assert game_stages(['pbp'], on_ice=False, situation=True) == ['game', 'rosters', 'plays', 'situation', 'names', 'coordinates']
+    assert game_stages(situation=True) == list(GAME_STAGES)
+    with pytest.raises(ValueError):
+        game_stages(['events'])
+
+
+def test_scrape_game_only_builds_requested_outputs():
+    sources = load_fixture(2023020000)
+    expected = build_game(2023020000, sources)
+
+    previous = get_transport()
+    transport = FixtureTransport(sources)
+    try:
+        set_transport(transport)
+        rosters = scrape_game(2023020000, file='rosters')
+        events = scrape_game(2023020000, outputs=['pbp'], on_ice=False)
+        strength = scrape_game(2023020000, file='pbp', on_ice=False, situation=True)
+    finally:
+        set_transport(previous)
+
+    assert all('play-by-play' in url for url in transport.urls)
+    pd.testing.assert_frame_equal(rosters, expected['rosters'])
+
+    assert set(events) == {'pbp'}
+    assert 'game_strength' not in events['pbp'] and 'home_skater_id1' not in events['pbp']
+    pd.testing.assert_frame_equal(events['pbp'], expected['pbp'][events['pbp'].columns])
+
+    # situationCode agrees with the shifts on all but the events at a line change or after the final horn
+    agree = strength['game_strength'] == expected['pbp']['game_strength']
+    assert agree.mean() > 0.98
+    assert strength['strength_state'].isin(STRENGTH_STATES).all()
+
+
+class SlowTransport(FixtureTransport):
+    """Serves the fixture's play-by-play after a delay, failing for some games, and records the most requests in flight."""
+
+    def __init__(self, sources, delays, failing=()):
+        super().__init__(sources)
+        self.delays = delays
+        self.failing = failing
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            game_id = int(url.split('/')[-2])
+            time.sleep(self.delays.get(game_id, 0.05))
+            if game_id in self.failing:
+                raise requests.exceptions.ConnectionError(f"No route to game {game_id}")
+            return super().get(url, **kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def scrape_games_with(transport, *args, **kwargs):
+    previous = get_transport()
+    try:
+        set_transport(transport)
+        return list(scrape_games(*args, **kwargs))
+    finally:
+        set_transport(previous)
+
+
+def test_scrape_games_yields_in_completion_order():
+    sources = load_fixture(2023020000)
+    transport = SlowTransport(sources, delays={2023020001: 0.3, 2023020002: 0.0}, failing={2023020003})
+
+    results = scrape_games_with(transport, [2023020001, 2023020002, 2023020003], concurrency=3, file='rosters')
+
+    assert [game_id for game_id, _ in results][0] == 2023020002
+    assert [game_id for game_id, _ in results][-1] == 2023020001
+    results = dict(results)
+    assert isinstance(results[2023020003], SourceFetchError)
+    for game_id in (2023020001, 2023020002):
+        assert (results[game_id]['gameId'] == game_id).all()
+
+
+def test_scrape_games_host_concurrency_is_scoped():
+    sources = load_fixture(2023020000)
+    game_ids = list(range(2023020001, 2023020009))
+
+    bounded = SlowTransport(sources, delays={})
+    results = scrape_games_with(bounded, game_ids, concurrency=8, file='rosters', host_concurrency=2)
+    assert sorted(game_id for game_id, _ in results) == game_ids
+    assert bounded.max_in_flight == 2
+
+    # The limit only applied to that call
+    unbounded = SlowTransport(sources, delays={})
+    scrape_games_with(unbounded, game_ids, concurrency=8, file='rosters')
+    assert unbounded.max_in_flight == DEFAULT_HOST_CONCURRENCY
+
+
+def test_scrape_games_only_fetches_the_needed_sources():
+    sources = load_fixture(2023020000)
+    game_ids = [2023020001, 2023020002]
+
+    for processes in (None, 2):
+        transport = FixtureTransport(sources)
+        results = dict(scrape_games_with(transport, game_ids, processes=processes, outputs=['pbp'], on_ice=False,
+                                         situation=True))
+
+        # The strength comes from the play-by-play alone, no shift source is requested
+        assert sorted(transport.urls) == sorted(PLAY_BY_PLAY_ENDPOINT.format(game_id=game_id) for game_id in game_ids)
+        for game_id in game_ids:
+            expected = build_game(game_id, {'pbp': sources['pbp']}, ['pbp'], on_ice=False, situation=True)
+            assert set(results[game_id]) == {'pbp'}
+            pd.testing.assert_frame_equal(results[game_id]['pbp'], expected['pbp'])
+            assert 'game_strength' in results[game_id]['pbp']
+
+
+def test_transform_games_in_worker_processes():
+    sources = load_fixture(2023020000)
+    fetch_error = SourceFetchError(2023020003, 'pbp', 'timed out')
+    payloads = [(2023020001, sources), (2023020002, {**sources, 'pbp': b'not json'}), (2023020003, fetch_error),
+                (2023020004, sources)]
+
+    results = dict(transform_games(payloads, processes=2))
+
+    assert sorted(results) == [2023020001, 2023020002, 2023020003, 2023020004]
+    for game_id in (2023020001, 2023020004):
+        expected = build_game(game_id, sources)
+        assert set(results[game_id]) == set(expected)
+        for table in expected:
+            pd.testing.assert_frame_equal(results[game_id][table], expected[table])
+
+    # Errors raised in a worker come back as the result of their game, fetch errors are passed through
+    assert isinstance(results[2023020002], json.JSONDecodeError)
+    assert results[2023020003] is fetch_error
 
+    (game_id, rosters), = transform_games([(2023020001, sources)], processes=2, file='rosters')
+    pd.testing.assert_frame_equal(rosters, build_game(2023020001, sources, ['rosters'])['rosters'])
 
+    # scrape_games fetches in threads and builds in the worker processes
+    results = dict(scrape_games_with(FixtureTransport(sources), [2023020001, 2023020002], file='rosters', processes=2))
+    for game_id in (2023020001, 2023020002):
+        pd.testing.assert_frame_equal(results[game_id], build_game(game_id, sources, ['rosters'])['rosters'])
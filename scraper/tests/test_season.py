@@ -0,0 +1,146 @@
+import re
+import json
+import requests
+from datetime import date, timedelta
+
+from scraper import scrape_season, read_parquet_table
+from scraper.utilis.manifest import Manifest
+from scraper.utilis.constants import MANIFEST_DONE, MANIFEST_FAILED
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.tests.benchmark import load_fixture
+
+
+GAME_IDS = [2023020001, 2023020002, 2023020003]
+
+
+class SeasonTransport:
+    """Serves a 2023-2024 season of three final games on October 10, each with the fixture's sources."""
+
+    def __init__(self):
+        sources = load_fixture(2023020000)
+        self.sources = {game_id: dict(sources) for game_id in GAME_IDS}
+        self.failing = set()
+        self.urls = []
+
+    def week(self, start):
+        days = []
+        for offset in range(7):
+            day = start + timedelta(days=offset)
+            games = [{'id': game_id, 'season': 20232024, 'gameType': 2, 'gameState': 'OFF',
+                      'awayTeam': {'abbrev': 'TOR'}, 'homeTeam': {'abbrev': 'MTL'}} for game_id in GAME_IDS] if day == date(2023, 10, 10) else []
+            days.append({'date': day.isoformat(), 'games': games})
+        return json.dumps({'gameWeek': days}).encode()
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+
+        if '/schedule/' in url:
+            response._content = self.week(date.fromisoformat(url.rsplit('/', 1)[1]))
+            return response
+
+        game_id = next(game_id for game_id in GAME_IDS if str(game_id) in url or f"TH{str(game_id)[4:]}" in url or f"TV{str(game_id)[4:]}" in url)
+        if game_id in self.failing:
+            raise requests.exceptions.ConnectionError(f"No route to game {game_id}")
+        if 'shiftcharts' in url:
+            # No JSON shift, so the HTML reports are fetched too
+            response._content = b'{"data": [], "total": 0}'
+        else:
+            key = 'pbp' if 'play-by-play' in url else 'shifts_home' if '/TH' in url else 'shifts_away'
+            response._content = self.sources[game_id][key]
+        return response
+
+    def scraped(self):
+        """IDs of the games whose play-by-play was requested since the last call."""
+        game_ids = sorted(game_id for game_id in GAME_IDS for url in self.urls if f"gamecenter/{game_id}/" in url)
+        self.urls = []
+        return game_ids
+
+
+def run(transport, path, **kwargs):
+    previous = get_transport()
+    try:
+        set_transport(transport)
+        return scrape_season(20232024, path=str(path), **kwargs)
+    finally:
+        set_transport(previous)
+
+
+def test_scrape_season_resumes_and_retries(tmp_path):
+    transport = SeasonTransport()
+    manifest_file = str(tmp_path / 'manifest.sqlite')
+
+    transport.failing = {2023020002}
+    errors = run(transport, tmp_path)
+    assert list(errors) == [2023020002]
+    assert transport.scraped() == GAME_IDS
+
+    manifest = Manifest(manifest_file)
+    assert manifest.game_ids(MANIFEST_DONE, 20232024) == {2023020001, 2023020003}
+    assert manifest.game_ids(MANIFEST_FAILED, 20232024) == {2023020002}
+    assert sorted(read_parquet_table('pbp', str(tmp_path))['gameId'].unique()) == [2023020001, 2023020003]
+    manifest.close()
+
+    # The failed game is retried, the done ones are skipped
+    transport.failing = set()
+    assert run(transport, tmp_path) == {}
+    assert transport.scraped() == [2023020002]
+
+    manifest = Manifest(manifest_file)
+    assert manifest.game_ids(MANIFEST_DONE, 20232024) == set(GAME_IDS)
+    entry = manifest.get(2023020002)
+    assert (entry['attempts'], entry['error']) == (2, None)
+    assert set(entry['outputs']) == {'pbp', 'rosters', 'shifts'}
+    manifest.close()
+
+    # Nothing left to do
+    assert run(transport, tmp_path) == {}
+    assert transport.scraped() == []
+
+
+def test_scrape_season_refresh_rewrites_changed_games(tmp_path):
+    transport = SeasonTransport()
+    run(transport, tmp_path)
+    transport.scraped()
+
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite'))
+    before = {game_id: manifest.get(game_id) for game_id in GAME_IDS}
+
+    # Unchanged sources are fetched again but not rewritten
+    run(transport, tmp_path, refresh=True)
+    assert transport.scraped() == GAME_IDS
+    assert {game_id: manifest.get(game_id) for game_id in GAME_IDS} == before
+
+    transport.sources[2023020003]['pbp'] += b'\n'
+    run(transport, tmp_path, refresh=True)
+    after = {game_id: manifest.get(game_id) for game_id in GAME_IDS}
+    manifest.close()
+
+    assert {game_id: after[game_id] for game_id in GAME_IDS[:2]} == {game_id: before[game_id] for game_id in GAME_IDS[:2]}
+    assert after[2023020003]['checksum'] != before[2023020003]['checksum']
+    assert after[2023020003]['attempts'] == before[2023020003]['attempts'] + 1
+    assert after[2023020003]['status'] == MANIFEST_DONE
+
+
+def test_scrape_season_records_games_that_do_not_fit_the_schema(tmp_path):
+    transport = SeasonTransport()
+    # Every home player on the ice for the whole first period, more than PARQUET_SKATER_SLOTS skaters
+    transport.sources[2023020002]['shifts_home'] = re.sub(
+        rb'(<tr class="\w+Color"><td[^>]*>\d+</td><td[^>]*>1</td><td[^>]*>)[^<]*(</td><td[^>]*>)[^<]*(</td><td[^>]*>)[^<]*</td>',
+        rb'\g<1>0:00 / 20:00\g<2>20:00 / 0:00\g<3>20:00</td>', transport.sources[2023020002]['shifts_home'])
+
+    errors = run(transport, tmp_path, archive=True)
+    assert list(errors) == [2023020002]
+    assert isinstance(errors[2023020002], ValueError)
+
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite'))
+    assert manifest.game_ids(MANIFEST_DONE, 20232024) == {2023020001, 2023020003}
+    assert manifest.game_ids(MANIFEST_FAILED, 20232024) == {2023020002}
+    manifest.close()
+
+    # The other games are not held back by it on resume
+    transport.scraped()
+    assert list(run(transport, tmp_path)) == [2023020002]
+    assert transport.scraped() == [2023020002]
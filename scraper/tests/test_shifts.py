@@ -0,0 +1,91 @@
+
+import json
+import numpy as np
+import pandas as pd
+
+from scraper.utilis.functions import parse_shift_report, shifts_from_reports, shifts_from_json, select_shifts, compare_shifts
+from scraper.tests.benchmark import load_fixture
+
+
+REPORT = """
+<html><body>
+<table><tr><td align="center" class="teamHeading + border">MONTR\xc9AL CANADIENS</td></tr>
+<tr><td><table>
+<tr><td class="playerHeading + border" colspan="8">14 SUZUKI, NICK</td></tr>
+<tr><td class="lborder + bborder">1</td><td class="lborder + bborder">1</td>
+<td class="lborder + bborder">0:00 / 20:00</td><td class="lborder + bborder">0:41 / 19:19</td>
+<td class="lborder + bborder">00:41</td><td class="lborder + bborder + rborder">&nbsp;</td></tr>
+<tr><td class="lborder + bborder">2</td><td class="lborder + bborder">OT</td>
+<td class="lborder + bborder">1:02 / 3:58</td><td class="lborder + bborder">1:50 / 3:10</td>
+<td class="lborder + bborder">00:48</td><td class="lborder + bborder + rborder">G</td></tr>
+</table></td></tr>
+<tr><td class="bborder">Per</td></tr>
+</table></body></html>
+""".encode('ISO-8859-1')
+
+
+def test_parse_shift_report_backends_agree():
+    team, cells = parse_shift_report(REPORT, parser='lxml')
+
+    assert (team, cells) == parse_shift_report(REPORT, parser='bs4')
+    assert team == 'MONTR\xc9AL CANADIENS'
+    assert cells == ['14 SUZUKI, NICK', '1', '1', '0:00 / 20:00', '0:41 / 19:19', '00:41',
+                     '2', 'OT', '1:02 / 3:58', '1:50 / 3:10', '00:48']
+
+
+def test_shifts_from_reports():
+    shifts = shifts_from_reports(REPORT, REPORT.replace(b'14 SUZUKI', b'91 TAVARES'))
+
+    assert shifts['sweaterNumber'].tolist() == [14, 14, 91, 91]
+    assert shifts['is_home'].tolist() == [1, 1, 0, 0]
+    assert shifts['period'].tolist() == [1, 4, 1, 4]
+    assert shifts['startTime_s'].tolist() == [0, 3662, 0, 3662]
+    assert shifts['endTime_s'].tolist() == [41, 3710, 41, 3710]
+    assert shifts['duration_s'].tolist() == [41, 48, 41, 48]
+
+
+def shiftcharts(shifts, pbp_json):
+    """Shiftcharts API payload holding the given shifts, plus a goal row."""
+    players = {(spot['teamId'] == pbp_json['homeTeam']['id'], spot['sweaterNumber']): spot for spot in pbp_json['rosterSpots']}
+    rows = [{'typeCode': 505, 'duration': None, 'period': 1, 'startTime': '01:00', 'endTime': '01:00', 'shiftNumber': 0,
+             'playerId': 0, 'teamId': pbp_json['homeTeam']['id']}]
+    for shift in shifts.sample(frac=1, random_state=0).itertuples():
+        spot = players[(bool(shift.is_home), shift.sweaterNumber)]
+        rows.append({'typeCode': 517, 'duration': shift.duration, 'period': shift.period, 'shiftNumber': int(shift.shift_number),
+                     'startTime': shift.startTime.zfill(5), 'endTime': shift.endTime.zfill(5),
+                     'playerId': spot['playerId'], 'teamId': spot['teamId']})
+    return json.dumps({'data': rows, 'total': len(rows)}).encode()
+
+
+def report_order(shifts):
+    """Orders shifts like shifts_from_json: home team first, then sweater and shift number."""
+    order = np.lexsort((shifts['shift_number'].astype(int), shifts['sweaterNumber'], -shifts['is_home']))
+    return shifts.iloc[order].reset_index(drop=True)
+
+
+def test_shifts_from_json_matches_reports():
+    sources = load_fixture(2023020000)
+    pbp_json = json.loads(sources['pbp'])
+    html_shifts = shifts_from_reports(sources['shifts_home'], sources['shifts_away'])
+
+    json_shifts = shifts_from_json(shiftcharts(html_shifts, pbp_json), pbp_json)
+
+    pd.testing.assert_frame_equal(json_shifts, report_order(html_shifts))
+
+
+def test_select_shifts():
+    sources = load_fixture(2023020000)
+    pbp_json = json.loads(sources['pbp'])
+    html_shifts = shifts_from_reports(sources['shifts_home'], sources['shifts_away'])
+
+    only_json = {'shifts_json': shiftcharts(html_shifts, pbp_json)}
+    pd.testing.assert_frame_equal(select_shifts(only_json, pbp_json), report_order(html_shifts))
+
+    # The reports win when the sources disagree
+    missing_shift = {**sources, 'shifts_json': shiftcharts(html_shifts.iloc[1:], pbp_json)}
+    assert compare_shifts(shifts_from_json(missing_shift['shifts_json'], pbp_json), html_shifts) == {'json_only': 0, 'html_only': 1}
+    pd.testing.assert_frame_equal(select_shifts(missing_shift, pbp_json), html_shifts)
+
+    # Empty JSON falls back to the reports
+    empty = {**sources, 'shifts_json': b'{"data": [], "total": 0}'}
+    pd.testing.assert_frame_equal(select_shifts(empty, pbp_json), html_shifts)
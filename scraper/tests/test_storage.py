@@ -0,0 +1,32 @@
+import pandas as pd
+
+from scraper import build_game, write_game_parquet, read_parquet_table
+from scraper.utilis.storage import PARQUET_DTYPES, apply_parquet_dtypes
+from scraper.tests.benchmark import load_fixture
+
+
+def test_game_files_share_one_schema(tmp_path):
+    sources = load_fixture(2023020000)
+    write_game_parquet(build_game(2023020000, sources, situation=True), tmp_path)
+    write_game_parquet(build_game(2023020070, sources, on_ice=False), tmp_path)
+
+    for table, dtypes in PARQUET_DTYPES.items():
+        files = sorted((tmp_path / table).rglob('*.parquet'))
+        assert len(files) == 2
+        assert pd.read_parquet(files[0]).dtypes.equals(pd.read_parquet(files[1]).dtypes)
+
+        df = read_parquet_table(table, tmp_path)
+        assert sorted(df['gameId'].unique()) == [2023020000, 2023020070]
+        assert df[list(dtypes)].dtypes.astype(str).to_dict() == dtypes
+
+    pbp = read_parquet_table('pbp', tmp_path)
+    assert pbp.loc[pbp['gameId'] == 2023020070, ['home_skater_id1', 'strength_state']].isna().all().all()
+    assert pbp.loc[pbp['gameId'] == 2023020000, 'home_skater_id1'].notna().any()
+
+
+def test_columns_outside_the_schema_are_logged(caplog):
+    rosters = build_game(2023020000, load_fixture(2023020000), ['rosters'])['rosters'].assign(newApiField='x')
+
+    df = apply_parquet_dtypes(rosters, 'rosters')
+    assert list(df.columns) == list(PARQUET_DTYPES['rosters'])
+    assert "['newApiField']" in caplog.text and 'gameDate' not in caplog.text
@@ -0,0 +1,108 @@
+import json
+import threading
+import requests
+
+from scraper.utilis.transport import get_transport, set_transport
+from scraper.utilis.teams import TeamRegistry, team_registry, clear_team_registries
+from scraper.utilis.functions import fetch_team_schedule_json
+
+
+TEAMS = {'teams': [
+    {'id': 8, 'seasonId': 20232024, 'abbrev': 'MTL', 'name': {'default': 'Montréal Canadiens', 'fr': 'Canadiens de Montréal'},
+     'commonName': {'default': 'Canadiens'}, 'placeName': {'default': 'Montréal'},
+     'logo': 'https://assets.nhle.com/logos/nhl/svg/MTL_light.svg'},
+    {'id': 10, 'seasonId': 20232024, 'abbrev': 'TOR', 'name': {'default': 'Toronto Maple Leafs'},
+     'commonName': {'default': 'Maple Leafs'}, 'placeName': {'default': 'Toronto'}},
+]}
+
+
+class FakeTransport:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = json.dumps(TEAMS if 'schedule-calendar' in url else {'games': []}).encode()
+        return response
+
+
+def test_team_registry_resolve():
+    registry = TeamRegistry.from_teams_json(20232024, TEAMS)
+
+    assert registry.resolve('MTL') == 'MTL'
+    assert registry.resolve('Canadiens de Montréal') == 'MTL'
+    assert registry.resolve('maple leafs') == 'TOR'
+    assert registry.resolve('Nordiques') is None
+    assert registry.resolve('https://assets.nhle.com/logos/nhl/svg/MTL_light.svg') is None
+    assert set(registry.aliases) == {'MTL', 'Montréal Canadiens', 'Canadiens de Montréal', 'Canadiens', 'Montréal',
+                                     'TOR', 'Toronto Maple Leafs', 'Maple Leafs', 'Toronto'}
+    assert registry.abbrevs == ['MTL', 'TOR']
+
+
+def test_team_registry_is_fetched_once(tmp_path):
+    previous = get_transport()
+    transport = FakeTransport()
+    try:
+        set_transport(transport)
+        clear_team_registries()
+        assert team_registry(20232024, path=str(tmp_path)).resolve('Canadiens') == 'MTL'
+        for team in ('Montréal', 'Toronto Maple Leafs', 'MTL'):
+            fetch_team_schedule_json(team, 20232024)
+
+        # A new session reads the registry back from disk
+        clear_team_registries()
+        assert team_registry(20232024, path=str(tmp_path)).resolve('Maple Leafs') == 'TOR'
+    finally:
+        set_transport(previous)
+        clear_team_registries()
+
+    teams_requests = [url for url in transport.urls if 'schedule-calendar' in url]
+    assert len(teams_requests) == 1
+    assert [url.rsplit('/', 2)[-2] for url in transport.urls if 'club-schedule-season' in url] == ['MTL', 'TOR', 'MTL']
+
+
+class BlockingTransport:
+    """Serves an empty list of teams, holding the requests back until released."""
+
+    def __init__(self):
+        self.urls = []
+        self.released = threading.Event()
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        self.released.wait(5)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = b'{"teams": []}'
+        return response
+
+
+def test_team_registry_fetch_does_not_hold_back_other_seasons(tmp_path):
+    TeamRegistry.from_teams_json(20232024, TEAMS).save(str(tmp_path / '20232024.json'))
+
+    previous = get_transport()
+    transport = BlockingTransport()
+    try:
+        set_transport(transport)
+        clear_team_registries()
+        fetching = threading.Thread(target=team_registry, args=(20222023,), kwargs={'path': str(tmp_path)})
+        fetching.start()
+        while not transport.urls:
+            fetching.join(0.01)
+
+        # Another season is looked up while the fetch is in flight
+        assert team_registry(20232024, path=str(tmp_path)).resolve('Canadiens') == 'MTL'
+        transport.released.set()
+        fetching.join()
+
+        # The empty registry of the fetch is not kept
+        assert team_registry(20222023, path=str(tmp_path)).resolve('Canadiens') is None
+        assert len(transport.urls) == 2
+    finally:
+        transport.released.set()
+        set_transport(previous)
+        clear_team_registries()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from scraper.utilis.onice import resolve_on_ice
+from scraper.utilis.toi import shift_segments, player_toi, team_toi, strength_states
+from scraper.tests.test_onice import make_shifts
+
+
+def per_second_states(shifts):
+    """States of every second of a game, the slow way."""
+    seconds = np.arange(int(shifts['endTime_s'].max()))
+    on_ice = resolve_on_ice(shifts, seconds)
+    home_goalie, away_goalie = on_ice['home_goalie_id'].notna(), on_ice['away_goalie_id'].notna()
+    occupied = (on_ice['home_skater_ids'].str.len() + on_ice['away_skater_ids'].str.len() + home_goalie + away_goalie) > 0
+    home = strength_states(on_ice['home_skaters'], on_ice['away_skaters'], home_goalie, away_goalie)
+    away = strength_states(on_ice['away_skaters'], on_ice['home_skaters'], away_goalie, home_goalie)
+    return seconds[occupied], home[occupied], away[occupied]
+
+
+def test_shift_segments():
+    shifts = make_shifts().assign(gameId=2023020001)
+    segments = shift_segments(shifts)
+
+    assert (segments['start_s'].to_numpy()[1:] >= segments['end_s'].to_numpy()[:-1]).all()
+    seconds, home, _ = per_second_states(shifts)
+    assert segments['duration_s'].sum() == len(seconds)
+
+    # Every second falls in one segment with the same state
+    segment = np.searchsorted(segments['end_s'].to_numpy(), seconds, side='right')
+    np.testing.assert_array_equal(segments['home_state'].to_numpy()[segment], home)
+
+    second = 1800
+    row = segments[(segments['start_s'] <= second) & (segments['end_s'] > second)].iloc[0]
+    on_ice = shifts[(shifts['startTime_s'] <= second) & (shifts['endTime_s'] > second)]
+    assert sorted(row['home_player_ids'] + row['away_player_ids']) == sorted(on_ice['playerId'])
+
+
+def test_toi_matches_per_second_count():
+    shifts = make_shifts()
+    games = pd.concat([shifts.assign(gameId=2023020001), shifts.assign(gameId=2023020002)], ignore_index=True)
+
+    teams = team_toi(games)
+    players = player_toi(games)
+
+    seconds, home, away = per_second_states(shifts)
+    expected_home = pd.Series(home).value_counts()
+    for state in ('5v5', 'PP', 'SH', 'EV', 'EN'):
+        assert (teams.loc[teams['is_home'] == 1, state] == expected_home.get(state, 0)).all()
+    assert set(teams['gameId']) == {2023020001, 2023020002}
+
+    player = shifts[shifts['playerId'] == 8470103]
+    expected_toi = (player['endTime_s'] - player['startTime_s']).sum()
+    assert (players.loc[players['playerId'] == 8470103, 'total'] == expected_toi).all()
+    assert players.groupby('gameId').size().tolist() == [shifts['playerId'].nunique()] * 2
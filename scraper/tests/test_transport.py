@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from scraper.utilis.transport import Transport, get_transport, set_transport
+from scraper.utilis.functions import fetch_game_sources, conditional_get, SourceFetchError
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        FlakyHandler.calls += 1
+        status = 503 if FlakyHandler.calls <= 2 else 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{"ok": true}')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_transport_retries_on_5xx():
+    server = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        transport = Transport(backoff=0.01, rate_limits={None: (100, 5)})
+        response = transport.get(f"http://127.0.0.1:{server.server_port}/v1/standings/now")
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 200
+    assert response.json() == {'ok': True}
+    assert FlakyHandler.calls == 3
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(b'{"plays": []}')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_conditional_get():
+    server = HTTPServer(('127.0.0.1', 0), ETagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    previous = get_transport()
+    try:
+        set_transport(Transport())
+        url = f"http://127.0.0.1:{server.server_port}/v1/gamecenter/2023020000/play-by-play"
+        first, validators = conditional_get(url)
+        second, same_validators = conditional_get(url, validators)
+    finally:
+        set_transport(previous)
+        server.shutdown()
+
+    assert first.content == b'{"plays": []}'
+    assert validators['etag'] == '"v1"'
+    assert second is None
+    assert same_validators == validators
+
+
+class SlowTransport:
+    """Answers every request after a delay, failing the URLs containing `fail`."""
+
+    def __init__(self, delay, fail=None):
+        self.delay = delay
+        self.fail = fail
+
+    def get(self, url, **kwargs):
+        time.sleep(self.delay)
+        response = requests.Response()
+        response.status_code = 500 if self.fail and self.fail in url else 200
+        response.url = url
+        response._content = url.encode()
+        return response
+
+
+def test_fetch_game_sources_concurrently():
+    previous = get_transport()
+    try:
+        set_transport(SlowTransport(0.2))
+        start = time.perf_counter()
+        sources = fetch_game_sources(2023020000, shift_source='html')
+        elapsed = time.perf_counter() - start
+
+        set_transport(SlowTransport(0.01, fail='TV'))
+        with pytest.raises(SourceFetchError) as error:
+            fetch_game_sources(2023020000, shift_source='html')
+    finally:
+        set_transport(previous)
+
+    assert set(sources) == {'pbp', 'shifts_home', 'shifts_away'}
+    assert b'TH020000' in sources['shifts_home']
+    assert elapsed < 0.5
+    assert error.value.source == 'shifts_away'
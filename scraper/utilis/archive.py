@@ -0,0 +1,224 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import threading
+
+from .constants import *
+from .metrics import span
+
+
+# Every record of a pack: magic, game ID, length of the source key, length of the compressed
+# payload and CRC-32 of the raw payload, followed by the key and the zlib-compressed payload.
+# Each append starts with an empty record (no key, no payload) marking a new batch of the game.
+RECORD_HEADER = struct.Struct('<4sqHII')
+RECORD_MAGIC = b'NRAW'
+
+
+def raw_archive_file(season: int, path: str = DEFAULT_DATA_DIR):
+    return os.path.join(path, RAW_ARCHIVE_TABLE, f"{season}.pack")
+
+
+def _add_entry(index: dict, batches: dict, entry: dict):
+    """
+    Adds an index entry to index (game ID -> source -> (offset, length, crc)). An entry of a newer
+    batch than the game's current one (batches: game ID -> batch) replaces all its sources.
+    """
+    game_id, batch = entry['game_id'], entry.get('batch')
+    if game_id not in index or batch != batches[game_id]:
+        index[game_id] = {}
+        batches[game_id] = batch
+    index[game_id][entry['source']] = (entry['offset'], entry['length'], entry['crc'])
+
+
+class RawArchive:
+    """
+    Append-only pack of the raw source payloads of games (see fetch_game_sources), one file per season.
+
+    Each payload is compressed on its own and appended to the pack, and an index beside it
+    ({season}.idx, one JSON line per payload) maps every game ID to the offset and length of its
+    payloads. Reads go through mmap, so only the requested payloads are decompressed and the
+    pack is never loaded whole. Archiving a game again appends a new batch of records, which
+    replaces all the game's previous ones (even the sources the new batch doesn't have).
+
+    The pack describes itself: a missing or stale index is rebuilt by scanning it, so a pack
+    file alone can be copied to another machine.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+          path: Pack file of the archive (created if missing), e.g. raw_archive_file(season).
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + '.idx'
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        self._map = None
+        self._index = {}
+
+        self._load_index()
+
+    def _load_index(self):
+        size = os.path.getsize(self.path)
+        end = 0
+        batches = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    _add_entry(self._index, batches, entry)
+                    end = max(end, entry['offset'] + entry['length'])
+
+        # Records appended without their index lines (e.g. an interrupted job, or a copied pack)
+        if end != size:
+            self.rebuild_index()
+
+    def rebuild_index(self):
+        """
+        Rebuilds the index by scanning the records of the pack, dropping a truncated last record.
+        """
+        index, batches, lines, offset = {}, {}, [], 0
+        starts = {}
+        size = os.path.getsize(self.path)
+
+        with open(self.path, 'rb') as f:
+            while offset + RECORD_HEADER.size <= size:
+                f.seek(offset)
+                magic, game_id, key_length, length, crc = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                start = offset + RECORD_HEADER.size + key_length
+                if magic != RECORD_MAGIC or start + length > size:
+                    break
+                if key_length == 0:
+                    # Marker of a new batch of the game
+                    starts[game_id] = offset
+                    offset = start
+                    continue
+                source = f.read(key_length).decode()
+                entry = {'game_id': game_id, 'source': source, 'offset': start, 'length': length, 'crc': crc,
+                         'batch': starts.get(game_id)}
+                _add_entry(index, batches, entry)
+                lines.append(json.dumps(entry))
+                offset = start + length
+
+        if offset != size:
+            self._file.truncate(offset)
+
+        with open(self.index_path, 'w') as f:
+            f.writelines(line + '\n' for line in lines)
+        self._index = index
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def append(self, game_id: int, sources: dict):
+        """
+        Appends the raw payloads of a game (see fetch_game_sources) to the pack, as a new batch
+        replacing the ones archived before.
+        """
+        sources = {source: content for source, content in sources.items() if content is not None}
+        if not sources:
+            return
+
+        with self._lock, span('archive_append') as s:
+            self._file.seek(0, os.SEEK_END)
+            batch = self._file.tell()
+            self._file.write(RECORD_HEADER.pack(RECORD_MAGIC, int(game_id), 0, 0, 0))
+            offset = batch + RECORD_HEADER.size
+            entries, written = [], 0
+
+            for source, content in sources.items():
+                key = source.encode()
+                compressed = zlib.compress(content, RAW_ARCHIVE_COMPRESSION)
+                crc = zlib.crc32(content)
+                self._file.write(RECORD_HEADER.pack(RECORD_MAGIC, int(game_id), len(key), len(compressed), crc) + key)
+                self._file.write(compressed)
+
+                start = offset + RECORD_HEADER.size + len(key)
+                entries.append({'game_id': int(game_id), 'source': source, 'offset': start, 'length': len(compressed),
+                                'crc': crc, 'batch': batch})
+                offset = start + len(compressed)
+                written += len(compressed)
+            self._file.flush()
+
+            # The index is written after the records, so it never points past the end of the pack
+            with open(self.index_path, 'a') as f:
+                f.writelines(json.dumps(entry) + '\n' for entry in entries)
+            self._index[int(game_id)] = {entry['source']: (entry['offset'], entry['length'], entry['crc']) for entry in entries}
+            s.set(bytes=written)
+
+    def _mapping(self, end: int):
+        # The pack grows as games are appended, so the mapping is renewed when a record lies past its end
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get(self, game_id: int, sources=None):
+        """
+        Reads the raw payloads of a game.
+
+        Args:
+          game_id: Identifier ID for a given game.
+          sources: Keys of the payloads to read (e.g. ['pbp']), by default all of them.
+
+        Returns:
+          A dictionary of raw bodies, as fetch_game_sources returns.
+
+        Raises:
+          KeyError: If the game (or one of the requested payloads) is not in the archive.
+          ValueError: If a payload does not match its checksum.
+        """
+        with self._lock:
+            records = self._index[int(game_id)]
+            keys = list(records) if sources is None else sources
+            entries = {key: records[key] for key in keys}
+            mapping = self._mapping(max(offset + length for offset, length, _ in entries.values()))
+
+            payloads = {}
+            with memoryview(mapping) as view:
+                for key, (offset, length, crc) in entries.items():
+                    with view[offset:offset + length] as compressed:
+                        content = zlib.decompress(compressed)
+                    if zlib.crc32(content) != crc:
+                        raise ValueError(f"Corrupted {key} payload of game {game_id} in {self.path}")
+                    payloads[key] = content
+        return payloads
+
+    def game_ids(self):
+        with self._lock:
+            return sorted(self._index)
+
+    def items(self, game_ids=None):
+        """
+        Yields (game_id, sources) for the archived games, e.g. to rebuild them with transform_games.
+        """
+        for game_id in self.game_ids() if game_ids is None else game_ids:
+            yield game_id, self.get(game_id)
+
+    def __contains__(self, game_id):
+        return int(game_id) in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
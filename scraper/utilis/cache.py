@@ -0,0 +1,284 @@
+import os
+import re
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+import requests
+
+from .constants import *
+
+
+class CacheMissError(requests.exceptions.ConnectionError):
+    """
+    Raised in offline mode when a URL is not in the cache.
+    """
+
+
+def cache_ttl(url: str, content: bytes):
+    """
+    Returns how long (in seconds) a response may be served from the cache.
+
+    Finished games never expire, live games expire almost immediately, "now"
+    endpoints expire quickly and dated endpoints expire once the date is past.
+    A schedule week (or calendar) only expires once its last day is past or
+    every game in it is final, since it holds the games still to be played.
+    The shiftcharts JSON doesn't hold the game state, so it expires like a live
+    game until the game's play-by-play is cached as final (see ResponseCache.put).
+
+    Args:
+      url: URL of the request.
+      content: Body of the response.
+
+    Returns:
+      The time to live in seconds, or None if the response never expires.
+    """
+    if '/gamecenter/' in url:
+        try:
+            state = json.loads(content).get('gameState')
+        except ValueError:
+            return CACHE_TTL_LIVE
+        return None if state in FINAL_GAME_STATES else CACHE_TTL_LIVE
+
+    if '/scores/htmlreports/' in url:
+        return None if b'Final' in content else CACHE_TTL_LIVE
+
+    if shiftcharts_game_id(url) is not None:
+        return CACHE_TTL_LIVE
+
+    if '/club-schedule-season/' in url:
+        season = re.search(r'/(\d{8})$', url)
+        if season and int(season.group(1)[4:]) < datetime.now().year:
+            return None
+        return CACHE_TTL_DEFAULT
+
+    date = re.search(r'/(\d{4}-\d{2}-\d{2})$', url)
+    if date is None:
+        return CACHE_TTL_SHORT
+    day = datetime.strptime(date.group(1), '%Y-%m-%d').date()
+    today = datetime.now().date()
+
+    if '/schedule/' in url or '/schedule-calendar/' in url:
+        if day + timedelta(days=SCHEDULE_WEEK_DAYS - 1) < today or _all_games_final(content):
+            return None
+        return CACHE_TTL_SHORT
+
+    if day < today:
+        return None
+    return CACHE_TTL_SHORT
+
+
+def _all_games_final(content: bytes):
+    """
+    Returns whether a schedule week holds games and all of them are final.
+    """
+    try:
+        days = json.loads(content).get('gameWeek', [])
+    except (ValueError, AttributeError):
+        return False
+    states = [game.get('gameState') for day in days for game in day.get('games', [])]
+    return bool(states) and all(state in FINAL_GAME_STATES for state in states)
+
+
+def shiftcharts_game_id(url: str):
+    """
+    Returns the game ID of a shiftcharts URL (see SHIFT_API_ENDPOINT), or None for other URLs.
+    """
+    match = re.search(r'/shiftcharts\?cayenneExp=gameId=(\d+)$', url)
+    return int(match.group(1)) if match else None
+
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP response bodies.
+
+    Bodies are gzip-compressed and stored under the SHA-256 of their URL. A small
+    SQLite index keeps their size, expiry and last access time, so the least
+    recently used entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, path: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, offline: bool = False, ttl=cache_ttl):
+        """
+        Args:
+          path: Directory holding the cache.
+          max_bytes: Maximum total size of the compressed bodies.
+          offline: If True, only serve from the cache and never hit the network.
+          ttl: Function (url, content) -> seconds to live (None to never expire).
+        """
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.ttl = ttl
+
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS entries (
+                            key TEXT PRIMARY KEY, url TEXT, size INTEGER,
+                            stored_at REAL, expires_at REAL, accessed_at REAL)""")
+        self._db.commit()
+
+    @staticmethod
+    def key(url: str):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _file(self, key: str):
+        return os.path.join(self.path, key[:2], f"{key}.gz")
+
+    def get(self, url: str):
+        """
+        Returns the cached response for a URL, or None if missing or expired.
+
+        Raises:
+          CacheMissError: In offline mode, if the URL is not cached. Expired entries are still served.
+        """
+        key = self.key(url)
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute("SELECT expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            fresh = row is not None and (self.offline or row[0] is None or row[0] > now)
+            if fresh:
+                self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._db.commit()
+
+        content = None
+        if fresh:
+            try:
+                with gzip.open(self._file(key), 'rb') as f:
+                    content = f.read()
+            except OSError:
+                self.delete(url)
+
+        if content is None:
+            if self.offline:
+                raise CacheMissError(f"{url} is not in the cache (offline mode)")
+            return None
+
+        response = requests.Response()
+        response._content = content
+        response.status_code = 200
+        response.url = url
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def _never_expires(self, url: str):
+        with self._lock:
+            row = self._db.execute("SELECT expires_at FROM entries WHERE key = ?", (self.key(url),)).fetchone()
+        return row is not None and row[0] is None
+
+    def put(self, url: str, response):
+        """
+        Stores a successful response, then evicts least recently used entries if needed.
+
+        The shiftcharts JSON of a game never expires when it is stored after the game's play-by-play
+        was cached as final. Shifts stored before may be from the game in progress, so they expire
+        and the next fetch stores the final ones.
+        """
+        if response.status_code != 200:
+            return
+
+        key = self.key(url)
+        now = time.time()
+        ttl = self.ttl(url, response.content)
+        game_id = shiftcharts_game_id(url)
+        if game_id is not None and self._never_expires(PLAY_BY_PLAY_ENDPOINT.format(game_id=game_id)):
+            ttl = None
+        expires_at = None if ttl is None else now + ttl
+
+        file = self._file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, 'wb', compresslevel=6) as f:
+            f.write(response.content)
+        os.replace(tmp, file)
+
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, url, os.path.getsize(file), now, expires_at, now))
+            self._db.commit()
+        self.evict()
+
+    def delete(self, url: str):
+        key = self.key(url)
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall():
+                if total <= self.max_bytes:
+                    break
+                evicted.append(key)
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+            self._db.commit()
+
+        for key in evicted:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            keys = [row[0] for row in self._db.execute("SELECT key FROM entries").fetchall()]
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+        for key in keys:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+
+def enable_cache(path: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, offline: bool = False):
+    """
+    Turns on the on-disk response cache for every fetch_* function.
+
+    Args:
+      path: Directory holding the cache.
+      max_bytes: Maximum total size of the compressed bodies.
+      offline: If True, only serve from the cache and never hit the network.
+
+    Returns:
+      The ResponseCache in use.
+    """
+    global _cache
+    _cache = ResponseCache(path=path, max_bytes=max_bytes, offline=offline)
+    return _cache
+
+def disable_cache():
+    """
+    Turns off the on-disk response cache.
+    """
+    global _cache
+    _cache = None
+
+def get_cache():
+    """
+    Returns the ResponseCache in use, or None if caching is off.
+    """
+    return _cache
@@ -19,7 +19,66 @@ DEFAULT_GAME_ID = 2023020464
 SCHEDULE_CALENDAR_ENDPOINT = f'{NHL_API_BASE_URL_1}/schedule-calendar/{{date}}'
 
 SCHEDULE_WEEK_ENDPOINT = f'{NHL_API_BASE_URL_1}/schedule/{{date}}'
+# Days of a schedule week, starting at its date
+SCHEDULE_WEEK_DAYS = 7
 
 
 STANDINGS_ENDPOINT = f'{NHL_API_BASE_URL_1}/standings/{{date}}'
 
+
+DEFAULT_HOST_CONCURRENCY = 4
+
+CACHE_DIR = '~/.cache/max_nhl_scraper'
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Team alias indexes, one JSON file per season
+TEAM_REGISTRY_DIR = f'{CACHE_DIR}/teams'
+# Fields of a team holding its names (a string, or one string per language), registered as aliases
+TEAM_NAME_FIELDS = ('abbrev', 'triCode', 'rawTricode', 'name', 'fullName', 'commonName', 'teamName', 'placeName')
+
+# Seconds a cached response stays fresh (finished games never expire)
+CACHE_TTL_LIVE = 30
+CACHE_TTL_SHORT = 300
+CACHE_TTL_DEFAULT = 86400
+
+FINAL_GAME_STATES = ('OFF', 'FINAL')
+
+# HTTP transport
+HTTP_TIMEOUT = 30
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF = 0.5
+HTTP_MAX_BACKOFF = 30
+HTTP_POOL_SIZE = 16
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Requests per second and burst size per host (None applies to every other host)
+HOST_RATE_LIMITS = {
+    None: (10, 10),
+}
+
+DEFAULT_SHIFT_PARSER = 'lxml'
+
+# Shift sources: 'json' (shiftcharts API), 'html' (TH/TV reports), 'both', or 'auto' (JSON, HTML if the JSON has no shift)
+DEFAULT_SHIFT_SOURCE = 'auto'
+SHIFT_SOURCES = ('auto', 'json', 'html', 'both')
+
+# typeCode of the shifts in the shiftcharts API (the other rows are goals)
+SHIFTCHART_SHIFT_TYPE = 517
+
+# Rink geometry, in feet from center ice: the nets sit on the goal lines, the blue lines bound the zones
+NET_X = 89
+BLUE_LINE_X = 25
+
+DEFAULT_DATA_DIR = 'data'
+
+# Dataset of the season game indexes, {path}/games/season={season}/games.parquet
+SEASON_INDEX_TABLE = 'games'
+
+# Raw source archives, {path}/raw/{season}.pack with a {season}.idx index beside it
+RAW_ARCHIVE_TABLE = 'raw'
+RAW_ARCHIVE_COMPRESSION = 6
+
+# Manifest of the bulk scraping jobs
+MANIFEST_FILE = 'manifest.sqlite'
+MANIFEST_DONE = 'done'
+MANIFEST_FAILED = 'failed'
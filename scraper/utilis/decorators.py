@@ -1,8 +1,12 @@
 import pandas as pd
 import numpy as np
 import functools
+import inspect
 import time
 
+from .teams import resolve_team
+from .metrics import span
+
 ### MAKE DECORATORS WORK TOGETHER ###
 
 
@@ -56,18 +60,31 @@ def format_fetch_team_schedule(func):
     
     return formatter
 
+def resolves_team(func):
+    """
+    Wrapper function to resolve the team argument (abbreviation or any team name) to the team
+    abbreviation of the season argument, through the season's team registry.
+    """
+
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def resolver(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        bound.arguments['team'] = resolve_team(bound.arguments['team'], bound.arguments['season'])
+        return func(*bound.args, **bound.kwargs)
+
+    return resolver
+
 def timer(func):
     """
-    Wrapper function to time the execution of a function.
+    Wrapper function to record the execution time of a function as a span named after it (see utilis.metrics).
     """
     
     @functools.wraps(func)
     def wrapper_timer(*args, **kwargs):
-        start_time = time.perf_counter()
-        value = func(*args, **kwargs)
-        end_time = time.perf_counter()
-        run_time = end_time - start_time
-        print(f"Finished {func.__name__!r} in {run_time:.4f} secs")
-        return value
+        with span(func.__name__):
+            return func(*args, **kwargs)
     
     return wrapper_timer
\ No newline at end of file
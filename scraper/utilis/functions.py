@@ -1,13 +1,165 @@
 import requests
 from .constants import *
 
-# import json
+import json
 from .helpers import *
 import pandas as pd
 import numpy as np
 from .decorators import *
-from datetime import datetime 
-from bs4 import BeautifulSoup
+from .teams import *
+from .cache import *
+from .transport import *
+from .metrics import span, count, enabled, endpoint_label
+from .schema import compact_frame
+from .geometry import add_geometry
+from datetime import datetime, timedelta
+from io import BytesIO
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+from urllib.parse import urlparse
+import threading
+import hashlib
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+_host_limits = {}
+_host_semaphores = {}
+_host_lock = threading.Lock()
+
+# Per-host semaphores of the code running under a scoped limit (see scoped_host_concurrency)
+_scoped_semaphores = contextvars.ContextVar('scoped_semaphores', default=None)
+
+def set_host_concurrency(limit: int, host: str = None):
+    """
+    Sets the maximum number of concurrent requests sent to a host.
+
+    Args:
+      limit: Maximum number of requests in flight at once.
+      host: Host name (e.g. 'api-web.nhle.com'). If None, sets the default for every host.
+    """
+    with _host_lock:
+        if host is None:
+            _host_limits.clear()
+            _host_semaphores.clear()
+            _host_limits[None] = limit
+        else:
+            _host_limits[host] = limit
+            _host_semaphores.pop(host, None)
+
+def scoped_host_concurrency(limit: int):
+    """
+    Returns a runner whose calls share their own limit of concurrent requests per host, instead of
+    the process-wide one of set_host_concurrency, which other callers keep using.
+
+        run = scoped_host_concurrency(2)
+        run(fetch_game_sources, game_id)   # at most 2 requests per host across every call of run
+
+    Args:
+      limit: Maximum number of requests in flight at once per host, across the calls of the runner.
+
+    Returns:
+      A function run(func, *args) calling func(*args) under that limit.
+    """
+    scope = (limit, {}, threading.Lock())
+
+    def run(func, *args):
+        token = _scoped_semaphores.set(scope)
+        try:
+            return func(*args)
+        finally:
+            _scoped_semaphores.reset(token)
+
+    return run
+
+def _host_semaphore(url: str):
+    """
+    Returns the semaphore bounding the concurrent requests to the host of a given URL.
+    """
+    host = urlparse(url).netloc
+    scope = _scoped_semaphores.get()
+    if scope is not None:
+        limit, semaphores, lock = scope
+        with lock:
+            if host not in semaphores:
+                semaphores[host] = threading.BoundedSemaphore(limit)
+            return semaphores[host]
+
+    with _host_lock:
+        if host not in _host_semaphores:
+            limit = _host_limits.get(host, _host_limits.get(None, DEFAULT_HOST_CONCURRENCY))
+            _host_semaphores[host] = threading.BoundedSemaphore(limit)
+        return _host_semaphores[host]
+
+def http_get(url: str, **kwargs):
+    """
+    Sends a GET request, waiting for a free slot in the per-host concurrency limit.
+    Raises CacheMissError instead when the cache is in offline mode and the URL is not cached.
+
+    Args:
+      url: URL to fetch.
+      **kwargs: Passed to the transport's get (see set_transport).
+
+    Returns:
+      The requests.Response, served from the on-disk cache when it is enabled and fresh.
+    """
+    endpoint = endpoint_label(url) if enabled() else None
+
+    cache = get_cache()
+    if cache is not None:
+        response = cache.get(url)
+        if response is not None:
+            count('cache_hits', endpoint=endpoint)
+            return response
+        count('cache_misses', endpoint=endpoint)
+
+    with _host_semaphore(url), span('fetch', endpoint=endpoint) as fetch_span:
+        response = get_transport().get(url, **kwargs)
+        fetch_span.set(bytes=len(response.content))
+    count('bytes_downloaded', len(response.content), endpoint=endpoint)
+
+    if cache is not None:
+        cache.put(url, response)
+    return response
+
+def conditional_get(url: str, validators: dict = None):
+    """
+    Sends a conditional GET request (If-None-Match / If-Modified-Since), bypassing the cache.
+    Servers that don't honor the validators just answer 200 every time.
+
+    Args:
+      url: URL to fetch.
+      validators: The validators returned by the previous call for this URL, if any.
+
+    Returns:
+      A tuple (response, validators), where response is None if the server answered 304 Not Modified.
+
+    Raises:
+      requests.exceptions.HTTPError: If the server answered with an error status.
+    """
+    validators = validators or {}
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    endpoint = endpoint_label(url) if enabled() else None
+    with _host_semaphore(url), span('fetch', endpoint=endpoint) as fetch_span:
+        response = get_transport().get(url, headers=headers)
+        fetch_span.set(bytes=len(response.content))
+
+    if response.status_code == 304:
+        count('not_modified', endpoint=endpoint)
+        return None, validators
+    count('bytes_downloaded', len(response.content), endpoint=endpoint)
+    response.raise_for_status()
+    return response, {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
 
 # @timer
 def fetch_teams_json(date = "now"):
@@ -27,7 +179,7 @@ def fetch_teams_json(date = "now"):
 
 
     date = date if is_valid_date(date) else "now"
-    response = requests.get(SCHEDULE_CALENDAR_ENDPOINT.format(date=date))
+    response = http_get(SCHEDULE_CALENDAR_ENDPOINT.format(date=date))
     response.raise_for_status()
     return response.json()
 
@@ -45,17 +197,18 @@ def fetch_play_by_play_json(game_id: int):
     Raises:
       requests.exceptions.RequestException: If there's an issue with the request.
     """
-    response = requests.get(PLAY_BY_PLAY_ENDPOINT.format(game_id=game_id))
+    response = http_get(PLAY_BY_PLAY_ENDPOINT.format(game_id=game_id))
     response.raise_for_status()  # Raise an error for bad responses.
     return response.json()
 
 # @timer
+@resolves_team
 def fetch_team_schedule_json(team: str = DEFAULT_TEAM, season: int = DEFAULT_SEASON):
     """
     Connects to the NHL API to get the data for a given team's schedule.
 
     Args:
-      team : Team abbreviation.
+      team : Team abbreviation, or any team name (resolved through the season's team registry).
       season: Desired season in the format of {year_start}{year_end}.
 
     Returns:
@@ -65,22 +218,7 @@ def fetch_team_schedule_json(team: str = DEFAULT_TEAM, season: int = DEFAULT_SEA
       requests.exceptions.RequestException: If there's an issue with the request.
     """
 
-
-    # Prevent errors if the user passes in a team name instead of an abbreviation.
-    team_var = find_key_by_value_in_list((pd.json_normalize(fetch_teams_json(f"{str(season)[4::]}-01-01").get("teams", []))
-    .set_index("abbrev").iloc[:, 6:]
-    .reset_index()
-    .assign(abbreviation = lambda x : x.abbrev)
-    .set_index("abbrev")
-    .replace({"NaN" : np.nan})
-    .assign(names=lambda x: x.apply(lambda row: row.dropna().tolist(), axis=1))
-    .filter([ "names"])
-    .to_dict(orient="series")
-    .get("names")
-    .to_dict()), team)
-
-
-    response = requests.get(SCHEDULE_ENDPOINT.format(team=team_var, season=season))
+    response = http_get(SCHEDULE_ENDPOINT.format(team=team, season=season))
     response.raise_for_status()
     return response.json()
 
@@ -99,7 +237,7 @@ def fetch_schedule_week_json(date = "now"):
       requests.exceptions.RequestException: If there's an issue with the request.
     """
     date = date if is_valid_date(date) else "now"
-    response = requests.get(SCHEDULE_WEEK_ENDPOINT.format(date=date))
+    response = http_get(SCHEDULE_WEEK_ENDPOINT.format(date=date))
     response.raise_for_status()
     return response.json()
 
@@ -119,7 +257,7 @@ def fetch_standings_json(date = "now"):
       requests.exceptions.RequestException: If there's an issue with the request.
     """
     date = date if is_valid_date(date) else "now"
-    response = requests.get(STANDINGS_ENDPOINT.format(date=date))
+    response = http_get(STANDINGS_ENDPOINT.format(date=date))
     response.raise_for_status()
     return response.json()
 
@@ -140,7 +278,7 @@ def get_teams(date = "now"):
 
     date_dummy = datetime.now().strftime("%Y-%m-%d") if date == "now" else date
 
-    print(f"Fetching teams for {date_dummy} \n")
+    logger.info(f"Fetching teams for {date_dummy}")
 
     df = pd.json_normalize(fetch_teams_json(date).get("teams", []))
     df.columns = df.columns.str.replace('.', '_')
@@ -149,12 +287,13 @@ def get_teams(date = "now"):
     return df
 
 # @timer
+@resolves_team
 def get_team_schedule(team: str = DEFAULT_TEAM, season: int = DEFAULT_SEASON):
     """
     Gets the schedule for a given team.
 
     Args:
-        team : Team abbreviation.
+        team : Team abbreviation, or any team name (resolved through the season's team registry).
         season: Desired season in the format of {year_start}{year_end}.
 
     Returns:
@@ -164,7 +303,7 @@ def get_team_schedule(team: str = DEFAULT_TEAM, season: int = DEFAULT_SEASON):
         requests.exceptions.RequestException: If there's an issue with the request.
     """
 
-    print(f"Fetching schedule for {team} in {season} \n")
+    logger.info(f"Fetching schedule for {team} in {season}")
     df = pd.json_normalize(fetch_team_schedule_json(team, season).get("games", []))
 
     df = df.rename(columns={'id': 'gameId'})
@@ -202,7 +341,7 @@ def get_schedule_week(date = "now"):
         requests.exceptions.RequestException: If there's an issue with the request.
     """
 
-    print(f"Fetching schedule for week of {date} \n")
+    logger.info(f"Fetching schedule for week of {date}")
     df = pd.json_normalize(fetch_schedule_week_json(date).get("gameWeek", {}))
 
     df = pd.concat([pd.json_normalize(game) for game in df['games']], ignore_index=True)
@@ -227,6 +366,58 @@ def get_schedule_week(date = "now"):
                             
     return df
 
+def season_week_dates(season: int = DEFAULT_SEASON):
+    """
+    Returns the start dates (YYYY-MM-DD) of the weeks of a season, from September 1 to July 31.
+    """
+    start = datetime(int(str(season)[:4]), 9, 1)
+    end = datetime(int(str(season)[4:]), 7, 31)
+    return [(start + timedelta(days=7 * week)).strftime("%Y-%m-%d") for week in range((end - start).days // 7 + 1)]
+
+# @timer
+def get_season_games(season: int = DEFAULT_SEASON, game_types = (2, 3), dates = None, concurrency: int = 8):
+    """
+    Gets every game of a season by fetching its weekly schedules concurrently.
+
+    Args:
+        season: Desired season in the format of {year_start}{year_end}.
+        game_types: Game types to keep (1: preseason, 2: regular season, 3: playoffs), or None for every type.
+        dates: Start dates of the weeks to fetch. Defaults to every week of the season (see season_week_dates).
+        concurrency: Number of weeks fetched at once.
+
+    Returns:
+        A dataframe with one row per game (gameId, gameDate, gameType, gameState, team abbreviations), sorted by gameId.
+
+    Raises:
+        requests.exceptions.RequestException: If there's an issue with the request.
+    """
+
+    logger.info(f"Fetching games for {season}")
+
+    dates = season_week_dates(season) if dates is None else dates
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        weeks = list(executor.map(fetch_schedule_week_json, dates))
+
+    rows = []
+    for week in weeks:
+        for day in week.get("gameWeek", []):
+            for game in day.get("games", []):
+                if game.get("season") == int(season) and (game_types is None or game.get("gameType") in game_types):
+                    rows.append({'gameId': game.get("id"),
+                                 'gameDate': day.get("date"),
+                                 'gameType': game.get("gameType"),
+                                 'gameState': game.get("gameState"),
+                                 'awayTeam_abbrev': game.get("awayTeam", {}).get("abbrev"),
+                                 'homeTeam_abbrev': game.get("homeTeam", {}).get("abbrev")})
+
+    # Games appear in every overlapping week, the latest fetched one wins
+    df = (pd.DataFrame(rows, columns=['gameId', 'gameDate', 'gameType', 'gameState', 'awayTeam_abbrev', 'homeTeam_abbrev'])
+          .drop_duplicates('gameId', keep='last')
+          .sort_values('gameId')
+          .reset_index(drop=True))
+
+    return df
+
 # @timer
 def get_standings(date = "now"):
     """
@@ -242,7 +433,7 @@ def get_standings(date = "now"):
         requests.exceptions.RequestException: If there's an issue with the request.
     """
 
-    print(f"Fetching standings for {date} \n")
+    logger.info(f"Fetching standings for {date}")
     df = pd.json_normalize(fetch_standings_json(date).get("standings", []))
 
     # df = pd.concat([pd.json_normalize(record) for record in df['teamRecords']], ignore_index=True)
@@ -267,7 +458,7 @@ def get_pbp(game_id: int):
         requests.exceptions.RequestException: If there's an issue with the request.
     """
 
-    print(f"Fetching play-by-play for {game_id} \n")
+    logger.info(f"Fetching play-by-play for {game_id}")
 
     game_dict = fetch_play_by_play_json(game_id)
     
@@ -283,17 +474,11 @@ def get_pbp(game_id: int):
     df = df.rename(columns={'typeDescKey': 'event'})
 
     # Add elapsed time column
-    df['elapsedTime'] = (df['period'].astype(int) - 1) * 1200 + df['timeInPeriod'].str.split(':').apply(lambda x: int(x[0]) * 60 + int(x[1]))
+    df['elapsedTime'] = (pd.to_numeric(df['periodDescriptor.number']).astype(int) - 1) * 1200 + mmss_to_seconds(df['timeInPeriod'])
 
     # Fill for missing scores
     df[['details.awayScore', 'details.homeScore', 'details.awaySOG', 'details.homeSOG']] = df[['details.awayScore', 'details.homeScore', 'details.awaySOG', 'details.homeSOG']].ffill().fillna(0)
 
-    # Add normalized x-coordinate so that the home team is always defending the left side of the ice for future analysis
-    df['normalized_xCoord'] = df.apply(adjust_x_coord, axis=1)
-
-
-
-    
     # Add team abbreviations for each event
     df['eventTeam'] = df['details.eventOwnerTeamId'].map({game_dict.get('homeTeam', {}).get('id', "") : game_dict.get('homeTeam', {}).get('abbrev', ""),
                                                           game_dict.get('awayTeam', {}).get('id', "") : game_dict.get('awayTeam', {}).get('abbrev', "")})
@@ -322,7 +507,8 @@ def get_pbp(game_id: int):
     # Remove 'details.' and 'periodDescriptor.' prefixes from column names
     df.columns = df.columns.str.replace('details.', '').str.replace('periodDescriptor.', '')
 
-    # Now, the column names will be updated with the prefixes removed
+    # Add coordinates normalized so that the event team always attacks the right net, and the shot geometry
+    df = add_geometry(df)
 
 
     # #Fix score when goal
@@ -333,14 +519,131 @@ def get_pbp(game_id: int):
 
     return df
 
+SHIFT_CELL_CLASSES = ('playerHeading + border', 'lborder + bborder')
+TEAM_HEADING_CLASS = 'teamHeading + border'
+
+def _parse_shift_report_lxml(content: bytes):
+    """
+    Streams a TH/TV shift report with lxml, keeping only the cells we need.
+    """
+    team, cells = None, []
+    context = etree.iterparse(BytesIO(content), events=('end',), tag='td', html=True, encoding='ISO-8859-1')
+    for _, elem in context:
+        css = elem.get('class')
+        if css in SHIFT_CELL_CLASSES:
+            cells.append(''.join(elem.itertext()))
+        elif team is None and css == TEAM_HEADING_CLASS and elem.get('align') == 'center':
+            team = ''.join(elem.itertext())
+
+        # Free the parsed cells as we go so the whole tree is never held in memory
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    return team, cells
+
+def _parse_shift_report_bs4(content: bytes):
+    """
+    Parses a TH/TV shift report with BeautifulSoup.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content.decode('ISO-8859-1'), 'html.parser', multi_valued_attributes = None)
+    found = soup.find_all('td', {'class': list(SHIFT_CELL_CLASSES)})
+    heading = soup.find('td', {'align':'center', 'class':TEAM_HEADING_CLASS})
+    return (heading.get_text() if heading is not None else None), [cell.get_text() for cell in found]
+
+def parse_shift_report(content: bytes, parser: str = DEFAULT_SHIFT_PARSER):
+    """
+    Extracts the team name and the player heading / shift cells of a TH/TV shift report.
+
+    Args:
+      content: Raw body of the report.
+      parser: 'lxml' (streaming, fast) or 'bs4'. Falls back to 'bs4' if lxml is unavailable or fails.
+
+    Returns:
+      A tuple (team name, list of cell texts in document order).
+    """
+    if parser == 'lxml' and etree is not None:
+        try:
+            return _parse_shift_report_lxml(content)
+        except (etree.LxmlError, ValueError):
+            pass
+    return _parse_shift_report_bs4(content)
+
+SHIFT_FIELDS = ('shift_number', 'period', 'shift_start', 'shift_end', 'duration')
+
+def _append_shift_cells(cells, is_home: int, columns: dict):
+    """
+    Appends the shifts of a TH/TV report (as parsed by parse_shift_report) to columnar lists.
+
+    A player heading cell ('14 SUZUKI, NICK') is followed by five cells per shift:
+    shift number, period, start, end and duration.
+    """
+    headings = [i for i, line in enumerate(cells) if ', ' in line] + [len(cells)]
+
+    for start, end in zip(headings[:-1], headings[1:]):
+        number = int(cells[start].split(',')[0].split(' ')[0].strip())
+        shifts = cells[start + 1:end]
+        n = len(shifts) // 5
+
+        for k, field in enumerate(SHIFT_FIELDS):
+            columns[field].extend(shifts[k:5 * n:5])
+        columns['sweaterNumber'].extend([number] * n)
+        columns['is_home'].extend([is_home] * n)
+
+def shifts_from_reports(home_content: bytes, away_content: bytes, parser: str = DEFAULT_SHIFT_PARSER):
+    """
+    Builds the shifts dataframe from the raw TH (home) and TV (away) shift reports.
+
+    Args:
+      home_content: Raw body of the home team's report.
+      away_content: Raw body of the away team's report.
+      parser: HTML parser backend, 'lxml' (default) or 'bs4'.
+
+    Returns:
+      A dataframe with one row per shift.
+
+    Raises:
+      IndexError: If a report has no shift data.
+    """
+    columns = {field: [] for field in SHIFT_FIELDS + ('sweaterNumber', 'is_home')}
+
+    for is_home, content in ((1, home_content), (0, away_content)):
+        _, found = parse_shift_report(content, parser=parser)
+        if len(found)==0:
+            raise IndexError('This game has no shift data.')
+        _append_shift_cells(found, is_home, columns)
+
+    all_shifts = pd.DataFrame(columns)
+
+    period = all_shifts['period'].replace({'OT': '4'}).astype(int)
+
+    # 'M:SS / M:SS' is elapsed / remaining time in the period, keep the elapsed part
+    all_shifts = pd.DataFrame({'shift_number': all_shifts['shift_number'],
+                               'period': period,
+                               'duration': all_shifts['duration'],
+                               'sweaterNumber': all_shifts['sweaterNumber'],
+                               'is_home': all_shifts['is_home'],
+                               'startTime': all_shifts['shift_start'].str.partition(' / ')[0],
+                               'endTime': all_shifts['shift_end'].str.partition(' / ')[0]})
+
+    all_shifts['duration_s'] = mmss_to_seconds(all_shifts['duration'].fillna('00:00'))
+    all_shifts['startTime_s'] = mmss_to_seconds(all_shifts['startTime']) + 60 * (all_shifts['period'] - 1) * 20
+    all_shifts['endTime_s'] = mmss_to_seconds(all_shifts['endTime']) + 60 * (all_shifts['period'] - 1) * 20
+
+    return all_shifts
+
 # @timer
-def fetch_html_shifts(game_id=2023020069, season=None, pbp_json=None):
+def fetch_html_shifts(game_id=2023020069, season=None, pbp_json=None, parser=DEFAULT_SHIFT_PARSER, compact=False):
     ''' 
     Fetches shifts data from the NHL API and returns a DataFrame with the data.
     ----
     :param game_id: The game ID of the game to fetch shifts for.
     :param season: The season of the game. If not provided, it will be fetched from the API.
     :param pbp_json: The play-by-play JSON for the game. If not provided, it will be fetched from the API.
+    :param parser: HTML parser backend, 'lxml' (default) or 'bs4'.
+    :param compact: Cast the columns to compact dtypes (see compact_frame).
     :return: A DataFrame containing the shifts data for the game.
     '''
 
@@ -349,115 +652,256 @@ def fetch_html_shifts(game_id=2023020069, season=None, pbp_json=None):
 
     season = f"{str(game_id)[:4]}{int(str(game_id)[:4]) + 1}" if season is None else season
 
+    home_page = http_get(SHIFT_REPORT_HOME_ENDPOINT.format(season=season, game_id=str(game_id)[4:]))
+    away_page = http_get(SHIFT_REPORT_AWAY_ENDPOINT.format(season=season, game_id=str(game_id)[4:]))
 
-    ### HOME SHIFTS ###
-    url = SHIFT_REPORT_HOME_ENDPOINT.format(season=season, game_id=str(game_id)[4:])
-    page = (requests.get(url))
-    soup = BeautifulSoup(page.content.decode('ISO-8859-1'), 'html.parser', multi_valued_attributes = None)
-    found = soup.find_all('td', {'class':['playerHeading + border', 'lborder + bborder']})
-    if len(found)==0:
-        raise IndexError('This game has no shift data.')
-    thisteam = soup.find('td', {'align':'center', 'class':'teamHeading + border'}).get_text()
-    
+    all_shifts = shifts_from_reports(home_page.content, away_page.content, parser=parser)
+    return compact_frame(all_shifts, 'shifts') if compact else all_shifts
 
-    players = dict()
-    for i in range(len(found)):
-        line = found[i].get_text()
-        if ', ' in line:
-            name = line.split(',')
-            number = name[0].split(' ')[0].strip()
-            last_name =  name[0].split(' ')[1].strip()
-            first_name = name[1].strip()
-            full_name = first_name + " " + last_name
-            players[full_name] = dict()
-            players[full_name]['number'] = number
-            players[full_name]['name'] = full_name
-            players[full_name]['shifts'] = []
-        else:
-            players[full_name]['shifts'].extend([line])
-
-    alldf = pd.DataFrame()
-
-    for key in players.keys(): 
-        length = int(len(np.array((players[key]['shifts'])))/5)
-        df = pd.DataFrame(np.array((players[key]['shifts'])).reshape(length, 5)).rename(
-        columns = {0:'shift_number', 1:'period', 2:'shift_start', 3:'shift_end', 4:'duration'})
-        df = df.assign(name = players[key]['name'],
-                      sweaterNumber = int(players[key]['number']),
-                      team = thisteam,
-                      is_home = 1)
-        alldf = pd.concat([alldf, df], ignore_index=True)
-        
-    home_shifts = alldf
-
-    ### AWAY SHIFTS ###
-    url = SHIFT_REPORT_AWAY_ENDPOINT.format(season=season, game_id=str(game_id)[4:])
-    page = (requests.get(url))
-    soup = BeautifulSoup(page.content.decode('ISO-8859-1'), 'html.parser', multi_valued_attributes = None)
-    found = soup.find_all('td', {'class':['playerHeading + border', 'lborder + bborder']})
-    if len(found)==0:
+def shifts_from_json(content: bytes, pbp_json: dict):
+    """
+    Builds the shifts dataframe from the shiftcharts API, with the same columns as shifts_from_reports.
+
+    The API has no sweater numbers and no home/away flag, so they come from the play-by-play's
+    roster and home team. Rows are ordered like the reports: home team first, then by sweater
+    number and shift number.
+
+    Args:
+      content: Raw body of the shiftcharts response.
+      pbp_json: The play-by-play JSON of the game.
+
+    Returns:
+      A dataframe with one row per shift.
+
+    Raises:
+      IndexError: If the response has no shift data.
+    """
+    try:
+        rows = json.loads(content).get('data') or []
+    except (ValueError, AttributeError):
+        rows = []
+    rows = [row for row in rows if row.get('typeCode') == SHIFTCHART_SHIFT_TYPE]
+    if len(rows) == 0:
         raise IndexError('This game has no shift data.')
-    thisteam = soup.find('td', {'align':'center', 'class':'teamHeading + border'}).get_text()
-    
 
-    players = dict()
-    for i in range(len(found)):
-        line = found[i].get_text()
-        if ', ' in line:
-            name = line.split(',')
-            number = name[0].split(' ')[0].strip()
-            last_name =  name[0].split(' ')[1].strip()
-            first_name = name[1].strip()
-            full_name = first_name + " " + last_name
-            players[full_name] = dict()
-            players[full_name]['number'] = number
-            players[full_name]['name'] = full_name
-            players[full_name]['shifts'] = []
-        else:
-            players[full_name]['shifts'].extend([line])
+    df = pd.DataFrame(rows)
+    sweaters = {spot.get('playerId'): spot.get('sweaterNumber') for spot in pbp_json.get('rosterSpots', [])}
+
+    # '05:36' -> '5:36', as in the reports
+    start = df['startTime'].str.replace(r'^0(\d)', r'\1', regex=True)
+    end = df['endTime'].str.replace(r'^0(\d)', r'\1', regex=True)
+
+    all_shifts = pd.DataFrame({'shift_number': df['shiftNumber'].astype(str),
+                               'period': df['period'].astype(int),
+                               'duration': df['duration'],
+                               'sweaterNumber': df['playerId'].map(sweaters),
+                               'is_home': (df['teamId'] == pbp_json.get('homeTeam', {}).get('id')).astype(int),
+                               'startTime': start,
+                               'endTime': end})
 
-    alldf = pd.DataFrame()
+    all_shifts['duration_s'] = mmss_to_seconds(all_shifts['duration'].fillna('00:00'))
+    all_shifts['startTime_s'] = mmss_to_seconds(all_shifts['startTime']) + 60 * (all_shifts['period'] - 1) * 20
+    all_shifts['endTime_s'] = mmss_to_seconds(all_shifts['endTime']) + 60 * (all_shifts['period'] - 1) * 20
 
-    for key in players.keys(): 
-        length = int(len(np.array((players[key]['shifts'])))/5)
-        df = pd.DataFrame(np.array((players[key]['shifts'])).reshape(length, 5)).rename(
-        columns = {0:'shift_number', 1:'period', 2:'shift_start', 3:'shift_end', 4:'duration'})
-        df = df.assign(name = players[key]['name'],
-                      sweaterNumber = int(players[key]['number']),
-                      team = thisteam,
-                      is_home = 0)
-        alldf = pd.concat([alldf, df], ignore_index=True)
-        
-    away_shifts = alldf
+    order = np.lexsort((df['shiftNumber'].to_numpy(), all_shifts['sweaterNumber'].to_numpy(), -all_shifts['is_home'].to_numpy()))
+    return all_shifts.iloc[order].reset_index(drop=True)
 
-    ### MERGE SHIFTS ###
-    all_shifts = (pd.concat([home_shifts, away_shifts], ignore_index=True)
-                  .drop(columns=['name', 'team']))
-    #               .merge(rosters, how='left', on=['sweaterNumber', 'is_home']))
+# @timer
+def fetch_json_shifts(game_id=2023020069, pbp_json=None, compact=False):
+    """
+    Fetches the shifts of a game from the shiftcharts API: one JSON payload instead of the two HTML reports.
 
+    Args:
+      game_id: Identifier ID for a given game.
+      pbp_json: The play-by-play JSON for the game. If not provided, it is fetched.
+      compact: Cast the columns to compact dtypes (see compact_frame).
 
-    all_shifts[['startTime', 'startTime_remaning']] = all_shifts['shift_start'].str.split(' / ', expand=True)
+    Returns:
+      A dataframe containing the shifts of the game, like fetch_html_shifts.
 
-    # # Split 'shift_end' column into two columns
-    all_shifts[['endTime', 'endTime_remaning']] = all_shifts['shift_end'].str.split(' / ', expand=True)    
+    Raises:
+      requests.exceptions.RequestException: If there's an issue with the request.
+      IndexError: If the API has no shift data for the game.
+    """
+    pbp_json = fetch_play_by_play_json(game_id) if pbp_json is None else pbp_json
 
-    all_shifts = all_shifts.drop(columns=[ 'startTime_remaning',  'endTime_remaning', 'shift_start', 'shift_end']).replace({'OT':4})
-    
-    str_to_sec = lambda x: int(x.split(':')[0]) * 60 + int(x.split(':')[1])
+    response = http_get(SHIFT_API_ENDPOINT.format(game_id=game_id))
+    response.raise_for_status()
 
-    all_shifts['period'] = all_shifts['period'].astype(int)
-    all_shifts['duration_s'] = all_shifts['duration'].fillna('00:00').apply(str_to_sec)
-    all_shifts['startTime_s'] = all_shifts['startTime'].apply(str_to_sec) + 60 * (all_shifts['period'] - 1) * 20
-    all_shifts['endTime_s'] = all_shifts['endTime'].apply(str_to_sec) + 60 * (all_shifts['period'] - 1) * 20
-    
-    
+    all_shifts = shifts_from_json(response.content, pbp_json)
+    return compact_frame(all_shifts, 'shifts') if compact else all_shifts
 
-    # all_shifts['date'] = pbp_json['gameDate']
-    # all_shifts['season'] = pbp_json['season']
-    # all_shifts['gameType'] = game_id
+SHIFT_KEY = ['is_home', 'sweaterNumber', 'period', 'startTime_s', 'endTime_s']
 
+def compare_shifts(json_shifts: pd.DataFrame, html_shifts: pd.DataFrame):
+    """
+    Compares the shifts of the two sources on (is_home, sweaterNumber, period, startTime_s, endTime_s).
 
-    return all_shifts
+    Returns:
+      A dictionary with the number of shifts only in the JSON ('json_only') and only in the reports ('html_only').
+    """
+    merged = json_shifts[SHIFT_KEY].merge(html_shifts[SHIFT_KEY], how='outer', on=SHIFT_KEY, indicator=True)
+    return {'json_only': int((merged['_merge'] == 'left_only').sum()),
+            'html_only': int((merged['_merge'] == 'right_only').sum())}
+
+def select_shifts(sources: dict, pbp_json: dict, parser: str = DEFAULT_SHIFT_PARSER):
+    """
+    Builds the shifts of a game from whichever shift sources it has (see fetch_game_sources).
+
+    The shiftcharts JSON is preferred and the HTML reports are the fallback. When both are
+    available they are compared, and the reports (the official record) win if they disagree.
+
+    Args:
+      sources: Raw payloads, with 'shifts_json' and/or 'shifts_home' and 'shifts_away'.
+      pbp_json: The play-by-play JSON of the game.
+      parser: HTML parser backend of the reports, 'lxml' (default) or 'bs4'.
+
+    Returns:
+      A dataframe with one row per shift (see shifts_from_reports).
+
+    Raises:
+      IndexError: If no source has shift data.
+    """
+    json_shifts = None
+    if sources.get('shifts_json') is not None:
+        try:
+            json_shifts = shifts_from_json(sources['shifts_json'], pbp_json)
+        except IndexError:
+            json_shifts = None
+
+    if sources.get('shifts_home') is None or sources.get('shifts_away') is None:
+        if json_shifts is None:
+            raise IndexError('This game has no shift data.')
+        return json_shifts
+
+    if json_shifts is None:
+        return shifts_from_reports(sources['shifts_home'], sources['shifts_away'], parser=parser)
+
+    try:
+        html_shifts = shifts_from_reports(sources['shifts_home'], sources['shifts_away'], parser=parser)
+    except IndexError:
+        return json_shifts
+
+    mismatch = compare_shifts(json_shifts, html_shifts)
+    if mismatch['json_only'] or mismatch['html_only']:
+        logger.warning(f"Shift sources disagree for game {pbp_json.get('id')}: {mismatch}, using the HTML reports")
+        count('shift_source_mismatches')
+        return html_shifts
+    return json_shifts
+
+class SourceFetchError(requests.exceptions.RequestException):
+    """
+    Raised when one of the sources of a game could not be fetched. The original error is chained.
+    """
+
+    def __init__(self, game_id, source, error):
+        super().__init__(f"Could not fetch the {source} source of game {game_id}: {error}")
+        self.game_id = game_id
+        self.source = source
+
+# @timer
+def fetch_game_sources(game_id: int, season=None, shift_source: str = DEFAULT_SHIFT_SOURCE):
+    """
+    Fetches the raw source payloads of a game, as returned by the servers.
+
+    The play-by-play JSON and the shift sources don't depend on each other, so they are
+    fetched concurrently and the call takes about as long as the slowest of them.
+
+    Args:
+      game_id: Identifier ID for a given game.
+      season: The season of the game. If not provided, it is derived from the game ID.
+      shift_source: 'json' (shiftcharts API), 'html' (TH/TV reports), 'both', or 'auto' (default):
+        the JSON, and the reports too if the JSON has no shift. None fetches the play-by-play only.
+
+    Returns:
+      A dictionary with the raw bodies of the play-by-play JSON ('pbp') and of the shiftcharts
+      JSON ('shifts_json') and/or the home and away HTML shift reports ('shifts_home', 'shifts_away').
+
+    Raises:
+      SourceFetchError: If any of the sources fails, naming the first one that did (in the order above).
+    """
+    if shift_source is not None and shift_source not in SHIFT_SOURCES:
+        raise ValueError(f"shift_source must be one of {SHIFT_SOURCES}, not {shift_source!r}")
+
+    def fetch(url):
+        response = http_get(url)
+        response.raise_for_status()
+        return response.content
+
+    with span('fetch_sources', shift_source=shift_source):
+        urls = game_source_urls(game_id, season, 'json' if shift_source == 'auto' else shift_source)
+        sources = fetch_concurrently(game_id, urls, fetch)
+
+        if shift_source == 'auto' and not has_json_shifts(sources['shifts_json']):
+            urls = game_source_urls(game_id, season, 'html')
+            sources.update(fetch_concurrently(game_id, {key: urls[key] for key in ('shifts_home', 'shifts_away')}, fetch))
+
+    return sources
+
+def has_json_shifts(content: bytes):
+    """
+    Returns whether a shiftcharts payload holds any shift (it only has the goals, or nothing, early on).
+    """
+    if not content:
+        return False
+    try:
+        return any(row.get('typeCode') == SHIFTCHART_SHIFT_TYPE for row in json.loads(content).get('data') or [])
+    except (ValueError, AttributeError):
+        return False
+
+def game_source_urls(game_id: int, season=None, shift_source: str = 'html'):
+    """
+    Returns the URLs of a game's sources: the play-by-play JSON ('pbp') and, depending on
+    shift_source ('html', 'json', 'both' or None), the home and away HTML shift reports
+    ('shifts_home', 'shifts_away') and/or the shiftcharts JSON ('shifts_json').
+    """
+    season = f"{str(game_id)[:4]}{int(str(game_id)[:4]) + 1}" if season is None else season
+
+    urls = {'pbp': PLAY_BY_PLAY_ENDPOINT.format(game_id=game_id)}
+    if shift_source in ('json', 'both'):
+        urls['shifts_json'] = SHIFT_API_ENDPOINT.format(game_id=game_id)
+    if shift_source in ('html', 'both'):
+        urls['shifts_home'] = SHIFT_REPORT_HOME_ENDPOINT.format(season=season, game_id=str(game_id)[4:])
+        urls['shifts_away'] = SHIFT_REPORT_AWAY_ENDPOINT.format(season=season, game_id=str(game_id)[4:])
+    return urls
+
+def fetch_concurrently(game_id: int, urls: dict, fetch):
+    """
+    Calls fetch(url) for every source of a game at once and joins the results.
+
+    Args:
+      game_id: Identifier ID of the game, for error messages.
+      urls: Dictionary of source -> URL (see game_source_urls).
+      fetch: Function fetching one URL.
+
+    Returns:
+      A dictionary of source -> result of fetch.
+
+    Raises:
+      SourceFetchError: If any of the sources fails, naming the first one that did (in the order of urls).
+    """
+    # Each fetch runs in the caller's context, so it keeps its scoped host limit (see scoped_host_concurrency)
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        futures = {source: executor.submit(contextvars.copy_context().run, fetch, url) for source, url in urls.items()}
+
+    results = {}
+    for source, future in futures.items():
+        error = future.exception()
+        if error is not None:
+            raise SourceFetchError(game_id, source, error) from error
+        results[source] = future.result()
+
+    return results
+
+def sources_checksum(sources: dict):
+    """
+    Returns the SHA-256 of a game's raw source payloads (see fetch_game_sources).
+    """
+    digest = hashlib.sha256()
+    for key in sorted(sources):
+        digest.update(key.encode())
+        digest.update(sources[key] or b'')
+    return digest.hexdigest()
 
 # /Users/max/Documents/Projects/max_nhl_scraper/.venv/bin/python -m nhl.utility.functions
 
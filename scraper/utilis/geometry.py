@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from .constants import *
+
+
+# Columns added by add_geometry, all float32
+GEOMETRY_COLUMNS = ('normalized_xCoord', 'normalized_yCoord', 'normalized_xCoord_vertical', 'normalized_yCoord_vertical',
+                    'shot_distance', 'shot_angle', 'rink_zone', 'left_side', 'behind_net')
+
+
+def attack_sign(defending_side, is_home):
+    """
+    Returns 1 where the event team attacks the right net (positive x) and -1 where it attacks the left one.
+
+    The home team attacks the right net when it defends the left side. Events without an event
+    team or a defending side keep their coordinates (1).
+
+    Args:
+      defending_side: Sequence of the homeTeamDefendingSide of the events ('left', 'right' or missing).
+      is_home: Sequence of the home indicator of the event team (1, 0 or NaN).
+
+    Returns:
+      A float32 array.
+    """
+    side = pd.Series(defending_side, dtype=object).to_numpy()
+    home = pd.to_numeric(pd.Series(is_home), errors='coerce').to_numpy(dtype=float)
+
+    flip = ((side == 'right') & (home == 1)) | ((side == 'left') & (home == 0))
+    return np.where(flip, -1, 1).astype(np.float32)
+
+
+def geometry(x, y, defending_side, is_home):
+    """
+    Computes the normalized coordinates and shot geometry of events in one vectorized pass.
+
+    The coordinates are normalized so that the event team always attacks the right net, at
+    (NET_X, 0). Missing coordinates give NaN features.
+
+    Args:
+      x: Sequence of the xCoord of the events.
+      y: Sequence of the yCoord of the events.
+      defending_side: Sequence of the homeTeamDefendingSide of the events.
+      is_home: Sequence of the home indicator of the event team.
+
+    Returns:
+      A dictionary of float32 arrays:
+        normalized_xCoord, normalized_yCoord: coordinates with the attacked net on the right.
+        normalized_xCoord_vertical, normalized_yCoord_vertical: the same rotated so the attacked net is on top.
+        shot_distance: distance to the attacked net, in feet.
+        shot_angle: angle to the attacked net in degrees, 0 straight on and over 90 from behind the goal line.
+        rink_zone: 1 in the offensive zone, 0 in the neutral zone, -1 in the defensive zone.
+        left_side: 1 on the left of the attacked net (positive normalized y), 0 on the right or in the middle.
+        behind_net: 1 behind the attacked net's goal line, 0 in front of it.
+    """
+    x = pd.to_numeric(pd.Series(x), errors='coerce').to_numpy(dtype=np.float32)
+    y = pd.to_numeric(pd.Series(y), errors='coerce').to_numpy(dtype=np.float32)
+    sign = attack_sign(defending_side, is_home)
+    missing = np.isnan(x) | np.isnan(y)
+
+    nx, ny = x * sign, y * sign
+    dx = np.float32(NET_X) - nx
+
+    def flag(condition):
+        return np.where(missing, np.nan, condition).astype(np.float32)
+
+    return {
+        'normalized_xCoord': nx,
+        'normalized_yCoord': ny,
+        'normalized_xCoord_vertical': -ny,
+        'normalized_yCoord_vertical': nx,
+        'shot_distance': np.hypot(dx, ny).astype(np.float32),
+        'shot_angle': np.degrees(np.arctan2(np.abs(ny), dx)).astype(np.float32),
+        'rink_zone': flag(np.select([nx > BLUE_LINE_X, nx < -BLUE_LINE_X], [1, -1], 0)),
+        'left_side': flag(ny > 0),
+        'behind_net': flag(nx > NET_X),
+    }
+
+
+def add_geometry(df: pd.DataFrame, x: str = 'xCoord', y: str = 'yCoord'):
+    """
+    Adds the normalized coordinates and shot geometry (see geometry) to events, e.g. the pbp output
+    of scrape_game or the events of a whole season concatenated.
+
+    Args:
+      df: Events with the x and y columns, homeTeamDefendingSide and is_home (missing ones count as NaN).
+      x: Name of the x coordinate column.
+      y: Name of the y coordinate column.
+
+    Returns:
+      The dataframe with the GEOMETRY_COLUMNS added (or replaced).
+    """
+    # Columns the events may lack, e.g. when no play has coordinates
+    def column(col):
+        return df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+
+    features = geometry(column(x), column(y), column('homeTeamDefendingSide'), column('is_home'))
+    for col in GEOMETRY_COLUMNS:
+        df[col] = features[col]
+    return df
@@ -1,4 +1,5 @@
 from datetime import datetime
+import pandas as pd
 
 
 def is_valid_date(date_str : str):
@@ -25,8 +26,20 @@ def find_key_by_value_in_list(dictionary, value):
     return None
 
 def adjust_x_coord(row):
-    if row['homeTeamDefendingSide'] == 'left':
-        return row['details.xCoord']
-    else:
-        # Flip the x-coordinate within the range -100 to 100
-        return 100 - row['details.xCoord']
+    """
+    Normalizes the x-coordinate of one event so that the event team attacks the right net.
+
+    Row-wise version of geometry.attack_sign, prefer add_geometry on whole dataframes.
+    """
+    from .geometry import attack_sign
+
+    x = row['details.xCoord'] if 'details.xCoord' in row else row['xCoord']
+    return x * attack_sign([row['homeTeamDefendingSide']], [row.get('is_home')])[0]
+
+
+def mmss_to_seconds(values):
+    """
+    Converts a series of 'MM:SS' strings to seconds in one vectorized pass.
+    """
+    parts = pd.Series(values).str.split(':', n=1, expand=True)
+    return parts[0].astype(int) * 60 + parts[1].astype(int)
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+
+from .toi import _sweep, _concat_shifts
+
+
+# Pairs buffered by SharedToi before they are summed into its matrices
+SHARED_TOI_BUFFER = 1_000_000
+
+SHARED_TOI_KINDS = ('with', 'vs')
+
+
+class PlayerIndex:
+    """
+    Compact index of player IDs: every player gets the next free row (and column) of the matrices.
+    """
+
+    def __init__(self, ids=()):
+        self.ids = np.empty(0, dtype=np.int64)
+        self._sorter = np.empty(0, dtype=np.int64)
+        self.add(ids)
+
+    def add(self, ids):
+        """
+        Adds the new player IDs to the index and returns the positions of all the given IDs.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        new = pd.unique(ids)
+        new = new[~np.isin(new, self.ids)]
+        if len(new):
+            self.ids = np.r_[self.ids, new]
+            self._sorter = np.argsort(self.ids, kind='stable')
+        return self.positions(ids)
+
+    def positions(self, ids):
+        """
+        Returns the positions of player IDs already in the index.
+
+        Raises:
+          KeyError: If a player is not in the index.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        missing = np.setdiff1d(ids, self.ids)
+        if len(missing):
+            raise KeyError(f"Players not in the index: {missing.tolist()}")
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        return self._sorter[np.searchsorted(self.ids, ids, sorter=self._sorter)]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _pairs(members: pd.DataFrame):
+    """
+    Pairs every player on the ice in a segment with every player on the ice in the same segment (themselves included).
+
+    Returns:
+      A tuple (left, right) of positions in members.
+    """
+    segment = members['segment'].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1], True])
+    sizes = np.diff(bounds)
+
+    size = np.repeat(sizes, sizes)
+    first = np.repeat(bounds[:-1], sizes)
+
+    left = np.repeat(np.arange(len(segment)), size)
+    right = np.repeat(first, size) + np.arange(size.sum()) - np.repeat(np.cumsum(size) - size, size)
+    return left, right
+
+
+class _Accumulator:
+    """
+    Sparse matrix built by summing (row, column, seconds) triplets, kept as sorted unique keys.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.seconds = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self.pending = 0
+
+    def add(self, rows, cols, seconds):
+        self._pending.append((rows.astype(np.int64) << 32 | cols.astype(np.int64), seconds.astype(np.int64)))
+        self.pending += len(rows)
+
+    def compact(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys] + [keys for keys, _ in self._pending])
+        seconds = np.concatenate([self.seconds] + [seconds for _, seconds in self._pending])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.seconds = np.bincount(inverse.ravel(), weights=seconds, minlength=len(self.keys)).astype(np.int64)
+        self._pending, self.pending = [], 0
+
+    def triplets(self):
+        self.compact()
+        return self.keys >> 32, self.keys & 0xFFFFFFFF, self.seconds
+
+
+class SharedToi:
+    """
+    Seconds every pair of players spent on the ice together, as teammates ('with') and as
+    opponents ('vs'), stored as sparse symmetric player-by-player matrices.
+
+    Games can be added one at a time (e.g. as scrape_games yields them), so a full season is
+    accumulated in memory bounded by the number of distinct pairs. The diagonal of the 'with'
+    matrix is the time on ice of every player.
+
+        linemates = SharedToi(states=['5v5'])
+        for game_id, shifts in scrape_games(game_ids, file='shifts'):
+            linemates.add(shifts)
+        pairs = linemates.to_frame('with')
+    """
+
+    def __init__(self, states=None, goalies: bool = False, buffer_size: int = SHARED_TOI_BUFFER):
+        """
+        Args:
+          states: Only count the time in these strength states (see strength_states), e.g. ['5v5'],
+            from the point of view of the row player's team. By default all of them.
+          goalies: Also count the goalies, by default only the skaters.
+          buffer_size: Number of pairs buffered before they are summed into the matrices.
+        """
+        self.states = None if states is None else list(states)
+        self.goalies = goalies
+        self.buffer_size = buffer_size
+        self.index = PlayerIndex()
+        self._matrices = {kind: _Accumulator() for kind in SHARED_TOI_KINDS}
+
+    def add(self, shifts):
+        """
+        Adds the shared time on ice of one game or many.
+
+        Args:
+          shifts: Shifts matched to the roster (the shifts output of scrape_game), of one game or
+            many (a dataframe with a gameId column, or an iterable of them).
+
+        Returns:
+          The SharedToi itself.
+        """
+        segments, members = _sweep(_concat_shifts(shifts))
+        if not self.goalies:
+            members = members[~members['is_goalie']]
+        members = members.sort_values('segment', kind='stable')
+
+        rows = segments.loc[members['segment'].to_numpy()]
+        state = np.where(members['is_home'], rows['home_state'], rows['away_state'])
+        positions = self.index.add(members['playerId'].to_numpy())
+        is_home = members['is_home'].to_numpy()
+        duration = rows['duration_s'].to_numpy()
+
+        left, right = _pairs(members)
+        if self.states is not None:
+            keep = np.isin(state[left], self.states)
+            left, right = left[keep], right[keep]
+
+        teammates = is_home[left] == is_home[right]
+        for kind, selected in (('with', teammates), ('vs', ~teammates)):
+            matrix = self._matrices[kind]
+            matrix.add(positions[left[selected]], positions[right[selected]], duration[left[selected]])
+            if matrix.pending >= self.buffer_size:
+                matrix.compact()
+
+        return self
+
+    def update(self, other: 'SharedToi'):
+        """
+        Adds the matrices of another SharedToi (e.g. built in another process) to these ones.
+        """
+        positions = self.index.add(other.index.ids)
+        for kind in SHARED_TOI_KINDS:
+            rows, cols, seconds = other._matrices[kind].triplets()
+            self._matrices[kind].add(positions[rows], positions[cols], seconds)
+            self._matrices[kind].compact()
+        return self
+
+    def to_frame(self, kind: str = 'with'):
+        """
+        Returns the non-zero entries of a matrix ('with' or 'vs') as a dataframe with the columns
+        playerId, other_playerId and seconds.
+        """
+        rows, cols, seconds = self._matrices[kind].triplets()
+        return pd.DataFrame({'playerId': self.index.ids[rows], 'other_playerId': self.index.ids[cols], 'seconds': seconds})
+
+    def to_scipy(self, kind: str = 'with'):
+        """
+        Returns a matrix ('with' or 'vs') as a scipy.sparse CSR matrix, whose rows and columns
+        are the players of self.index.ids.
+
+        Raises:
+          ImportError: If scipy is not installed.
+        """
+        from scipy import sparse
+
+        rows, cols, seconds = self._matrices[kind].triplets()
+        return sparse.csr_matrix((seconds, (rows, cols)), shape=(len(self.index), len(self.index)))
+
+    def nbytes(self):
+        """
+        Returns the memory held by the matrices and the index, in bytes.
+        """
+        held = self.index.ids.nbytes + self.index._sorter.nbytes
+        for matrix in self._matrices.values():
+            held += matrix.keys.nbytes + matrix.seconds.nbytes
+            held += sum(keys.nbytes + seconds.nbytes for keys, seconds in matrix._pending)
+        return held
+
+
+def shared_toi(shifts, states=None, goalies: bool = False):
+    """
+    Builds the shared time on ice matrices of one game or many (see SharedToi).
+
+    Returns:
+      A SharedToi, e.g. shared_toi(shifts).to_frame('vs') for the seconds of every pair of opponents.
+    """
+    return SharedToi(states=states, goalies=goalies).add(shifts)
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from .constants import *
+
+
+class Manifest:
+    """
+    SQLite record of the games scraped by a bulk job: status, number of attempts,
+    checksum of the raw sources and written output files. It lets an interrupted or
+    nightly job skip the games already done and retry only the failed ones.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+          path: SQLite file of the manifest (created if missing).
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS games (
+                            game_id INTEGER PRIMARY KEY, season INTEGER, game_date TEXT,
+                            status TEXT, attempts INTEGER DEFAULT 0, error TEXT,
+                            checksum TEXT, outputs TEXT, updated_at REAL)""")
+        self._db.commit()
+
+    def get(self, game_id: int):
+        """
+        Returns the manifest entry of a game as a dictionary, or None if it was never scraped.
+        """
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM games WHERE game_id = ?", (int(game_id),))
+            row = cursor.fetchone()
+            columns = [col[0] for col in cursor.description]
+        if row is None:
+            return None
+        entry = dict(zip(columns, row))
+        entry['outputs'] = json.loads(entry['outputs']) if entry['outputs'] else {}
+        return entry
+
+    def game_ids(self, status: str = MANIFEST_DONE, season: int = None):
+        """
+        Returns the set of game IDs with a given status, optionally for one season.
+        """
+        query, params = "SELECT game_id FROM games WHERE status = ?", [status]
+        if season is not None:
+            query, params = query + " AND season = ?", params + [int(season)]
+        with self._lock:
+            return {row[0] for row in self._db.execute(query, params).fetchall()}
+
+    def mark_done(self, game_id: int, season: int, game_date: str, checksum: str, outputs: dict):
+        """
+        Records a successfully scraped game.
+        """
+        with self._lock:
+            self._db.execute("""INSERT INTO games (game_id, season, game_date, status, attempts, error, checksum, outputs, updated_at)
+                                VALUES (?, ?, ?, ?, 1, NULL, ?, ?, ?)
+                                ON CONFLICT(game_id) DO UPDATE SET season = excluded.season, game_date = excluded.game_date,
+                                status = excluded.status, attempts = attempts + 1, error = NULL, checksum = excluded.checksum,
+                                outputs = excluded.outputs, updated_at = excluded.updated_at""",
+                             (int(game_id), int(season), game_date, MANIFEST_DONE, checksum, json.dumps(outputs), time.time()))
+            self._db.commit()
+
+    def mark_failed(self, game_id: int, season: int, error: Exception):
+        """
+        Records a game that could not be scraped, keeping its previous outputs if any.
+        """
+        with self._lock:
+            self._db.execute("""INSERT INTO games (game_id, season, status, attempts, error, updated_at)
+                                VALUES (?, ?, ?, 1, ?, ?)
+                                ON CONFLICT(game_id) DO UPDATE SET status = excluded.status, attempts = attempts + 1,
+                                error = excluded.error, updated_at = excluded.updated_at""",
+                             (int(game_id), int(season), MANIFEST_FAILED, f"{type(error).__name__}: {error}", time.time()))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
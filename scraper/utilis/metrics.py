@@ -0,0 +1,231 @@
+import re
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+_sinks = []
+
+
+def add_sink(sink):
+    """
+    Starts sending the spans and counters to a sink (e.g. MemorySink, JsonLogSink, PrometheusSink).
+
+    Returns:
+      The sink, to remove it later with remove_sink.
+    """
+    _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+def clear_sinks():
+    del _sinks[:]
+
+def enabled():
+    """
+    Returns True if any sink is listening. Instrumentation is a no-op otherwise.
+    """
+    return bool(_sinks)
+
+
+class Span:
+    """
+    A timed stage. Extra values (e.g. bytes) can be attached to it with set() while it runs.
+    """
+
+    __slots__ = ('name', 'labels', 'values', 'start', 'seconds', 'error')
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.values = {}
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.error = None
+
+    def set(self, **values):
+        self.values.update(values)
+
+    def to_dict(self):
+        return {'type': 'span', 'name': self.name, 'labels': self.labels, 'seconds': self.seconds,
+                'error': self.error, **self.values}
+
+
+class _NoSpan:
+    """
+    Stand-in span when no sink is listening.
+    """
+
+    def set(self, **values):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+
+@contextmanager
+def _span(name: str, labels: dict):
+    current = Span(name, labels)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.seconds = time.perf_counter() - current.start
+        for sink in list(_sinks):
+            sink.span(current)
+
+@contextmanager
+def _no_span():
+    yield _NO_SPAN
+
+def span(name: str, **labels):
+    """
+    Times a stage of the pipeline.
+
+        with span('parse', source='shifts') as s:
+            ...
+            s.set(bytes=len(content))
+
+    Args:
+      name: Name of the stage (e.g. 'fetch', 'parse_shifts', 'on_ice', 'write').
+      **labels: Low cardinality labels (e.g. endpoint='/v1/gamecenter/*/play-by-play').
+
+    Returns:
+      A context manager yielding the Span, or a no-op one when no sink is listening.
+    """
+    if not _sinks:
+        return _no_span()
+    return _span(name, labels)
+
+def count(name: str, value: float = 1, **labels):
+    """
+    Increments a counter (e.g. 'cache_hits', 'retries', 'bytes_downloaded'). A no-op when no sink is listening.
+    """
+    if not _sinks:
+        return
+    for sink in list(_sinks):
+        sink.count(name, value, labels)
+
+
+def endpoint_label(url: str):
+    """
+    Returns the path of a URL with its IDs, seasons and dates replaced by '*', e.g. '/v1/gamecenter/*/play-by-play'.
+    """
+    path = re.sub(r'^https?://[^/]+', '', url).split('?')[0]
+    return re.sub(r'\d{4,}[\d-]*', '*', path)
+
+
+def _key(name: str, labels: dict):
+    return (name, tuple(sorted(labels.items())))
+
+
+class MemorySink:
+    """
+    Aggregates the spans (count, total, min and max seconds, summed values) and counters in memory.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, span: Span):
+        with self._lock:
+            stats = self.spans.setdefault(_key(span.name, span.labels),
+                                          {'count': 0, 'errors': 0, 'seconds': 0.0, 'min': float('inf'), 'max': 0.0})
+            stats['count'] += 1
+            stats['errors'] += span.error is not None
+            stats['seconds'] += span.seconds
+            stats['min'] = min(stats['min'], span.seconds)
+            stats['max'] = max(stats['max'], span.seconds)
+            for value, amount in span.values.items():
+                stats[value] = stats.get(value, 0) + amount
+
+    def count(self, name: str, value: float, labels: dict):
+        with self._lock:
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self):
+        """
+        Returns the aggregated spans and counters as a list of dictionaries, slowest stages first.
+        """
+        with self._lock:
+            rows = [{'type': 'span', 'name': name, **dict(labels), **stats} for (name, labels), stats in self.spans.items()]
+            rows.sort(key=lambda row: row['seconds'], reverse=True)
+            rows += [{'type': 'counter', 'name': name, **dict(labels), 'value': value} for (name, labels), value in self.counters.items()]
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+
+class JsonLogSink:
+    """
+    Logs every span and counter increment as one JSON line.
+    """
+
+    def __init__(self, log: logging.Logger = logger, level: int = logging.INFO):
+        self.log = log
+        self.level = level
+
+    def span(self, span: Span):
+        self.log.log(self.level, json.dumps(span.to_dict(), default=str))
+
+    def count(self, name: str, value: float, labels: dict):
+        self.log.log(self.level, json.dumps({'type': 'counter', 'name': name, 'labels': labels, 'value': value}, default=str))
+
+
+class PrometheusSink(MemorySink):
+    """
+    Aggregates in memory like MemorySink, and renders the Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix: str = 'nhl_scraper'):
+        super().__init__()
+        self.prefix = prefix
+
+    @staticmethod
+    def _labels(labels, **extra):
+        labels = {**dict(labels), **extra}
+        if not labels:
+            return ''
+        escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in labels.items()}
+        return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(escaped.items())) + '}'
+
+    def render(self):
+        """
+        Returns the metrics as Prometheus text (a summary per span, a counter per counter).
+        """
+        lines = []
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+
+        if spans:
+            metric = f"{self.prefix}_span_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for (name, labels), stats in spans:
+                lines.append(f"{metric}_sum{self._labels(labels, span=name)} {stats['seconds']}")
+                lines.append(f"{metric}_count{self._labels(labels, span=name)} {stats['count']}")
+
+        for name in sorted({name for (name, _), _ in counters}):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines += [f"{metric}{self._labels(labels)} {value}" for (counter, labels), value in counters if counter == name]
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file: str):
+        with open(file, 'w') as f:
+            f.write(self.render())
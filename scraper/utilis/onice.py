@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+
+# Strength states, from the point of view of one team (see strength_states)
+STRENGTH_STATES = ('5v5', 'EV', 'PP', 'SH', 'EN')
+
+
+def expand_intervals(starts, ends, seconds):
+    """
+    Pairs every [start, end) interval with the positions of the sorted seconds it covers.
+
+    Args:
+      starts: Array of interval start times (in seconds).
+      ends: Array of interval end times (in seconds), exclusive.
+      seconds: Sorted array of unique seconds to resolve.
+
+    Returns:
+      A tuple (interval_idx, second_idx) of equally long integer arrays, ordered by interval.
+    """
+    lo = np.searchsorted(seconds, starts, side='left')
+    hi = np.searchsorted(seconds, ends, side='left')
+    counts = np.clip(hi - lo, 0, None)
+
+    interval_idx = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    second_idx = np.repeat(lo, counts) + offsets
+
+    return interval_idx, second_idx
+
+
+def _group_lists(keys, values, n):
+    """
+    Splits values (sorted by key) into one list per key in range(n).
+    """
+    out = [[] for _ in range(n)]
+    if len(keys) == 0:
+        return out
+
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    for key, chunk in zip(keys[np.r_[0, bounds]], np.split(values, bounds)):
+        out[key] = chunk.tolist()
+
+    return out
+
+
+def resolve_on_ice(shifts: pd.DataFrame, seconds):
+    """
+    Resolves the players on the ice at every given second in one vectorized pass.
+
+    A player is on the ice at second s when startTime_s <= s < endTime_s. Each shift
+    is matched to the event seconds it covers with a binary search over the sorted
+    unique seconds, instead of scanning every shift for every event.
+
+    Args:
+      shifts: Shifts dataframe with 'startTime_s', 'endTime_s', 'is_home', 'playerId' and 'positionCode' columns.
+      seconds: Elapsed game seconds to resolve (one per event).
+
+    Returns:
+      A dataframe with one row per second (same order as the input) and the columns
+      'home_skater_ids', 'away_skater_ids' (lists of player IDs in shift order),
+      'home_skaters', 'away_skaters' (number of skaters), 'home_goalie_id' and
+      'away_goalie_id' (NaN unless exactly one goalie is on the ice).
+    """
+    seconds = np.asarray(seconds)
+    unique_seconds, inverse = np.unique(seconds, return_inverse=True)
+    n = len(unique_seconds)
+
+    shifts = shifts.reset_index(drop=True)
+    starts = pd.to_numeric(shifts['startTime_s'], errors='coerce').to_numpy(dtype=float)
+    ends = pd.to_numeric(shifts['endTime_s'], errors='coerce').to_numpy(dtype=float)
+
+    shift_idx, second_idx = expand_intervals(starts, ends, unique_seconds)
+
+    pairs = pd.DataFrame({'second': second_idx,
+                          'playerId': shifts['playerId'].to_numpy()[shift_idx],
+                          'is_home': shifts['is_home'].to_numpy()[shift_idx] == 1,
+                          'is_goalie': (shifts['positionCode'] == 'G').to_numpy()[shift_idx]})
+
+    # Stable sort keeps the shift order within each second, like DataFrame.query().unique() did
+    pairs = (pairs.sort_values('second', kind='stable')
+             .drop_duplicates(['second', 'is_home', 'is_goalie', 'playerId']))
+
+    result = pd.DataFrame(index=range(n))
+
+    for side, is_home in (('home', True), ('away', False)):
+        side_pairs = pairs[pairs['is_home'] == is_home]
+
+        skaters = side_pairs[~side_pairs['is_goalie']]
+        skater_keys = skaters['second'].to_numpy()
+        skater_ids = skaters['playerId'].to_numpy()
+
+        result[f'{side}_skater_ids'] = _group_lists(skater_keys, skater_ids, n)
+        result[f'{side}_skaters'] = np.bincount(skater_keys[pd.notna(skater_ids)], minlength=n)
+
+        goalies = side_pairs[side_pairs['is_goalie']]
+        goalie_keys = goalies['second'].to_numpy()
+        n_goalies = np.bincount(goalie_keys, minlength=n)
+
+        goalie_id = np.full(n, np.nan, dtype=object)
+        single = n_goalies[goalie_keys] == 1
+        goalie_id[goalie_keys[single]] = goalies['playerId'].to_numpy()[single]
+        result[f'{side}_goalie_id'] = pd.Series(goalie_id).infer_objects()
+
+    return result.iloc[inverse.ravel()].reset_index(drop=True)
+
+
+def pad_id_lists(id_lists, width: int = None):
+    """
+    Packs lists of player IDs into a 2-D array, one row per list, padded with NaN.
+
+    Args:
+      id_lists: Sequence of lists of player IDs (e.g. the 'home_skater_ids' column of resolve_on_ice).
+      width: Number of columns. Defaults to the length of the longest list.
+
+    Returns:
+      A float array of shape (len(id_lists), width).
+    """
+    lengths = np.fromiter((len(ids) for ids in id_lists), dtype=np.int64, count=len(id_lists))
+    width = int(lengths.max(initial=0)) if width is None else width
+
+    matrix = np.full((len(lengths), width), np.nan)
+    if lengths.sum():
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        keep = cols < width
+        matrix[rows[keep], cols[keep]] = np.concatenate([np.asarray(ids, dtype=float) for ids in id_lists if len(ids)])[keep]
+
+    return matrix
+
+
+def strength_states(own_skaters, opp_skaters, own_goalie, opp_goalie):
+    """
+    Returns the strength state of a team for arrays of skater counts and goalie flags: 'EN' when
+    either net is empty, else '5v5', 'PP' or 'SH' when the skater counts differ, and 'EV' for the
+    other even strengths (4v4, 3v3).
+
+    The same states label the events (see decode_situation) and the time on ice (see toi), so
+    one can filter the other.
+    """
+    own_skaters, opp_skaters = np.asarray(own_skaters), np.asarray(opp_skaters)
+    empty_net = ~np.asarray(own_goalie, dtype=bool) | ~np.asarray(opp_goalie, dtype=bool)
+    return np.select([empty_net, (own_skaters == 5) & (opp_skaters == 5), own_skaters > opp_skaters, own_skaters < opp_skaters],
+                     ['EN', '5v5', 'PP', 'SH'], 'EV')
+
+
+def decode_situation(codes, is_home=None):
+    """
+    Decodes the play-by-play situationCode of every event, in one vectorized pass.
+
+    The code has four digits: away goalie in net (1 or 0), away skaters, home skaters and home
+    goalie in net, e.g. '1451' is a home power play and '0651' an away extra attacker. The skater
+    counts include the extra attacker of a pulled goalie, like the counts resolved from the shifts.
+
+    Args:
+      codes: Sequence of situation codes (strings or numbers, missing ones as None or NaN).
+      is_home: Sequence of the home indicator of the event team (1, 0 or NaN), for the strength
+        from the point of view of the event team (home first when there is no event team).
+
+    Returns:
+      A dataframe with home_skaters, away_skaters, home_empty_net, away_empty_net (nullable Int8),
+      game_strength (e.g. '5v4') and strength_state (see strength_states, for the event team).
+    """
+    values = pd.to_numeric(pd.Series(codes, dtype=object).reset_index(drop=True), errors='coerce').to_numpy(dtype=float)
+    missing = np.isnan(values)
+    digits = np.where(missing, 0, values).astype(np.int64)
+
+    decoded = {'away_empty_net': 1 - digits // 1000, 'away_skaters': digits // 100 % 10,
+               'home_skaters': digits // 10 % 10, 'home_empty_net': 1 - digits % 10}
+    situation = pd.DataFrame({col: pd.Series(decoded[col], dtype='Int8').mask(missing)
+                              for col in ('home_skaters', 'away_skaters', 'home_empty_net', 'away_empty_net')})
+
+    home_view = np.ones(len(values), dtype=bool) if is_home is None else pd.Series(is_home).fillna(1).to_numpy() != 0
+    own = np.where(home_view, decoded['home_skaters'], decoded['away_skaters'])
+    other = np.where(home_view, decoded['away_skaters'], decoded['home_skaters'])
+
+    situation['game_strength'] = np.where(missing, None, pd.Series(own).astype(str) + 'v' + pd.Series(other).astype(str))
+    own_goalie = np.where(home_view, digits % 10, digits // 1000)
+    other_goalie = np.where(home_view, digits // 1000, digits % 10)
+    situation['strength_state'] = np.where(missing, None, strength_states(own, other, own_goalie, other_goalie))
+
+    return situation
+
+
+def compare_strength(counts: pd.DataFrame, situation: pd.DataFrame):
+    """
+    Compares the skater counts resolved from the shifts with the ones decoded from situationCode.
+
+    Counts differ legitimately around line changes and penalty expiries, when the shift times
+    and the event time fall on the same second, so a few mismatches per game are expected.
+
+    Args:
+      counts: Events with the home_skaters and away_skaters resolved from the shifts.
+      situation: The decoded situation of the same events (see decode_situation).
+
+    Returns:
+      The rows (positions of counts) whose counts differ, with both pairs of counts.
+    """
+    shift_counts = counts[['home_skaters', 'away_skaters']].reset_index(drop=True)
+    code_counts = situation[['home_skaters', 'away_skaters']].reset_index(drop=True)
+
+    known = code_counts.notna().all(axis=1)
+    differs = known & (shift_counts.to_numpy() != code_counts.to_numpy(dtype=float, na_value=np.nan)).any(axis=1)
+
+    return pd.concat([shift_counts[differs].add_prefix('shifts_'), code_counts[differs].add_prefix('situation_')], axis=1)
@@ -0,0 +1,114 @@
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+
+from .constants import *
+from .functions import get_season_games, season_week_dates
+
+
+# Compact dtypes of the season game index
+SEASON_INDEX_DTYPES = {
+    'gameId': 'int32', 'gameDate': 'datetime64[ns]', 'gameType': 'int8', 'gameState': 'category',
+    'awayTeam_abbrev': 'category', 'homeTeam_abbrev': 'category',
+}
+
+
+def season_index_file(season: int, path: str = DEFAULT_DATA_DIR):
+    return os.path.join(path, SEASON_INDEX_TABLE, f"season={season}", f"{SEASON_INDEX_TABLE}.parquet")
+
+
+def _stale_weeks(dates, index: pd.DataFrame, today: datetime):
+    """
+    Returns the week start dates whose games may have changed since the index was built.
+
+    A week is settled once it is over, every game of it is final, and a later game is final
+    too (so an empty week before it is really empty, e.g. the All-Star break).
+    """
+    if index is None or index.empty:
+        return list(dates)
+
+    final = index['gameState'].isin(FINAL_GAME_STATES)
+    last_final = index.loc[final, 'gameDate'].max()
+    pending = index.loc[~final, 'gameDate'].to_numpy()
+
+    stale = []
+    for date in dates:
+        start = pd.Timestamp(date)
+        end = start + timedelta(days=6)
+        if end >= today or pd.isna(last_final) or end >= last_final or ((pending >= start) & (pending <= end)).any():
+            stale.append(date)
+    return stale
+
+
+def build_season_index(season: int = DEFAULT_SEASON, path: str = DEFAULT_DATA_DIR, concurrency: int = 8, refresh: bool = False):
+    """
+    Builds (or updates) the index of every game of a season, stored in {path}/games/season={season}/games.parquet.
+
+    The weekly schedules are fetched concurrently and deduplicated by gameId. When an index
+    already exists, only the weeks that may have changed are fetched again: the ones not over
+    yet, the ones with games not final yet and the ones after the last final game.
+
+    Args:
+      season: Season in the format of {year_start}{year_end}.
+      path: Root folder of the datasets, or None to keep the index in memory only.
+      concurrency: Number of weeks fetched at once.
+      refresh: Fetch every week again, ignoring the existing index.
+
+    Returns:
+      A dataframe with one row per game (gameId, gameDate, gameType, gameState, team abbreviations), sorted by gameId.
+
+    Raises:
+      requests.exceptions.RequestException: If there's an issue with the request.
+    """
+    file = season_index_file(season, path) if path else None
+    index = None
+    if file and not refresh and os.path.exists(file):
+        index = pd.read_parquet(file)
+
+    dates = _stale_weeks(season_week_dates(season), index, pd.Timestamp(datetime.now().date()))
+    games = get_season_games(season, game_types=None, dates=dates, concurrency=concurrency) if dates else None
+
+    frames = [df for df in (index, games) if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(SEASON_INDEX_DTYPES)).astype(SEASON_INDEX_DTYPES)
+
+    # Fresh rows replace the indexed ones (state changes, rescheduled games)
+    index = (pd.concat([df.astype(SEASON_INDEX_DTYPES) for df in frames], ignore_index=True)
+             .drop_duplicates('gameId', keep='last')
+             .astype(SEASON_INDEX_DTYPES)
+             .sort_values('gameId')
+             .reset_index(drop=True))
+
+    if file:
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.tmp"
+        index.to_parquet(tmp, index=False)
+        os.replace(tmp, file)
+
+    return index
+
+
+def read_season_index(season: int = DEFAULT_SEASON, path: str = DEFAULT_DATA_DIR, game_types=None, states=None, teams=None):
+    """
+    Reads the index written by build_season_index, without any request.
+
+    Args:
+      season: Season in the format of {year_start}{year_end}.
+      path: Root folder of the datasets.
+      game_types: Only keep these game types (1: preseason, 2: regular season, 3: playoffs).
+      states: Only keep games in these states, e.g. FINAL_GAME_STATES.
+      teams: Only keep games of these team abbreviations.
+
+    Returns:
+      A dataframe with one row per game, sorted by gameId.
+    """
+    filters = []
+    if game_types is not None:
+        filters.append(('gameType', 'in', list(game_types)))
+    if states is not None:
+        filters.append(('gameState', 'in', list(states)))
+
+    index = pd.read_parquet(season_index_file(season, path), filters=filters or None)
+    if teams is not None:
+        index = index[index['awayTeam_abbrev'].isin(teams) | index['homeTeam_abbrev'].isin(teams)]
+    return index.reset_index(drop=True)
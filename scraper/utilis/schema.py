@@ -0,0 +1,127 @@
+import re
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# Compact dtypes of the scrape_game outputs. Columns not listed here and not matched by
+# COMPACT_DTYPE_PATTERNS keep the dtype pandas inferred.
+COMPACT_DTYPES = {
+    'pbp': {
+        'eventId': 'Int16', 'sortOrder': 'Int16', 'periodDescriptor_number': 'Int8', 'period': 'Int8',
+        'gameId': 'Int32', 'seasonId': 'Int32', 'gameType': 'Int8', 'elapsedTime': 'Int16',
+        'homeSOG': 'Int16', 'awaySOG': 'Int16', 'homeScore': 'Int8', 'awayScore': 'Int8', 'duration': 'Int8',
+        'is_home': 'Int8', 'home_skaters': 'Int8', 'away_skaters': 'Int8', 'home_empty_net': 'Int8', 'away_empty_net': 'Int8',
+        'xCoord': 'float32', 'yCoord': 'float32',
+        'normalized_xCoord': 'float32', 'normalized_yCoord': 'float32',
+        'normalized_xCoord_vertical': 'float32', 'normalized_yCoord_vertical': 'float32',
+        'shot_distance': 'float32', 'shot_angle': 'float32', 'rink_zone': 'float32', 'left_side': 'float32', 'behind_net': 'float32',
+        'event': 'category', 'eventTeam': 'category', 'game_strength': 'category', 'strength_state': 'category', 'typeCode': 'category',
+        'zoneCode': 'category', 'shotType': 'category', 'descKey': 'category', 'reason': 'category',
+        'secondaryReason': 'category', 'homeTeamDefendingSide': 'category', 'periodType': 'category',
+        'venue': 'category',
+    },
+    'rosters': {
+        'teamId': 'Int16', 'sweaterNumber': 'Int16', 'gameId': 'Int32', 'is_home': 'Int8',
+        'positionCode': 'category', 'headshot': 'string',
+    },
+    'shifts': {
+        'shift_number': 'Int16', 'period': 'Int8', 'sweaterNumber': 'Int16', 'is_home': 'Int8',
+        'duration_s': 'Int16', 'startTime_s': 'Int16', 'endTime_s': 'Int16', 'gameId': 'Int32',
+        'positionCode': 'category', 'duration': 'category', 'startTime': 'category', 'endTime': 'category',
+    },
+}
+
+# Player IDs (playerId, goalieInNetId, event_player1_Id, home_skater_id3, home_goalie_id, ...)
+COMPACT_DTYPE_PATTERNS = [
+    (re.compile(r'(playerId|PlayerId|InNetId|_Id|_id\d*)$'), 'Int32'),
+]
+
+# Player name columns, which share a single categorical dictionary
+NAME_COLUMN_PATTERN = re.compile(r'(fullName\d*|firstName|lastName)$')
+
+# Tables whose name columns use that dictionary. A roster holds each name once, so a dictionary
+# would only add to it: its names stay strings.
+NAME_CATEGORY_TABLES = ('pbp',)
+
+
+def _compact_dtype(col: str, table: str):
+    dtype = COMPACT_DTYPES.get(table, {}).get(col)
+    if dtype is None:
+        dtype = next((dtype for pattern, dtype in COMPACT_DTYPE_PATTERNS if pattern.search(col)), None)
+    return dtype
+
+
+def names_dtype(frames):
+    """
+    Returns one categorical dtype holding every player name of the given dataframes.
+    """
+    names = set()
+    for df in frames:
+        for col in df.columns:
+            if NAME_COLUMN_PATTERN.search(col):
+                names.update(df[col].dropna().astype(str).unique())
+    return pd.CategoricalDtype(sorted(names))
+
+
+def compact_frame(df: pd.DataFrame, table: str, names: pd.CategoricalDtype = None):
+    """
+    Casts a scrape_game output to compact dtypes: nullable small integers, float32 coordinates
+    and categoricals for repeated strings. Strings that rarely repeat (clocks, roster names) stay
+    strings, so a compact table is never larger than the original.
+
+    Args:
+      df: One of the dataframes returned by scrape_game (or fetch_html_shifts).
+      table: 'pbp', 'rosters' or 'shifts'.
+      names: Categorical dtype shared by the name columns (see names_dtype). Built from df if not provided.
+
+    Returns:
+      A copy of the dataframe with compact dtypes.
+    """
+    shared_names = table in NAME_CATEGORY_TABLES
+    names = names_dtype([df]) if names is None and shared_names else names
+    casts = {}
+
+    for col in df.columns:
+        if NAME_COLUMN_PATTERN.search(col):
+            if shared_names:
+                casts[col] = names
+            continue
+        dtype = _compact_dtype(col, table)
+        if dtype is None:
+            continue
+        if dtype.startswith('Int') and df[col].dtype == object:
+            df = df.assign(**{col: pd.to_numeric(df[col], errors='coerce')})
+        casts[col] = dtype
+
+    return df.astype(casts)
+
+
+def compact_game(data: dict):
+    """
+    Casts every dataframe returned by scrape_game to compact dtypes, with one name dictionary for the game.
+    """
+    names = names_dtype(data.values())
+    return {table: compact_frame(df, table, names) for table, df in data.items()}
+
+
+def concat_compact(frames):
+    """
+    Concatenates compact dataframes (e.g. the games of a season), merging their categorical
+    dictionaries instead of falling back to object columns.
+    """
+    frames = list(frames)
+    categorical = {col for df in frames for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}
+
+    unified = {}
+    for col in categorical - {col for col in categorical if NAME_COLUMN_PATTERN.search(col)}:
+        categories = union_categoricals([df[col] for df in frames if col in df.columns], ignore_order=True).categories
+        unified[col] = pd.CategoricalDtype(categories)
+
+    # Every name column keeps sharing one dictionary
+    names = pd.CategoricalDtype(sorted({name for df in frames for col in df.columns
+                                        if NAME_COLUMN_PATTERN.search(col) and col in categorical
+                                        for name in df[col].cat.categories}))
+    unified.update({col: names for col in categorical if NAME_COLUMN_PATTERN.search(col)})
+
+    return pd.concat([df.astype({col: unified[col] for col in categorical if col in df.columns}) for df in frames],
+                     ignore_index=True)
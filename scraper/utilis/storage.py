@@ -0,0 +1,133 @@
+import os
+import re
+import logging
+import pandas as pd
+
+from .constants import *
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+# Skater slot columns (home_skater_id1, ...) stored per side, however many skaters a game had on the ice
+PARQUET_SKATER_SLOTS = 8
+
+# Columns and dtypes of the datasets, in order: every game file of a table is written with exactly
+# these columns (missing ones as nulls), so the files of a dataset share one schema.
+PARQUET_DTYPES = {
+    'pbp': {
+        'timeInPeriod': 'string', 'timeRemaining': 'string', 'homeTeamDefendingSide': 'string', 'event': 'string',
+        'sortOrder': 'Int64', 'eventId': 'Int64', 'periodDescriptor_number': 'Int64', 'periodType': 'string',
+        'maxRegulationPeriods': 'Int64', 'xCoord': 'float64', 'yCoord': 'float64', 'zoneCode': 'string',
+        'shotType': 'string', 'goalieInNetId': 'Int64', 'homeSOG': 'float64', 'awaySOG': 'float64',
+        'duration': 'float64', 'typeCode': 'string', 'descKey': 'string', 'reason': 'string', 'secondaryReason': 'string',
+        'servedByPlayerId': 'Int64', 'homeScore': 'float64', 'awayScore': 'float64',
+        'highlightClipSharingUrl': 'string', 'highlightClipSharingUrlFr': 'string', 'highlightClip': 'Int64',
+        'highlightClipFr': 'Int64', 'discreteClip': 'Int64', 'discreteClipFr': 'Int64', 'pptReplayUrl': 'string',
+        'gameId': 'Int64', 'seasonId': 'Int64', 'gameType': 'Int64', 'venue': 'string', 'period': 'Int64',
+        'elapsedTime': 'Int64', 'eventTeam': 'string', 'is_home': 'Int64',
+        'event_player1_Id': 'Int64', 'event_player2_Id': 'Int64', 'event_player3_Id': 'Int64', 'uniqueId': 'Int64',
+        'home_skaters': 'Int64', 'away_skaters': 'Int64', 'game_strength': 'string',
+        'home_empty_net': 'Int64', 'away_empty_net': 'Int64', 'strength_state': 'string',
+        **{f'{side}_skater_id{j}': 'Int64' for side in ('home', 'away') for j in range(1, PARQUET_SKATER_SLOTS + 1)},
+        **{f'{side}_skater_fullName{j}': 'string' for side in ('home', 'away') for j in range(1, PARQUET_SKATER_SLOTS + 1)},
+        'event_player1_fullName': 'string', 'event_player2_fullName': 'string', 'event_player3_fullName': 'string',
+        'home_goalie_id': 'Int64', 'away_goalie_id': 'Int64', 'home_goalie_fullName': 'string', 'away_goalie_fullName': 'string',
+        'normalized_xCoord': 'float32', 'normalized_yCoord': 'float32',
+        'normalized_xCoord_vertical': 'float32', 'normalized_yCoord_vertical': 'float32',
+        'shot_distance': 'float32', 'shot_angle': 'float32', 'rink_zone': 'float32', 'left_side': 'float32', 'behind_net': 'float32',
+    },
+    'rosters': {
+        'playerId': 'Int64', 'teamId': 'Int64', 'sweaterNumber': 'Int64', 'positionCode': 'string', 'headshot': 'string',
+        'firstName': 'string', 'lastName': 'string', 'fullName': 'string', 'gameId': 'Int64', 'is_home': 'Int64',
+    },
+    'shifts': {
+        'shift_number': 'Int64', 'period': 'Int64', 'duration': 'string', 'sweaterNumber': 'Int64', 'is_home': 'Int64',
+        'startTime': 'string', 'endTime': 'string', 'duration_s': 'Int64', 'startTime_s': 'Int64', 'endTime_s': 'Int64',
+        'gameId': 'Int64', 'playerId': 'Int64', 'positionCode': 'string',
+    },
+}
+
+SKATER_SLOT_PATTERN = re.compile(r'^(home|away)_skater_(id|fullName)\d+$')
+
+# Columns stored in the dataset paths rather than in the files
+PARTITION_COLUMNS = ('season', 'gameDate')
+
+
+def apply_parquet_dtypes(df: pd.DataFrame, table: str):
+    """
+    Casts a scrape_game output to the columns and dtypes of its dataset (see PARQUET_DTYPES).
+
+    Missing columns are added as nulls, and columns outside the schema are dropped (with a warning,
+    but for the partition columns).
+
+    Args:
+      df: One of the dataframes returned by scrape_game.
+      table: 'pbp', 'rosters' or 'shifts'.
+
+    Returns:
+      A copy of the dataframe with the dataset's schema.
+
+    Raises:
+      ValueError: If the game had more skaters on the ice than PARQUET_SKATER_SLOTS.
+    """
+    dtypes = PARQUET_DTYPES[table]
+    overflow = [col for col in df.columns if SKATER_SLOT_PATTERN.match(col) and col not in dtypes]
+    if overflow:
+        raise ValueError(f"More skater slots than PARQUET_SKATER_SLOTS ({PARQUET_SKATER_SLOTS}): {overflow}")
+
+    dropped = [col for col in df.columns if col not in dtypes and col not in PARTITION_COLUMNS]
+    if dropped:
+        logger.warning(f"Dropping the columns outside the {table} schema: {dropped}")
+
+    return df.reindex(columns=list(dtypes)).astype(dtypes)
+
+
+def write_game_parquet(data: dict, path: str = DEFAULT_DATA_DIR):
+    """
+    Writes the outputs of scrape_game for one game to Parquet datasets partitioned by season and game date.
+
+    Each table goes to {path}/{table}/season={season}/gameDate={YYYY-MM-DD}/{gameId}.parquet, so
+    scraping a game again overwrites its files and new games are appended as new files.
+
+    Args:
+      data: Dictionary of dataframes returned by scrape_game.
+      path: Root folder of the datasets.
+
+    Returns:
+      A dictionary of table -> written file.
+    """
+    pbp = data['pbp']
+    game_id = int(pbp['gameId'].iloc[0])
+    season = int(pbp['seasonId'].iloc[0])
+    game_date = pd.Timestamp(pbp['gameDate'].iloc[0]).strftime('%Y-%m-%d')
+
+    files = {}
+    for table, df in data.items():
+        folder = os.path.join(path, table, f"season={season}", f"gameDate={game_date}")
+        os.makedirs(folder, exist_ok=True)
+
+        file = os.path.join(folder, f"{game_id}.parquet")
+        tmp = f"{file}.tmp"
+        with span('write', table=table) as write_span:
+            apply_parquet_dtypes(df, table).to_parquet(tmp, index=False)
+            os.replace(tmp, file)
+            write_span.set(bytes=os.path.getsize(file), rows=len(df))
+        files[table] = file
+
+    return files
+
+
+def read_parquet_table(table: str, path: str = DEFAULT_DATA_DIR, filters=None):
+    """
+    Reads a Parquet dataset written by write_game_parquet.
+
+    Args:
+      table: 'pbp', 'rosters' or 'shifts'.
+      path: Root folder of the datasets.
+      filters: Optional pyarrow filters, e.g. [('season', '=', 20232024)].
+
+    Returns:
+      A dataframe with the season and gameDate partition columns.
+    """
+    return pd.read_parquet(os.path.join(path, table), filters=filters)
@@ -0,0 +1,141 @@
+import os
+import json
+import threading
+
+from .constants import *
+
+
+class TeamRegistry:
+    """
+    Index of the teams of a season, resolving any team name or abbreviation to the team abbreviation.
+    """
+
+    def __init__(self, season: int, aliases: dict):
+        """
+        Args:
+          season: Season in the format of {year_start}{year_end}.
+          aliases: Dictionary of alias -> team abbreviation.
+        """
+        self.season = season
+        self.aliases = aliases
+        self._index = {alias.casefold(): abbrev for alias, abbrev in aliases.items()}
+
+    @classmethod
+    def from_teams_json(cls, season: int, teams_json: dict):
+        """
+        Builds the registry from the output of fetch_teams_json.
+
+        Every name of a team (the TEAM_NAME_FIELDS: abbreviation, full name, common name,
+        place name, in every language) is an alias of its abbreviation. Its other fields
+        (logos, IDs, ...) are not.
+        """
+        aliases = {}
+        for team in teams_json.get("teams", []):
+            abbrev = team.get("abbrev")
+            if not abbrev:
+                continue
+            aliases[abbrev] = abbrev
+            for alias in _names(team):
+                aliases.setdefault(alias, abbrev)
+        return cls(season, aliases)
+
+    def resolve(self, team: str):
+        """
+        Returns the abbreviation of a team given any of its names (case insensitive), or None if unknown.
+        """
+        if team in self.aliases:
+            return self.aliases[team]
+        return self._index.get(str(team).casefold())
+
+    @property
+    def abbrevs(self):
+        return sorted(set(self.aliases.values()))
+
+    def save(self, file: str):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'season': self.season, 'aliases': self.aliases}, f)
+        os.replace(tmp, file)
+
+    @classmethod
+    def load(cls, file: str):
+        with open(file) as f:
+            data = json.load(f)
+        return cls(data['season'], data['aliases'])
+
+
+def _names(team: dict):
+    """
+    Yields the non-empty names of a team, from its TEAM_NAME_FIELDS.
+    """
+    for field in TEAM_NAME_FIELDS:
+        value = team.get(field)
+        for name in value.values() if isinstance(value, dict) else [value]:
+            if isinstance(name, str) and name:
+                yield name
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def team_registry(season: int = DEFAULT_SEASON, path: str = TEAM_REGISTRY_DIR):
+    """
+    Returns the team registry of a season.
+
+    The registry is built from one fetch_teams_json request per season, then kept in memory
+    and in {path}/{season}.json so later sessions don't need the request either.
+
+    Args:
+      season: Season in the format of {year_start}{year_end}.
+      path: Directory of the on-disk registries, or None to only keep them in memory.
+
+    Returns:
+      The TeamRegistry of the season.
+
+    Raises:
+      requests.exceptions.RequestException: If there's an issue with the request.
+    """
+    season = int(season)
+
+    # The lock only guards the dictionary, so a fetch doesn't hold back the lookups of other seasons
+    with _registries_lock:
+        if season in _registries:
+            return _registries[season]
+
+    file = os.path.join(os.path.expanduser(path), f"{season}.json") if path else None
+    registry = None
+    if file and os.path.exists(file):
+        try:
+            registry = TeamRegistry.load(file)
+        except (OSError, ValueError, KeyError):
+            registry = None
+
+    if registry is None:
+        # Imported here, functions imports this module through decorators
+        from .functions import fetch_teams_json
+        registry = TeamRegistry.from_teams_json(season, fetch_teams_json(f"{str(season)[4:]}-01-01"))
+        if file and registry.aliases:
+            try:
+                registry.save(file)
+            except OSError:
+                pass
+
+    # An empty registry (e.g. a failed fetch) is not kept, so the next lookup fetches again
+    if not registry.aliases:
+        return registry
+    with _registries_lock:
+        return _registries.setdefault(season, registry)
+
+def resolve_team(team: str, season: int = DEFAULT_SEASON):
+    """
+    Returns the abbreviation of a team given any of its names for a season, or None if unknown.
+    """
+    return team_registry(season).resolve(team)
+
+def clear_team_registries():
+    """
+    Forgets the team registries kept in memory (the on-disk ones are kept).
+    """
+    with _registries_lock:
+        _registries.clear()
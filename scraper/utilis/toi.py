@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+from .onice import expand_intervals, strength_states, STRENGTH_STATES, _group_lists
+
+
+# Seconds between the time axes of two games, so the shifts of many games sweep as one axis
+GAME_SPAN = 10 ** 6
+
+
+def _concat_shifts(shifts):
+    if isinstance(shifts, pd.DataFrame):
+        return shifts
+    return pd.concat(list(shifts), ignore_index=True)
+
+
+def _sweep(shifts: pd.DataFrame):
+    """
+    Splits the time of every game into constant-state segments at the shift boundaries.
+
+    Returns:
+      A tuple (segments, members) where segments has one row per segment with players on the ice
+      (gameId, start_s, end_s, duration_s, skater counts, goalie flags and strength states of both
+      teams) and members one row per player on the ice per segment (segment, playerId, is_home,
+      is_goalie).
+    """
+    required = {'playerId', 'positionCode', 'is_home', 'startTime_s', 'endTime_s'}
+    missing = required - set(shifts.columns)
+    if missing:
+        raise ValueError(f"The shifts need the {sorted(missing)} columns, e.g. the shifts output of scrape_game")
+
+    shifts = shifts[shifts['playerId'].notna()]
+    starts = pd.to_numeric(shifts['startTime_s'], errors='coerce').to_numpy(dtype=float)
+    ends = pd.to_numeric(shifts['endTime_s'], errors='coerce').to_numpy(dtype=float)
+    valid = ends > starts
+    shifts, starts, ends = shifts[valid], starts[valid].astype(np.int64), ends[valid].astype(np.int64)
+
+    game_ids = shifts['gameId'].to_numpy() if 'gameId' in shifts.columns else np.zeros(len(shifts), dtype=np.int64)
+    games, game_idx = np.unique(game_ids, return_inverse=True)
+    starts = starts + game_idx * GAME_SPAN
+    ends = ends + game_idx * GAME_SPAN
+
+    # Every shift start and end is a boundary: between two of them nobody enters or leaves the ice
+    bounds = np.unique(np.r_[starts, ends])
+    shift_idx, segment_idx = expand_intervals(starts, ends, bounds[:-1])
+
+    members = pd.DataFrame({'segment': segment_idx,
+                            'playerId': shifts['playerId'].to_numpy()[shift_idx],
+                            'is_home': shifts['is_home'].to_numpy()[shift_idx] == 1,
+                            'is_goalie': (shifts['positionCode'] == 'G').to_numpy()[shift_idx]})
+    members = members.drop_duplicates(['segment', 'is_home', 'playerId'])
+
+    n = max(len(bounds) - 1, 0)
+    counts = {}
+    for side, is_home in (('home', True), ('away', False)):
+        for kind, is_goalie in (('skaters', False), ('goalie', True)):
+            keys = members.loc[(members['is_home'] == is_home) & (members['is_goalie'] == is_goalie), 'segment'].to_numpy()
+            counts[f'{side}_{kind}'] = np.bincount(keys, minlength=n)
+
+    game = bounds[:-1] // GAME_SPAN
+    segments = pd.DataFrame({'gameId': games[game], 'start_s': bounds[:-1] - game * GAME_SPAN,
+                             'end_s': bounds[1:] - game * GAME_SPAN, 'duration_s': np.diff(bounds),
+                             'home_skaters': counts['home_skaters'], 'away_skaters': counts['away_skaters'],
+                             'home_goalie': counts['home_goalie'] > 0, 'away_goalie': counts['away_goalie'] > 0})
+    segments['home_state'] = strength_states(segments['home_skaters'], segments['away_skaters'], segments['home_goalie'], segments['away_goalie'])
+    segments['away_state'] = strength_states(segments['away_skaters'], segments['home_skaters'], segments['away_goalie'], segments['home_goalie'])
+
+    # Gaps between shifts (and between games) have nobody on the ice
+    occupied = np.bincount(members['segment'].to_numpy(), minlength=n) > 0
+    return segments[occupied], members[occupied[members['segment'].to_numpy()]]
+
+
+def shift_segments(shifts):
+    """
+    Splits game time into constant-state segments with a sweep over the shift boundaries.
+
+    Args:
+      shifts: Shifts matched to the roster (the shifts output of scrape_game, with playerId and
+        positionCode), of one game or many (a dataframe with a gameId column, or an iterable of them).
+
+    Returns:
+      A dataframe with one row per segment with players on the ice: gameId, start_s, end_s,
+      duration_s, home_skaters, away_skaters, home_goalie, away_goalie (goalie on the ice),
+      home_state, away_state (see strength_states) and the home_player_ids and away_player_ids
+      on the ice (goalies included).
+    """
+    segments, members = _sweep(_concat_shifts(shifts))
+
+    position = np.full(int(members['segment'].max()) + 1 if len(members) else 0, -1)
+    position[segments.index.to_numpy()] = np.arange(len(segments))
+    members = members.assign(segment=position[members['segment'].to_numpy()]).sort_values('segment', kind='stable')
+
+    segments = segments.reset_index(drop=True)
+    for side, is_home in (('home', True), ('away', False)):
+        side_members = members[members['is_home'] == is_home]
+        segments[f'{side}_player_ids'] = _group_lists(side_members['segment'].to_numpy(), side_members['playerId'].to_numpy(), len(segments))
+
+    return segments
+
+
+def _toi_table(frame: pd.DataFrame, keys: list):
+    table = (frame.groupby(keys + ['state'])['duration_s'].sum()
+             .unstack('state', fill_value=0)
+             .reindex(columns=list(STRENGTH_STATES), fill_value=0))
+    table.columns.name = None
+    table['total'] = table.sum(axis=1)
+    return table.reset_index()
+
+
+def player_toi(shifts):
+    """
+    Time on ice of every player by strength state, in seconds.
+
+    The segments of shift_segments are joined to the players on the ice in one vectorized pass,
+    so this works on the shifts of a whole season at once without any per-second frame.
+
+    Args:
+      shifts: Shifts matched to the roster, of one game or many (see shift_segments).
+
+    Returns:
+      A dataframe with one row per player per game (gameId, playerId, is_home, is_goalie) and their
+      seconds in every strength state of STRENGTH_STATES (from the point of view of their team) and in total.
+    """
+    segments, members = _sweep(_concat_shifts(shifts))
+
+    rows = segments.loc[members['segment'].to_numpy()]
+    frame = pd.DataFrame({'gameId': rows['gameId'].to_numpy(), 'playerId': members['playerId'].to_numpy(),
+                          'is_home': members['is_home'].to_numpy().astype(int), 'is_goalie': members['is_goalie'].to_numpy(),
+                          'state': np.where(members['is_home'], rows['home_state'], rows['away_state']),
+                          'duration_s': rows['duration_s'].to_numpy()})
+
+    return _toi_table(frame, ['gameId', 'playerId', 'is_home', 'is_goalie'])
+
+
+def team_toi(shifts):
+    """
+    Time of every team by strength state, in seconds.
+
+    Args:
+      shifts: Shifts matched to the roster, of one game or many (see shift_segments).
+
+    Returns:
+      A dataframe with one row per team per game (gameId, is_home) and its seconds in every
+      strength state of STRENGTH_STATES and in total.
+    """
+    segments, _ = _sweep(_concat_shifts(shifts))
+
+    frame = pd.concat([pd.DataFrame({'gameId': segments['gameId'], 'is_home': is_home,
+                                     'state': segments[f'{side}_state'], 'duration_s': segments['duration_s']})
+                       for side, is_home in (('home', 1), ('away', 0))], ignore_index=True)
+
+    return _toi_table(frame, ['gameId', 'is_home'])
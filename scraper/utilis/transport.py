@@ -0,0 +1,153 @@
+import time
+import random
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .constants import *
+from .metrics import count
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` requests per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then takes it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Transport:
+    """
+    Shared HTTP transport: one pooled keep-alive requests.Session, a token-bucket
+    rate limiter per host and retries with jittered exponential backoff on
+    connection errors, 429 and 5xx responses.
+    """
+
+    def __init__(self, max_retries: int = HTTP_MAX_RETRIES, backoff: float = HTTP_BACKOFF,
+                 max_backoff: float = HTTP_MAX_BACKOFF, timeout: float = HTTP_TIMEOUT,
+                 rate_limits: dict = None, pool_size: int = HTTP_POOL_SIZE, session: requests.Session = None):
+        """
+        Args:
+          max_retries: Number of retries after the first attempt.
+          backoff: Base delay (in seconds) of the exponential backoff.
+          max_backoff: Maximum delay (in seconds) between two attempts.
+          timeout: Timeout (in seconds) of each request.
+          rate_limits: Dictionary of host -> (requests per second, burst). Defaults to HOST_RATE_LIMITS.
+          pool_size: Number of keep-alive connections kept per host.
+          session: Session to use instead of a new one.
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.rate_limits = HOST_RATE_LIMITS if rate_limits is None else rate_limits
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str):
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = self.rate_limits.get(host, self.rate_limits.get(None, (None, None)))
+                self._buckets[host] = TokenBucket(rate, burst) if rate else None
+            return self._buckets[host]
+
+    def _delay(self, attempt: int, response=None):
+        """
+        Seconds to wait before the next attempt: Retry-After if the server sent one, else full jitter.
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url: str, **kwargs):
+        """
+        Sends a GET request, retrying transient failures.
+
+        Args:
+          url: URL to fetch.
+          **kwargs: Passed to requests.Session.get.
+
+        Returns:
+          The requests.Response of the last attempt.
+
+        Raises:
+          requests.exceptions.RequestException: If every attempt failed to connect.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).netloc
+        bucket = self._bucket(host)
+
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    count('request_failures', host=host, reason=type(e).__name__)
+                    raise
+                count('retries', host=host, reason=type(e).__name__)
+                time.sleep(self._delay(attempt))
+                continue
+
+            if response.status_code not in HTTP_RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            count('retries', host=host, reason=str(response.status_code))
+            time.sleep(self._delay(attempt, response))
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport():
+    """
+    Returns the transport used by every fetch_* function, creating the default one on first use.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+def set_transport(transport):
+    """
+    Replaces the transport used by every fetch_* function.
+
+    Args:
+      transport: Any object with a get(url, **kwargs) method returning a requests.Response
+        (e.g. a Transport pointed at a local stub server). None restores the default.
+    """
+    global _transport
+    with _transport_lock:
+        _transport = transport
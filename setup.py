@@ -51,6 +51,7 @@ setup(
     "psutil==5.9.7",
     "ptyprocess==0.7.0",
     "pure-eval==0.2.2",
+    "pyarrow==14.0.2",
     "Pygments==2.17.2",
     "pyparsing==3.1.1",
     "python-dateutil==2.8.2",